@@ -0,0 +1,935 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import datetime
+import timeit
+import logging
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+
+from bot.base_dir import _base_dir
+from bot.clock import Scheduler, VirtualClock
+from bot.fake_api import SyntheticWorld, FakeApi, FakeFeedServer
+from bot.replay import ReplayApi
+from bot.metrics import metrics
+from bot.profiler import profiler
+from bot.inventory import Inventory
+from bot.pokemon_store import PokemonStore
+from bot.transfer_filter import TransferFilter
+from bot.encounters import CaughtEncounters
+from bot.fort_index import FortIndex
+from bot.route import RoutePlanner
+from bot.cells import CellCache
+from bot import Bot
+
+import bot.models
+import bot.game_data
+import bot.feed
+import bot.geometry
+import bot.log
+
+import gpxpy.geo
+from pgoapi import utilities
+
+logging.basicConfig(
+	level=logging.INFO,
+	format='%(asctime)s [%(name)s] [%(levelname)s] %(message)s')
+logger = logging.getLogger('benchmark')
+logger.setLevel(logging.INFO)
+
+def main():
+	args = parse_args()
+	config = init_config(args)
+
+	if not args.verbose:
+		logging.disable(logging.INFO)
+
+	if args.profile:
+		profiler.configure(True, directory=os.path.abspath(args.profile))
+
+	cwd = os.getcwd()
+	workdir = tempfile.mkdtemp(prefix='alphabot-benchmark-')
+	os.mkdir(os.path.join(workdir, 'log'))
+	os.chdir(workdir)
+
+	try:
+		if args.micro:
+			results = run_micro(config, args)
+		else:
+			results = [run(config, args)]
+	finally:
+		os.chdir(cwd)
+		shutil.rmtree(workdir, ignore_errors=True)
+
+	for result in results:
+		line = json.dumps(result, sort_keys=True)
+		print(line)
+
+		if args.output:
+			with open(args.output, 'a') as output:
+				output.write(line + '\n')
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='Run the bot loop against a local fake server.')
+	parser.add_argument('--cycles', type=int, default=200, help='main loop cycles to measure')
+	parser.add_argument('--config', default=os.path.join(_base_dir, 'configs', 'config.json.example'))
+	parser.add_argument('--replay', help='JSON lines file written by record_api, instead of a synthetic world')
+	parser.add_argument('--feed', help='saved raw_data response to serve as the feed')
+	parser.add_argument('--forts', type=int, default=500)
+	parser.add_argument('--spawns', type=int, default=200)
+	parser.add_argument('--pokemons', type=int, default=100)
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--token-lifetime', type=int, help='expire the fake auth token after this many seconds')
+	parser.add_argument('--auth-delay', type=float, default=2, help='seconds a fake login takes')
+	parser.add_argument('--rpc-latency', type=float, default=0, help='seconds each fake RPC takes')
+	parser.add_argument('--micro', action='append', choices=list(MICRO_BENCHMARKS) + ['all'], help='run a before/after micro-benchmark instead of the loop (repeatable)')
+	parser.add_argument('--size', type=int, action='append', help='problem size for --micro instead of its defaults (repeatable)')
+	parser.add_argument('--repeat', type=int, default=5, help='--micro runs each side this many times and keeps the best')
+	parser.add_argument('--output', help='append the JSON result to this file')
+	parser.add_argument('--profile', help='write per-phase cProfile stats to this directory')
+	parser.add_argument('--verbose', action='store_true', help='keep the bot logs')
+	return parser.parse_args()
+
+def init_config(args):
+	with open(args.config, 'rb') as data:
+		config = json.load(data)
+
+	config.update({
+		'auth_service': 'ptc',
+		'username': 'benchmark',
+		'password': '',
+		'encrypt_location': ''
+	})
+
+	return config
+
+def load_feed(path):
+	with open(path, 'rb') as data:
+		pokemons = json.load(data)
+
+	if isinstance(pokemons, dict):
+		pokemons = pokemons['pokemons']
+
+	return lambda: pokemons
+
+def peak_rss():
+	try:
+		import resource
+		rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	except ImportError:
+		return 0
+
+	# Linux reports kilobytes, macOS bytes.
+	if sys.platform == 'darwin':
+		rss //= 1024
+
+	return rss
+
+def run(config, args):
+	lat, lng = [float(x) for x in config['location'].split(',')]
+
+	if args.replay:
+		api = ReplayApi(args.replay)
+		clock = VirtualClock(api.started_at)
+	else:
+		clock = VirtualClock()
+
+	world = SyntheticWorld(
+		lat,
+		lng,
+		forts = args.forts,
+		spawns = args.spawns,
+		pokemons = args.pokemons,
+		seed = args.seed,
+		clock = clock.time,
+		username = config['username']
+	)
+	if not args.replay:
+		api = FakeApi(world, args.token_lifetime, args.auth_delay, args.rpc_latency, clock.sleep)
+
+	feed_server = FakeFeedServer(load_feed(args.feed) if args.feed else world.feed)
+	feed_server.start()
+	config['feed_url'] = feed_server.url
+
+	bot.models.init_db(os.path.join(os.getcwd(), 'benchmark.db'))
+	bot.models.User.create_user(config['username'])
+
+	account = Bot(config, Scheduler(clock), api_factory=lambda: api)
+
+	try:
+		started = time.time()
+		account.setup()
+		setup_seconds = time.time() - started
+		setup_rpcs = api.rpcs
+		setup_queries = metrics.count('db_query_seconds')
+
+		started = time.time()
+		virtual_started = clock.time()
+		attempts = 0
+		while account.cycles < args.cycles and attempts < args.cycles * 2:
+			account.run_cycle()
+			attempts += 1
+		account.writer.flush()
+		elapsed = time.time() - started
+
+		if profiler.enabled:
+			profiler.stop()
+			profiler.flush()
+	finally:
+		account.stop()
+		feed_server.stop()
+		bot.models.db.close()
+
+	cycles = float(account.cycles)
+	return {
+		'mode': 'replay' if args.replay else 'synthetic',
+		'python': platform.python_version(),
+		'timestamp': int(time.time()),
+		'cycles': account.cycles,
+		'failed_cycles': attempts - account.cycles,
+		'seconds': round(elapsed, 3),
+		'cycles_per_second': round(cycles / elapsed, 3),
+		'virtual_seconds_per_cycle': round((clock.time() - virtual_started) / cycles, 1),
+		'rpcs_per_cycle': round((api.rpcs - setup_rpcs) / cycles, 2),
+		'db_queries_per_cycle': round((metrics.count('db_query_seconds') - setup_queries) / cycles, 2),
+		'setup_seconds': round(setup_seconds, 3),
+		'setup_rpcs': setup_rpcs,
+		'session_refreshes': account.session.refreshes,
+		'session_logins': account.session.logins,
+		'catches': account.catch_counter.count(),
+		'spins': account.spin_counter.count(),
+		'peak_rss_kb': peak_rss(),
+		'metrics': metrics.snapshot()['histograms'],
+		'world': {
+			'forts': args.forts,
+			'spawns': args.spawns,
+			'pokemons': args.pokemons,
+			'seed': args.seed
+		}
+	}
+
+# Micro-benchmarks compare the code path a change replaced ("before") with the
+# current one ("after") on synthetic data of each size. They are registered
+# with @micro(name, default sizes...) and return the best wall time of each
+# side in milliseconds, plus whatever else they measured.
+MICRO_BENCHMARKS = OrderedDict()
+
+def micro(name, *sizes):
+	def decorator(function):
+		MICRO_BENCHMARKS[name] = (function, sizes)
+		return function
+
+	return decorator
+
+def run_micro(config, args):
+	names = list(MICRO_BENCHMARKS) if 'all' in args.micro else args.micro
+
+	results = []
+	for name in names:
+		function, sizes = MICRO_BENCHMARKS[name]
+		for size in args.size or sizes:
+			result = function(config, args, size)
+			result.update({
+				'benchmark': name,
+				'size': size,
+				'python': platform.python_version(),
+				'timestamp': int(time.time())
+			})
+			if result.get('after_ms'):
+				result['speedup'] = round(result['before_ms'] / result['after_ms'], 1)
+			results.append(result)
+
+	return results
+
+# Best of `repeat` runs; setup, when given, runs untimed before each one and
+# its result is passed to function.
+def best_ms(function, repeat, setup=None):
+	best = None
+	for i in range(repeat):
+		arguments = (setup(),) if setup else ()
+		started = timeit.default_timer()
+		function(*arguments)
+		elapsed = timeit.default_timer() - started
+		best = elapsed if best is None else min(best, elapsed)
+
+	return round(best * 1000, 3)
+
+def load_data(name):
+	with open(os.path.join(_base_dir, 'data', name + '.json')) as data:
+		return json.load(data)
+
+def inventory_items(size, seed=0):
+	world = SyntheticWorld(0, 0, forts=0, spawns=0, pokemons=size, seed=seed)
+	return world.get_inventory()['inventory_delta']['inventory_items']
+
+@micro('game_data', 250, 1000)
+def bench_game_data(config, args, size):
+	items = inventory_items(size)
+
+	# What a rebuild used to cost: Inventory parsed items.json and
+	# pokemon.json, and every Pokemon parsed both move tables again.
+	def before():
+		load_data('items')
+		pokemon_list = load_data('pokemon')
+		for item in items:
+			pokemon_data = item['inventory_item_data'].get('pokemon_data')
+			if pokemon_data:
+				pokemon_list[int(pokemon_data['pokemon_id']) - 1]['Name']
+				load_data('fast_moves')[str(pokemon_data['move_1'])]['name']
+				load_data('charged_moves')[str(pokemon_data['move_2'])]['name']
+
+	inventory = Inventory.__new__(Inventory)
+
+	def after():
+		inventory.inventory_items(items)
+		inventory.inventory_pokemons(items)
+		inventory.inventory_stats(items)
+
+	bot.game_data._cache.clear()
+	started = timeit.default_timer()
+	bot.game_data.preload()
+	preload_ms = round((timeit.default_timer() - started) * 1000, 3)
+
+	return {
+		'before_ms': best_ms(before, args.repeat),
+		'after_ms': best_ms(after, args.repeat),
+		'preload_ms': preload_ms
+	}
+
+# Bytes reachable from obj, counting every object once.
+def deep_size(obj, seen=None):
+	seen = set() if seen is None else seen
+	if id(obj) in seen:
+		return 0
+	seen.add(id(obj))
+
+	size = sys.getsizeof(obj)
+	if isinstance(obj, dict):
+		size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+	elif isinstance(obj, (list, tuple, set)):
+		size += sum(deep_size(value, seen) for value in obj)
+	elif hasattr(obj, '__dict__'):
+		size += deep_size(obj.__dict__, seen)
+	elif hasattr(obj, '__slots__'):
+		size += sum(deep_size(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+
+	return size
+
+class LegacyPokemon(object):
+	pass
+
+@micro('pokemon_store', 250, 1000)
+def bench_pokemon_store(config, args, size):
+	items = inventory_items(size)
+	inventory = Inventory.__new__(Inventory)
+	inventory.inventory_pokemons(items)
+	store = inventory.pokemons
+	pokemons = list(store)
+	released = pokemons[::10]
+	below_cp = config['transfer_filter']['below_cp']
+	below_iv = config['transfer_filter']['below_iv']
+
+	# dump_best_pokemons on a plain list: two full sorts per login.
+	def before():
+		[pokemon for pokemon in sorted(pokemons, key=lambda k: k.cp, reverse=True) if pokemon.cp >= below_cp]
+		[pokemon for pokemon in sorted(pokemons, key=lambda k: k.iv(), reverse=True) if pokemon.cp >= below_iv]
+
+	def after():
+		list(store.best_cp(below_cp))
+		[pokemon for pokemon in store.best_iv() if pokemon.cp >= below_iv]
+
+	def remove(stock):
+		for pokemon in released:
+			stock.remove(pokemon)
+
+	# The old Pokemon kept its own parsed copy of both move tables.
+	legacy = []
+	pokemon_list = load_data('pokemon')
+	for pokemon in pokemons:
+		old = LegacyPokemon()
+		old.__dict__.update((name, getattr(pokemon, name)) for name in pokemon.__slots__)
+		old.pokemon_list = pokemon_list
+		old.fast_move_list = load_data('fast_moves')
+		old.charged_move_list = load_data('charged_moves')
+		legacy.append(old)
+
+	return {
+		'before_ms': best_ms(before, args.repeat),
+		'after_ms': best_ms(after, args.repeat),
+		'remove_before_ms': best_ms(remove, args.repeat, lambda: list(pokemons)),
+		'remove_after_ms': best_ms(remove, args.repeat, lambda: PokemonStore(pokemons)),
+		'bytes_per_pokemon_before': deep_size(legacy) // size,
+		'bytes_per_pokemon_after': deep_size(store) // size
+	}
+
+@micro('transfer_filter', 1000, 10000)
+def bench_transfer_filter(config, args, size):
+	inventory = Inventory.__new__(Inventory)
+	inventory.inventory_pokemons(inventory_items(size))
+	pokemons = inventory.pokemons
+	transfer_filter = dict(
+		(key, config['transfer_filter'][key]) for key in ('below_cp', 'below_iv', 'logic')
+	)
+	rules = TransferFilter(transfer_filter)
+	species_rules = TransferFilter(dict(config['transfer_filter'], keep_top=3))
+
+	# Inventory.pokemon_threshold, minus its logging.
+	def before():
+		transfer_pokemons = []
+		for pokemon in pokemons:
+			if not pokemon.is_egg:
+				if transfer_filter['logic'] == 'or':
+					transfer = pokemon.cp < transfer_filter['below_cp'] and pokemon.iv() < transfer_filter['below_iv']
+				else:
+					transfer = pokemon.cp < transfer_filter['below_cp'] or pokemon.iv() < transfer_filter['below_iv']
+
+				if transfer:
+					transfer_pokemons.append(pokemon)
+
+		return transfer_pokemons
+
+	return {
+		'before_ms': best_ms(before, args.repeat),
+		'after_ms': best_ms(lambda: rules.select(pokemons), args.repeat),
+		# The configured species rules plus keep_top 3 per species, which the
+		# old loop could not express.
+		'species_keep_top_ms': best_ms(lambda: species_rules.select(pokemons), args.repeat),
+		'same_selection': set(pokemon.id for pokemon in before()) == set(pokemon.id for pokemon in rules.select(pokemons))
+	}
+
+# How far function raises peak RSS, in kilobytes. It runs in a forked child,
+# whose high-water mark starts at its current size, so earlier runs do not
+# hide it.
+def peak_kb(function):
+	if not hasattr(os, 'fork'):
+		return None
+
+	read, write = os.pipe()
+	pid = os.fork()
+	if pid == 0:
+		try:
+			os.close(read)
+			started = peak_rss()
+			function()
+			os.write(write, str(peak_rss() - started).encode('ascii'))
+		finally:
+			os._exit(0)
+
+	os.close(write)
+	with os.fdopen(read) as result:
+		kb = result.read()
+	os.waitpid(pid, 0)
+
+	return int(kb) if kb else None
+
+@micro('feed', 10000, 100000)
+def bench_feed(config, args, size):
+	clock = VirtualClock()
+	world = SyntheticWorld(0, 0, forts=0, spawns=size, pokemons=0, clock=clock.time)
+	feed = world.feed()
+	caught = set(pokemon['encounter_id'] for pokemon in feed[::10])
+	clock.sleep(300)
+	count = config['catch_time_every_run']
+
+	# The old get_pokemons mapped every rarity, then sorted the whole feed
+	# twice; snipe_pokemon skipped expired and caught entries while walking
+	# the result.
+	def before(pokemons):
+		for pokemon in pokemons:
+			pokemon['pokemon_rarity'] = bot.feed.RARE_RATE[pokemon['pokemon_rarity']]
+
+		pokemons = sorted(pokemons, key=lambda k: k['disappear_time'])
+		pokemons = sorted(pokemons, key=lambda k: k['pokemon_rarity'], reverse=True)
+
+		now_ms = clock.time() * 1000
+		selected = []
+		for pokemon in pokemons:
+			if len(selected) >= count:
+				break
+			if pokemon['disappear_time'] > now_ms and pokemon['encounter_id'] not in caught:
+				selected.append(pokemon)
+
+		return selected
+
+	def after(pokemons):
+		for pokemon in pokemons:
+			pokemon['pokemon_rarity'] = bot.feed.RARE_RATE.get(pokemon['pokemon_rarity'], 0)
+
+		return bot.feed.select_pokemons(pokemons, count, True, 0, 0, caught.__contains__, clock.time())
+
+	def copy():
+		return [dict(pokemon) for pokemon in feed]
+
+	return {
+		'before_ms': best_ms(before, args.repeat, copy),
+		'after_ms': best_ms(after, args.repeat, copy),
+		# Both sides include the feed copy itself, peak_kb_copy.
+		'peak_kb_before': peak_kb(lambda: before(copy())),
+		'peak_kb_after': peak_kb(lambda: after(copy())),
+		'peak_kb_copy': peak_kb(copy)
+	}
+
+# A fresh database in the working directory, with one user named after it.
+def init_bench_db(name):
+	bot.models.init_db(os.path.join(os.getcwd(), name + '.db'))
+	bot.models.User.create_user(name)
+	return name
+
+# Catch rows with encounter ids '0'..str(count - 1), spread evenly over
+# [since, until). Written straight through sqlite3, which keeps a million
+# rows down to seconds.
+def insert_catchs(username, count, since, until):
+	user_id = bot.models.User.get_user_id(username)
+	step = float(until - since) / count
+	rows = (
+		(user_id, str(i), str(datetime.datetime.fromtimestamp(since + i * step)))
+		for i in range(count)
+	)
+
+	with bot.models.db.atomic():
+		bot.models.db.get_conn().executemany(
+			'INSERT INTO catch (user_id, encounter_id, created_date) VALUES (?, ?, ?)',
+			rows
+		)
+
+@micro('encounters', 1000, 10000)
+def bench_encounters(config, args, size):
+	username = init_bench_db('encounters-%d' % size)
+	now = time.time()
+	insert_catchs(username, size, now - 11 * 3600, now)
+
+	# One cycle's feed: a thousand spawns, a tenth of them already caught.
+	feed = [str(i * size // 100) if i < 100 else 'new-%d' % i for i in range(1000)]
+	caught = CaughtEncounters(username)
+
+	def before():
+		return [encounter_id for encounter_id in feed if not bot.models.Catch.check_catch(username, encounter_id)]
+
+	def after():
+		return [encounter_id for encounter_id in feed if encounter_id not in caught]
+
+	try:
+		warm_ms = best_ms(caught.warm, args.repeat)
+		result = {
+			'before_ms': best_ms(before, args.repeat),
+			'after_ms': best_ms(after, args.repeat),
+			'warm_ms': warm_ms,
+			'same_result': before() == after()
+		}
+	finally:
+		bot.models.db.close()
+
+	return result
+
+@micro('db_schema', 1000000)
+def bench_db_schema(config, args, size):
+	Catch = bot.models.Catch
+	User = bot.models.User
+
+	username = init_bench_db('schema-%d' % size)
+	now = time.time()
+	insert_catchs(username, size, now - 11 * 3600, now)
+	lookups = [str(i * size // 10) for i in range(10)] + ['new-%d' % i for i in range(10)]
+	expired = datetime.datetime.now() - datetime.timedelta(hours=12)
+
+	# The queries as they were before the schema revision: the user resolved
+	# through a subquery every time, on top of the foreign key index only.
+	def user():
+		return User.select().where(User.username == username)
+
+	def dedup_before():
+		for encounter_id in lookups:
+			Catch.select().where(Catch.user == user(), Catch.encounter_id == encounter_id).count()
+
+	def count_before():
+		Catch.delete().where(Catch.user == user(), Catch.created_date < expired).execute()
+		Catch.select().where(Catch.user == user()).count()
+
+	def dedup_after():
+		for encounter_id in lookups:
+			Catch.check_catch(username, encounter_id)
+
+	try:
+		result = {
+			'after_ms': best_ms(dedup_after, args.repeat),
+			'count_after_ms': best_ms(lambda: Catch.check_catch_count(username), args.repeat)
+		}
+
+		bot.models.db.execute_sql('DROP INDEX catch_user_id_encounter_id')
+		bot.models.db.execute_sql('DROP INDEX catch_user_id_created_date')
+		result.update({
+			'before_ms': best_ms(dedup_before, args.repeat),
+			'count_before_ms': best_ms(count_before, args.repeat),
+			'lookups': len(lookups)
+		})
+	finally:
+		bot.models.db.close()
+
+	return result
+
+# One bot process's database traffic: every catch is its own transaction,
+# followed by a count of the account's catches.
+def db_writer(path, pragmas, user_id, count, results):
+	connection = sqlite3.connect(path, timeout=30)
+	for name, value in pragmas:
+		connection.execute('PRAGMA %s = %s' % (name, value))
+
+	locked = 0
+	for i in range(count):
+		try:
+			with connection:
+				connection.execute(
+					'INSERT INTO catch (user_id, encounter_id, created_date) VALUES (?, ?, ?)',
+					(user_id, str(i), str(datetime.datetime.now()))
+				)
+			connection.execute('SELECT COUNT(*) FROM catch WHERE user_id = ?', (user_id,)).fetchone()
+		except sqlite3.OperationalError:
+			locked += 1
+
+	connection.close()
+	results.put(locked)
+
+def run_db_writers(path, pragmas, processes, count):
+	results = multiprocessing.Queue()
+	workers = [
+		multiprocessing.Process(target=db_writer, args=(path, pragmas, user_id, count, results))
+		for user_id in range(1, processes + 1)
+	]
+
+	started = timeit.default_timer()
+	for worker in workers:
+		worker.start()
+	for worker in workers:
+		worker.join()
+	elapsed = timeit.default_timer() - started
+
+	return elapsed, sum(results.get() for worker in workers)
+
+@micro('db_concurrency', 1, 4, 8)
+def bench_db_concurrency(config, args, size):
+	count = 200
+	paths = {}
+	for mode in ('before', 'after'):
+		paths[mode] = os.path.join(os.getcwd(), 'concurrency-%s-%d.db' % (mode, size))
+		bot.models.init_db(paths[mode])
+		for i in range(size):
+			bot.models.User.create_user('writer-%d' % i)
+
+	# The database as it was before: rollback journal, full fsync on every
+	# commit, default cache.
+	connection = sqlite3.connect(paths['before'])
+	connection.execute('PRAGMA journal_mode = delete')
+	connection.close()
+
+	before, before_locked = run_db_writers(paths['before'], (('synchronous', 'full'),), size, count)
+	after, after_locked = run_db_writers(paths['after'], bot.models.db_pragmas, size, count)
+
+	return {
+		'before_ms': round(before * 1000, 3),
+		'after_ms': round(after * 1000, 3),
+		'before_locked': before_locked,
+		'after_locked': after_locked,
+		'transactions_per_second_before': int(size * count / before),
+		'transactions_per_second_after': int(size * count / after)
+	}
+
+@micro('fort_index', 100000)
+def bench_fort_index(config, args, size):
+	lat, lng = [float(x) for x in config['location'].split(',')]
+	rng = random.Random(0)
+
+	# Forts spread over about 20 km around the start, a tenth on cooldown.
+	forts = [{
+		'id': 'fort-%d' % i,
+		'latitude': lat + rng.uniform(-0.1, 0.1),
+		'longitude': lng + rng.uniform(-0.1, 0.1)
+	} for i in range(size)]
+	now = time.time()
+
+	started = timeit.default_timer()
+	index = FortIndex(clock=lambda: now)
+	index.add_forts(forts, False)
+	for fort in forts[::10]:
+		index.set_cooldown(fort['id'])
+	build_ms = round((timeit.default_timer() - started) * 1000, 3)
+
+	queries = [(lat + rng.uniform(-0.1, 0.1), lng + rng.uniform(-0.1, 0.1)) for i in range(20)]
+	now_ms = now * 1000
+
+	# Every query used to rank all known forts by distance.
+	def before():
+		nearest = []
+		for query_lat, query_lng in queries:
+			available = [fort for fort in forts if index.available(fort['id'], now_ms)]
+			distances = bot.geometry.distances(
+				query_lat,
+				query_lng,
+				[(fort['latitude'], fort['longitude']) for fort in available]
+			)
+			nearest.append(min(zip(distances, range(len(available)), available))[2]['id'])
+		return nearest
+
+	def after():
+		return [index.nearest(query_lat, query_lng)['id'] for query_lat, query_lng in queries]
+
+	before_ms = best_ms(before, args.repeat)
+	after_ms = best_ms(after, args.repeat)
+	return {
+		'before_ms': before_ms,
+		'after_ms': after_ms,
+		'per_query_ms': round(after_ms / len(queries), 4),
+		'build_ms': build_ms,
+		'same_result': before() == after()
+	}
+
+# Walks a simulated hour at step_diameter metres per second, spinning every
+# fort it reaches; each spin puts the fort on the usual five minute cooldown.
+def simulate_spins(lat, lng, forts, speed, choose, now, seconds=3600, spin_seconds=5):
+	index = FortIndex(clock=lambda: clock[0])
+	index.add_forts(forts, False)
+	clock = [now]
+	choose = choose(index)
+
+	spins = 0
+	walked = 0
+	while clock[0] < now + seconds:
+		fort = choose(lat, lng)
+		if fort is None:
+			clock[0] += 10
+			continue
+
+		meters = bot.geometry.distance(lat, lng, fort['latitude'], fort['longitude'])
+		clock[0] += meters / speed + spin_seconds
+		walked += meters
+		lat, lng = fort['latitude'], fort['longitude']
+
+		if index.available(fort['id'], clock[0] * 1000):
+			index.set_cooldown(fort['id'])
+			spins += 1
+
+	return spins, walked
+
+@micro('route', 50, 200)
+def bench_route(config, args, size):
+	lat, lng = [float(x) for x in config['location'].split(',')]
+	speed = config['step_diameter']
+	rng = random.Random(0)
+
+	# Forts within about a kilometre of the start.
+	forts = [{
+		'id': 'fort-%d' % i,
+		'latitude': lat + rng.uniform(-0.01, 0.01),
+		'longitude': lng + rng.uniform(-0.01, 0.01)
+	} for i in range(size)]
+	now = time.time()
+
+	# Before: always walk to the nearest fort that is off cooldown.
+	def greedy(index):
+		return index.nearest
+
+	# After: what nearst_fort does with route_stops set.
+	def planned(index):
+		planner = RoutePlanner(index, speed)
+		return lambda lat, lng: planner.next_fort(lat, lng) or index.nearest(lat, lng)
+
+	before_spins, before_walked = simulate_spins(lat, lng, forts, speed, greedy, now)
+	after_spins, after_walked = simulate_spins(lat, lng, forts, speed, planned, now)
+
+	return {
+		'before_ms': best_ms(lambda: simulate_spins(lat, lng, forts, speed, greedy, now), args.repeat),
+		'after_ms': best_ms(lambda: simulate_spins(lat, lng, forts, speed, planned, now), args.repeat),
+		'spins_per_hour_before': before_spins,
+		'spins_per_hour_after': after_spins,
+		'meters_per_spin_before': round(before_walked / max(before_spins, 1), 1),
+		'meters_per_spin_after': round(after_walked / max(after_spins, 1), 1)
+	}
+
+@micro('cells', 1000, 10000)
+def bench_cells(config, args, size):
+	lat, lng = [float(x) for x in config['location'].split(',')]
+
+	# A walk in ten metre steps: one cell id lookup per step.
+	positions = [(lat + i * 0.00009, lng + i * 0.00005) for i in range(size)]
+
+	def before():
+		return [utilities.get_cell_ids(step_lat, step_lng) for step_lat, step_lng in positions]
+
+	def after():
+		cache = CellCache()
+		return [cache.cell_ids(step_lat, step_lng) for step_lat, step_lng in positions]
+
+	return {
+		'before_ms': best_ms(before, args.repeat),
+		'after_ms': best_ms(after, args.repeat),
+		'same_result': before() == after()
+	}
+
+@micro('geometry', 10000, 100000, 1000000)
+def bench_geometry(config, args, size):
+	lat, lng = [float(x) for x in config['location'].split(',')]
+	rng = random.Random(0)
+	points = [(lat + rng.uniform(-0.1, 0.1), lng + rng.uniform(-0.1, 0.1)) for i in range(size)]
+
+	# One gpxpy call per point, as map cells, feed candidates and forts were
+	# measured before.
+	def before():
+		haversine = gpxpy.geo.haversine_distance
+		return [haversine(lat, lng, point_lat, point_lng) for point_lat, point_lng in points]
+
+	def after():
+		return bot.geometry.distances(lat, lng, points)
+
+	return {
+		'before_ms': best_ms(before, args.repeat),
+		'after_ms': best_ms(after, args.repeat),
+		'max_error_m': max(abs(a - b) for a, b in zip(before(), after()))
+	}
+
+# The step loop walk_to_fort used to run: move one step, then measure the
+# distance left with gpxpy, until within epsilon of the fort. With steps
+# longer than epsilon it could walk past the fort forever, so it stops after
+# one step beyond it here.
+def legacy_walk(lat, lng, to_lat, to_lng, step, epsilon=10):
+	dist = gpxpy.geo.haversine_distance(lat, lng, to_lat, to_lng)
+	divisions = dist / step or 1
+	d_lat = (lat - to_lat) / divisions
+	d_lng = (lng - to_lng) / divisions
+
+	path = []
+	while dist > epsilon and len(path) <= divisions:
+		lat -= d_lat
+		lng -= d_lng
+		dist = gpxpy.geo.haversine_distance(lat, lng, to_lat, to_lng)
+		path.append((lat, lng, dist))
+
+	return path
+
+@micro('walk_path', 100, 1000)
+def bench_walk_path(config, args, size):
+	lat, lng = [float(x) for x in config['location'].split(',')]
+	step = config['step_diameter']
+	rng = random.Random(0)
+
+	# Walks of up to about a kilometre, the range forts are picked from.
+	walks = [(lat + rng.uniform(-0.007, 0.007), lng + rng.uniform(-0.007, 0.007)) for i in range(size)]
+
+	def before():
+		return [legacy_walk(lat, lng, to_lat, to_lng, step) for to_lat, to_lng in walks]
+
+	def after():
+		return [bot.geometry.walk_path(lat, lng, to_lat, to_lng, step) for to_lat, to_lng in walks]
+
+	before_paths = before()
+	after_paths = after()
+	return {
+		'before_ms': best_ms(before, args.repeat),
+		'after_ms': best_ms(after, args.repeat),
+		'steps': sum(len(path) for path in after_paths),
+		'same_steps': [len(path) for path in before_paths] == [len(path) for path in after_paths]
+	}
+
+# Runs function in a forked child and returns the dict it returned, so file
+# descriptors and handlers it leaks do not outlive it.
+def in_child(function):
+	read, write = os.pipe()
+	pid = os.fork()
+	if pid == 0:
+		try:
+			os.close(read)
+			os.write(write, json.dumps(function()).encode('utf-8'))
+		finally:
+			os._exit(0)
+
+	os.close(write)
+	with os.fdopen(read) as result:
+		data = result.read()
+	os.waitpid(pid, 0)
+
+	return json.loads(data) if data else None
+
+def open_fds():
+	return len(os.listdir('/proc/self/fd'))
+
+# Resident set size now, rather than its high-water mark.
+def rss_kb():
+	with open('/proc/self/statm') as statm:
+		return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+def logging_state(name):
+	return {
+		'root_handlers': len(logging.getLogger().handlers),
+		'account_handlers': len(logging.getLogger(name).handlers),
+		'fds': open_fds(),
+		'rss_kb': rss_kb()
+	}
+
+# Soak test for the logging pipeline: log in `size` times, as a bot does
+# every time its token expires, and check that handlers, open files and
+# memory stay flat.
+@micro('log_soak', 500, 1500)
+def bench_log_soak(config, args, size):
+	if not os.path.isdir('/proc/self/fd'):
+		return {}
+
+	username = init_bench_db('soak-%d' % size)
+	world = SyntheticWorld(0, 0, forts=0, spawns=0, pokemons=50, username=username)
+	api = FakeApi(world)
+
+	# What trainer_info used to do on every login.
+	def before():
+		logging.disable(logging.NOTSET)
+		root = logging.getLogger()
+		for handler in list(root.handlers):
+			root.removeHandler(handler)
+
+		started = logging_state(username)
+		for i in range(size):
+			account = logging.getLogger(username)
+			account.setLevel(logging.INFO)
+			handler = logging.FileHandler('log/before.log')
+			handler.setFormatter(logging.Formatter(bot.log.LOG_FORMAT))
+			account.addHandler(handler)
+			account.info('Login %d', i)
+
+		return {'started': started, 'finished': logging_state(username)}
+
+	def after():
+		logging.disable(logging.NOTSET)
+		bot.log.setup({'log': {'file': 'log/after.log', 'console': False}})
+
+		account = Bot(dict(config, username=username), Scheduler(VirtualClock()), api_factory=lambda: api)
+		account.login()
+		started = logging_state(username)
+		for i in range(size):
+			account.login()
+
+		# Stopping the listener drains the queue, so a backlog of records
+		# does not count as growth.
+		with bot.log.paused():
+			finished = logging_state(username)
+
+		bot.log.shutdown()
+		return {'started': started, 'finished': finished}
+
+	result = {}
+	for side, function in (('before', before), ('after', after)):
+		state = in_child(function)
+		for key in ('root_handlers', 'account_handlers', 'fds'):
+			result['%s_%s' % (side, key)] = [state['started'][key], state['finished'][key]]
+		result['%s_rss_growth_kb' % side] = state['finished']['rss_kb'] - state['started']['rss_kb']
+
+	bot.models.db.close()
+	return result
+
+
+if __name__ == '__main__':
+	main()
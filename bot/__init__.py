@@ -1,36 +1,42 @@
 # -*- coding: utf-8 -*-
 
-import os
 import logging
-import json
-import time
-import gpxpy.geo
-import requests
 import base64
 import datetime
 from random import uniform
 
 # import Pokemon Go API lib
 from pgoapi import pgoapi
-from pgoapi import utilities
 from pgoapi.exceptions import NotLoggedInException
 from pgoapi.exceptions import AuthException
 from pgoapi.exceptions import ServerSideRequestThrottlingException
 
-from bot.base_dir import _base_dir
 from bot.item_list import Item
 from bot.pokemon import Pokemon
-from bot.fort import Fort
+from bot.fort import Fort, FortCache
 from bot.inventory import Inventory
+from bot.feed import FeedPrefetcher
+from bot.encounters import CaughtEncounters
+from bot.limits import RollingCounter
+from bot.persistence import WriteBehind
+from bot.batch import RequestBatch
+from bot.fort_index import FortIndex
+from bot.route import RoutePlanner
+from bot.clock import Scheduler
+from bot.rate_limit import RateLimitedApi
+from bot.cells import CellCache
+from bot.metrics import metrics, timed
+from bot.profiler import phase
+from bot.session import Session
 
 import bot.models
+import bot.game_data
+import bot.feed
+import bot.geometry
 import bot.fort
 import bot.inventory
+import bot.log
 
-logging.basicConfig(
-	level=logging.INFO,
-	format='%(asctime)s [%(name)s] [%(levelname)s] %(message)s')
-logFormatter = logging.Formatter('%(asctime)s [%(name)s] [%(levelname)s] %(message)s')
 logger = logging.getLogger('init')
 logger.setLevel(logging.INFO)
 
@@ -42,17 +48,12 @@ ENCOUNTER_STATUS_SUCCESS = 1
 ENCOUNTER_STATUS_NOT_IN_RANGE = 5
 ENCOUNTER_STATUS_POKEMON_INVENTORY_FULL = 7
 
-URL = 'http://p.cve.tw:5566/'
-
 class Bot(object):
-	def __init__(self, config):
+	def __init__(self, config, scheduler=None, api_factory=None):
 		self.config = config
-		self.pokemon_list = json.load(
-			open(os.path.join(_base_dir, 'data', 'pokemon.json'))
-		)
-		self.item_list = json.load(
-			open(os.path.join(_base_dir, 'data', 'items.json'))	
-		)
+		self.scheduler = scheduler or Scheduler()
+		self.api_factory = api_factory or pgoapi.PGoApi
+		self.item_list = bot.game_data.item_list()
 		self.fort = None
 		self.api = None
 		self.lat = None
@@ -62,32 +63,110 @@ class Bot(object):
 		self.inventorys = None
 		self.ban = False
 		self.unban_try = 0
+		self.feed = FeedPrefetcher(
+			self.config.get('feed_url', bot.feed.URL),
+			interval = self.config.get('feed_interval', 30),
+			clock = self.scheduler.time
+		)
+		self.caught = CaughtEncounters(self.config['username'], clock=self.scheduler.time)
+		self.catch_counter = None
+		self.spin_counter = None
+		self.writer = WriteBehind(
+			self.config['username'],
+			self.config.get('db_flush_interval', 10),
+			clock = self.scheduler.time
+		)
+		self.cycles = 0
+		self.session = Session(
+			self,
+			self.config.get('recover_backoff', 2),
+			self.config.get('recover_max_backoff', 300)
+		)
+		self.fort_index = FortIndex(clock=self.scheduler.time)
+		self.fort_cache = FortCache(clock=self.scheduler.time)
+		self.cells = CellCache()
+		# Multi-stop route planning is opt-in: in the spin simulator it gains
+		# only a few spins an hour over walking to the nearest fort.
+		self.route = None
+		if self.config.get('route_stops'):
+			self.route = RoutePlanner(
+				self.fort_index,
+				self.config['step_diameter'],
+				self.config['route_stops'],
+				self.config.get('route_radius', 1000)
+			)
 
 	def start(self):
-		self.login()
+		self.setup()
 
 		while True:
-			try:
+			self.run_cycle()
+
+	def setup(self):
+		self.caught.warm()
+		self.catch_counter = RollingCounter(
+			(created for encounter_id, created in bot.models.Catch.get_catchs(self.config['username'])),
+			clock = self.scheduler.time
+		)
+		self.spin_counter = RollingCounter(
+			bot.models.Pokestop.get_spins(self.config['username']),
+			clock = self.scheduler.time
+		)
+		self.fort_index.load(self.config['username'])
+		self.fort_cache.load()
+
+		# Background threads would run on wall-clock time, so under a virtual
+		# clock the same work is driven by the scheduler instead.
+		if self.scheduler.clock.virtual:
+			self.scheduler.every(self.writer.interval, self.writer.flush)
+			self.scheduler.every(self.feed.interval, self.feed.refresh, 0)
+		else:
+			self.writer.start()
+			self.feed.start()
+
+		self.scheduler.every(3600, self.prune_limits, 0)
+		if self.config.get('metrics_dump_interval'):
+			self.scheduler.every(self.config['metrics_dump_interval'], self.dump_metrics)
+
+		self.login()
+
+	def run_cycle(self):
+		try:
+			with metrics.timer('cycle'):
 				self.spin_fort()
 				self.check_farming()
 				if not self.farming_mode:
 					self.snipe_pokemon()
-					self.check_awarded_badges()
-					self.inventorys.check_pokemons()
+
+					batch = RequestBatch(self.api)
+					self.check_awarded_badges(batch)
+					self.inventorys.check_pokemons(batch)
+					batch.call()
 
 				self.check_limit()
+			self.cycles += 1
+			self.session.succeeded()
+			metrics.inc('cycles_total', account=self.config['username'])
 
-			except (AuthException, NotLoggedInException, ServerSideRequestThrottlingException, TypeError, KeyError) as e:
-				self.logger.error(e)
-				self.logger.info(
-					'Token Expired, wait for 20 seconds.'
-				)
-				time.sleep(20)
-				self.login()
-				continue
+		except (AuthException, NotLoggedInException, ServerSideRequestThrottlingException, TypeError, KeyError) as e:
+			metrics.inc('cycle_errors_total', account=self.config['username'], error=type(e).__name__)
+			self.logger.error(e)
+			self.session.recover(e)
+
+	def stop(self):
+		self.feed.stop()
+		self.writer.stop()
+
+	def dump_metrics(self):
+		metrics.dump(self.config.get('metrics_file', 'log/metrics.json'))
 
 	def login(self):
-		self.api = pgoapi.PGoApi()
+		metrics.inc('logins_total', account=self.config['username'])
+		self.api = RateLimitedApi(
+			self.api_factory(),
+			self.scheduler,
+			self.config.get('rate_limit')
+		)
 
 		self.get_location()
 
@@ -97,18 +176,26 @@ class Bot(object):
 			self.lng
 		)
 		self.set_location(self.lat, self.lng, False)
+		self.authenticate()
+		self.api.activate_signature(self.config['encrypt_location'])
+
+		self.trainer_info()
+
+		batch = RequestBatch(self.api)
+		self.inventorys.check_items(batch)
+		self.inventorys.check_pokemons(batch)
+		batch.call()
+
+		self.dump_best_pokemons()
+
+	def authenticate(self):
 		self.api.set_authentication(
 			provider = self.config['auth_service'], 
 			username = self.config['username'],
 			password = self.config['password'],
 		)
-		self.api.activate_signature(self.config['encrypt_location'])
-
-		self.trainer_info()
-		self.inventorys.check_items()
-		self.inventorys.check_pokemons()
-		self.dump_best_pokemons()
 
+	@phase('check_farming')
 	def check_farming(self):
 		pokemonball_rate = self.config['farming_mode']['all_pokeball']
 		potion_rate = self.config['farming_mode']['all_potion']
@@ -134,33 +221,49 @@ class Bot(object):
 					)
 				self.farming_mode = False
 
+	def prune_limits(self):
+		# Rows are stamped from the scheduler clock, so they expire by it too.
+		now = datetime.datetime.fromtimestamp(self.scheduler.time())
+		bot.models.Catch.prune_catchs(self.config['username'], now)
+		bot.models.Pokestop.prune_spins(self.config['username'], now)
+		bot.models.FortCooldown.prune_cooldowns(self.config['username'], self.scheduler.time() * 1000)
+
+		self.logger.info(
+			'Fort cache: %d%% hit ratio (%d hits, %d misses), fort_details took %.2f seconds on average, about %d seconds saved.',
+			self.fort_cache.hit_ratio() * 100,
+			self.fort_cache.hits,
+			self.fort_cache.misses,
+			self.fort_cache.mean_fetch_seconds(),
+			self.fort_cache.seconds_saved()
+		)
+
+	@phase('check_limit')
 	def check_limit(self):
-		catch_count = bot.models.Catch.check_catch_count(self.config['username'])
-		spin_count = bot.models.Pokestop.check_spin_count(self.config['username'])
+		catch_count = self.catch_counter.count()
+		spin_count = self.spin_counter.count()
+		metrics.set('daily_catches', catch_count, account=self.config['username'])
+		metrics.set('daily_spins', spin_count, account=self.config['username'])
 
 		if catch_count >= self.config['daily_limit']['catch'] or spin_count >= self.config['daily_limit']['spin']:
 			self.logger.info('Reach the daily limit... Sleep for 12 hours...')
 			for i in range(0, 12):
 				self.logger.info('Sleeping...')
-				time.sleep(3600)
+				self.scheduler.sleep(3600)
 
 	def dump_best_pokemons(self):
-		best_cp_pokemons = sorted(self.inventorys.pokemons, key=lambda k: k.cp, reverse=True) 
 		self.logger.info('====== Best CP ======')
-		for pokemon in best_cp_pokemons:
-			if pokemon.cp >= self.config['transfer_filter']['below_cp']:
-				self.logger.info(
-					'%s [CP %s] [IV %s] [Move 1] %s [Move 2] %s',
-					pokemon.name,
-					pokemon.cp,
-					pokemon.iv(),
-					pokemon.move_1,
-					pokemon.move_2
-				)
+		for pokemon in self.inventorys.pokemons.best_cp(self.config['transfer_filter']['below_cp']):
+			self.logger.info(
+				'%s [CP %s] [IV %s] [Move 1] %s [Move 2] %s',
+				pokemon.name,
+				pokemon.cp,
+				pokemon.iv(),
+				pokemon.move_1,
+				pokemon.move_2
+			)
 
-		best_iv_pokemons = sorted(self.inventorys.pokemons, key=lambda k: k.iv(), reverse=True) 
 		self.logger.info('====== Best IV ======')
-		for pokemon in best_iv_pokemons:
+		for pokemon in self.inventorys.pokemons.best_iv():
 			if pokemon.cp >= self.config['transfer_filter']['below_iv']:
 				self.logger.info(
 					'%s [CP %s] [IV %s] [Move 1] %s [Move 2] %s',
@@ -171,58 +274,62 @@ class Bot(object):
 					pokemon.move_2
 				)
 
+	@phase('snipe_pokemon')
 	def snipe_pokemon(self):
 		pokemons = self.get_pokemons()
 
 		snipe_count = 0
 		vanished = 0
 		for pokemon_encounter in pokemons:
-			if pokemon_encounter['encounter_id'] and not bot.models.Catch.check_catch(self.config['username'], pokemon_encounter['encounter_id']):
-				if snipe_count >= self.config['catch_time_every_run']:
-					break
+			if snipe_count >= self.config['catch_time_every_run']:
+				break
 
-				self.set_location(pokemon_encounter['latitude'], pokemon_encounter['longitude'], True)
-				response = self.create_encounter_call(pokemon_encounter)
+			self.set_location(pokemon_encounter['latitude'], pokemon_encounter['longitude'], True)
+			response = self.create_encounter_call(pokemon_encounter)
 
-				pokemon_data = response['wild_pokemon']['pokemon_data'] if 'wild_pokemon' in response else None
-				if not pokemon_data:
-					self.logger.warning(
-						'The pokemon maybe disappeared.'
-					)
-					self.set_location(self.lat, self.lng, True)
-					snipe_count += 1
-					continue
+			pokemon_data = response['wild_pokemon']['pokemon_data'] if 'wild_pokemon' in response else None
+			if not pokemon_data:
+				self.logger.warning(
+					'The pokemon maybe disappeared.'
+				)
+				self.set_location(self.lat, self.lng, True)
+				snipe_count += 1
+				continue
 
 
-				pokemon = Pokemon(self.pokemon_list, pokemon_data, pokemon_encounter)
+			pokemon = Pokemon(pokemon_data, pokemon_encounter)
 
-				self.logger.info(
-					'%s Appeared! [CP %s] [IV %s] [A/D/S %s]',
-					pokemon.name,
-					pokemon.cp,
-					pokemon.iv(),
-					pokemon.iv_display()
-				)
+			self.logger.info(
+				'%s Appeared! [CP %s] [IV %s] [A/D/S %s]',
+				pokemon.name,
+				pokemon.cp,
+				pokemon.iv(),
+				pokemon.iv_display()
+			)
 
-				self.set_location(self.lat, self.lng, True)
+			self.set_location(self.lat, self.lng, True)
 
-				catch_rate = [0] + response['capture_probability']['capture_probability']
-				pokemon.id = self.do_catch(pokemon, catch_rate)
+			catch_rate = [0] + response['capture_probability']['capture_probability']
+			pokemon.id = self.do_catch(pokemon, catch_rate)
 
-				if pokemon.id == 0:
-					vanished += 1
+			if pokemon.id == 0:
+				vanished += 1
 
-				bot.models.Catch.insert_catch(self.config['username'], pokemon_encounter['encounter_id'])
+			self.caught.add(pokemon_encounter['encounter_id'])
+			self.writer.insert_catch(pokemon_encounter['encounter_id'])
+			self.catch_counter.add()
+			metrics.inc('catches_total', account=self.config['username'])
 
-				if pokemon.id != 0:
-					self.inventorys.pokemons.append(pokemon)
-				
-				snipe_count += 1
+			if pokemon.id != 0:
+				self.inventorys.pokemons.append(pokemon)
+			
+			snipe_count += 1
 
-				if vanished >= self.config['catch_time_every_run']:
-					self.ban = True
-				
+			if vanished >= self.config['catch_time_every_run']:
+				self.ban = True
+			
 
+	@phase('do_catch')
 	def do_catch(self, pokemon, catch_rate_by_ball):
 		berry_id = bot.inventory.ITEM_RAZZ_BERRY
 		maximum_ball = bot.inventory.ITEM_ULTRA_BALL
@@ -284,9 +391,6 @@ class Bot(object):
 			except IndexError:
 				self.ban = True
 
-
-			time.sleep(0.1)
-
 			if not self.ban:
 				response_dict = self.api.catch_pokemon(
 					encounter_id = pokemon.encounter_id[0],
@@ -302,7 +406,7 @@ class Bot(object):
 					self.logger.error('unban failed, sleep for 5 hours.')
 					for i in range(0, 5):
 						self.logger.info('Sleeping...')
-						time.sleep(3600)
+						self.scheduler.sleep(3600)
 
 					self.ban = False
 					self.unban_try = 0
@@ -310,7 +414,7 @@ class Bot(object):
 
 				self.logger.error('Probably got softban, do unban..')
 				for i in range(0, 20):
-					time.sleep(1)
+					self.scheduler.sleep(1)
 					if self.inventorys.items[bot.inventory.ITEM_POKE_BALL] != 0:
 						current_ball = bot.inventory.ITEM_POKE_BALL
 					elif self.inventorys.items[bot.inventory.ITEM_GREAT_BALL] != 0:
@@ -343,7 +447,7 @@ class Bot(object):
 					'%s capture failed.. trying again!',
 					pokemon.name
 				)
-				time.sleep(0.1)
+				self.scheduler.sleep(0.1)
 				continue
 
 			elif catch_pokemon_status == CATCH_STATUS_VANISHED:
@@ -417,39 +521,29 @@ class Bot(object):
 			minimum + (maximum - minimum) * factor,
 			maximum)
 
+	@timed('get_pokemons')
 	def get_pokemons(self):
 		self.logger.info(
 			'Do some magic to get pokemons..'
 		)
 
-		try:
-			responses = requests.get(URL + 'raw_data?pokemon=true&pokestops=false&gyms=false&scanned=false&spawnpoints=false', verify=False).json()['pokemons']
-
-			rare_rate = {
-				u'常見': 0,
-				u'少見': 1,
-				u'罕見': 2,
-				u'非常罕見': 3,
-				u'超罕見': 4
-			}
-
-			for pokemon in responses:
-				pokemon['pokemon_rarity'] = rare_rate[pokemon['pokemon_rarity']]
+		if self.feed.snapshot is None:
+			self.feed.refresh()
 
-			responses = sorted(responses, key=lambda k: k['disappear_time']) 
+		if self.feed.snapshot is None:
+			return []
 
-			if self.config['rare_first']:
-				responses = sorted(responses, key=lambda k: k['pokemon_rarity'], reverse=True) 
-
-			return responses
-		except requests.exceptions.ConnectionError:
-			self.logger.error(
-				'Feed server is unstable, skip this :('
-			)
-			return None
+		return bot.feed.select_pokemons(
+			self.feed.snapshot,
+			self.config['catch_time_every_run'],
+			self.config['rare_first'],
+			self.lat,
+			self.lng,
+			lambda encounter_id: encounter_id in self.caught,
+			self.scheduler.time()
+		)
 
-	def create_encounter_call(self, pokemon):		
-		time.sleep(0.1)
+	def create_encounter_call(self, pokemon):
 		response_dict = self.api.encounter(
 			encounter_id = long(base64.b64decode(pokemon['encounter_id'])),
 			spawn_point_id = pokemon['spawnpoint_id'],
@@ -459,10 +553,10 @@ class Bot(object):
 
 		return response_dict
 
+	@phase('spin_fort')
 	def spin_fort(self):
 		self.walk_to_fort()
 
-		time.sleep(1)
 		response_dict = self.api.fort_search(
 			fort_id = self.fort.id,
 			fort_latitude = self.fort.lat,
@@ -474,12 +568,21 @@ class Bot(object):
 		if 'responses' in response_dict and 'FORT_SEARCH' in response_dict['responses']:
 			spin_details = response_dict['responses']['FORT_SEARCH']
 			spin_result = spin_details.get('result', -1)
+			if spin_result in (bot.fort.SPIN_REQUEST_RESULT_SUCCESS, bot.fort.SPIN_REQUEST_RESULT_IN_COOLDOWN_PERIOD):
+				cooldown = self.fort_index.set_cooldown(
+					self.fort.id,
+					spin_details.get('cooldown_complete_timestamp_ms')
+				)
+				self.writer.set_cooldown(self.fort.id, cooldown)
+
 			if spin_result == bot.fort.SPIN_REQUEST_RESULT_SUCCESS:
 				experience_awarded = spin_details.get('experience_awarded', 0)
 
 
 				items_awarded = self.get_items_awarded_from_fort_spinned(response_dict)
-				bot.models.Pokestop.insert_spin(self.config['username'])
+				self.writer.insert_spin()
+				self.spin_counter.add()
+				metrics.inc('spins_total', account=self.config['username'])
 
 				if experience_awarded or items_awarded:
 					self.logger.info(
@@ -497,13 +600,14 @@ class Bot(object):
 				)
 
 
+	@phase('walk_to_fort')
 	def walk_to_fort(self):
 		self.nearst_fort()
 
 		olatitude = self.fort.lat
 		olongitude = self.fort.lng
 
-		dist = closest = gpxpy.geo.haversine_distance(
+		dist = bot.geometry.distance(
 			self.lat, 
 			self.lng, 
 			olatitude, 
@@ -518,20 +622,20 @@ class Bot(object):
 			int(dist / self.config['step_diameter'])
 		)
 
-		divisions = closest / self.config['step_diameter']
-		if divisions == 0:
-			divisions = 1
-
-		dLat = (self.lat - olatitude) / divisions
-		dLon = (self.lng - olongitude) / divisions
+		path = bot.geometry.walk_path(
+			self.lat,
+			self.lng,
+			olatitude,
+			olongitude,
+			self.config['step_diameter']
+		)
 
-		epsilon = 10
 		delay = 10
 		
 		steps = 1
-		while dist > epsilon:
-			self.lat -= dLat
-			self.lng -= dLon
+		for lat, lng, dist in path:
+			self.lat = lat
+			self.lng = lng
 			steps %= delay
 			if steps == 0:
 				self.set_location(
@@ -540,13 +644,7 @@ class Bot(object):
 					False
 				)
 			
-			time.sleep(1)
-			dist = gpxpy.geo.haversine_distance(
-				self.lat,
-				self.lng,
-				olatitude,
-				olongitude
-			)
+			self.scheduler.sleep(1)
 			steps += 1
 
 			if steps % 10 == 0:
@@ -560,7 +658,7 @@ class Bot(object):
 
 		steps -= 1
 		if steps % delay > 0:
-			time.sleep(delay - steps)
+			self.scheduler.sleep(delay - steps)
 			self.set_location(
 				self.lat,
 				self.lng,
@@ -568,58 +666,59 @@ class Bot(object):
 			)
 
 	def nearst_fort(self):
-		cells = self.get_map_objects()
-		forts = []
-
-		for cell in cells:
-			if 'forts' in cell and len(cell['forts']):
-				forts += cell['forts']
-
-		for fort in forts:
-			if 'cooldown_complete_timestamp_ms' not in fort:
-				self.fort = Fort(fort, self.api)
-				break
+		if self.fort_index.is_stale(self.lat, self.lng, self.config.get('map_refresh', 300)):
+			cells = self.get_map_objects()
+			forts = []
+
+			for cell in cells:
+				if 'forts' in cell and len(cell['forts']):
+					forts += cell['forts']
+
+			if cells:
+				self.fort_index.add_forts(forts)
+				self.fort_index.mark_fetched(self.lat, self.lng)
+
+		fort = None
+		if self.route is not None:
+			fort = self.route.next_fort(self.lat, self.lng)
+		if fort is None:
+			fort = self.fort_index.nearest(self.lat, self.lng)
+		if fort:
+			self.fort = Fort(fort, self.api, self.fort_cache)
 
 	def get_map_objects(self):
-		time.sleep(1)
+		cell_id = self.cells.cell_ids(self.lat, self.lng)
+		timestamp = self.cells.since_timestamps(cell_id)
 
-		cell_id = utilities.get_cell_ids(self.lat, self.lng)
-		timestamp = [0, ] * len(cell_id) 
-
-		map_dict = self.api.get_map_objects(
+		batch = RequestBatch(self.api)
+		batch.add(
+			'get_map_objects',
 			latitude = self.lat,
 			longitude = self.lng,
 			since_timestamp_ms = timestamp,
 			cell_id = cell_id
 		)
+		self.inventorys.update_inventory(batch)
 
-		map_objects = map_dict.get(
-			'responses', {}
-		).get('GET_MAP_OBJECTS', {})
+		map_objects = batch.call().get('GET_MAP_OBJECTS', {})
 		status = map_objects.get('status', None)
 
 		map_cells = []
 		if status and status == 1:
 			map_cells = map_objects['map_cells']
-			map_cells.sort(
-				key=lambda x: gpxpy.geo.haversine_distance(
-					self.lat, 
-					self.lng, 
-					x['forts'][0]['latitude'], 
-					x['forts'][0]['longitude']
-				) if x.get('forts', []) else 1e6
+			self.cells.update(map_cells)
+			map_cells = bot.geometry.sort_by_distance(
+				self.lat,
+				self.lng,
+				map_cells,
+				lambda x: (x['forts'][0]['latitude'], x['forts'][0]['longitude']) if x.get('forts', []) else None
 			)
 		
 		return map_cells
 
 	def trainer_info(self):
 		player = self.get_player_data()
-		self.logger = logging.getLogger(player['username'])
-		self.logger.setLevel(logging.INFO)
-
-		fileHandler = logging.FileHandler("{0}/{1}.log".format('log', 'bot'))
-		fileHandler.setFormatter(logFormatter)
-		self.logger.addHandler(fileHandler)
+		self.logger = bot.log.account_logger(player['username'])
 
 		self.inventorys = Inventory(self.api, self.config, self.logger)
 		
@@ -677,18 +776,18 @@ class Bot(object):
 			' | MaxRevive: ' + str(self.inventorys.items[202]))
 
 	def get_player_data(self):
-		time.sleep(1)
 		player_data = self.api.get_player()['responses']['GET_PLAYER']['player_data']
 		
 		return player_data
 
 	def set_location(self, lat, lng, snipe):
-		time.sleep(0.5)
 		self.api.set_position(lat, lng, 0.0)
 		if not snipe:
-			bot.models.Location.set_location(self.config['username'], lat, lng)
+			self.writer.set_location(lat, lng)
 
 	def get_location(self):
+		self.writer.flush()
+
 		lat, lng = self.config['location'].split(',')
 		cache_location = bot.models.Location.check_location(self.config['username'], lat, lng)
 		lat, lng = bot.models.Location.get_location(self.config['username'])
@@ -705,7 +804,6 @@ class Bot(object):
 
 	def check_level(self):
 		if self.inventorys.exp >= self.inventorys.next_exp:
-			time.sleep(1)
 			self.api.level_up_rewards(
 				level = self.inventorys.level + 1
 			)
@@ -716,7 +814,7 @@ class Bot(object):
 				self.inventorys.level + 1,
 			)
 
-			self.inventorys.get_inventory()
+			self.inventorys.update_inventory()
 
 	def get_items_awarded_from_fort_spinned(self, response_dict):
 		items_awarded = response_dict['responses']['FORT_SEARCH'].get('items_awarded', {})
@@ -741,6 +839,9 @@ class Bot(object):
 		
 		return items_format_strings[:-2]
 
-	def check_awarded_badges(self):
-		time.sleep(1)
+	def check_awarded_badges(self, batch=None):
+		if batch is not None:
+			batch.add('check_awarded_badges')
+			return
+
 		self.api.check_awarded_badges()
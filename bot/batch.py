@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+# Collects several RPCs into one pgoapi request envelope and hands each
+# response back to the handler registered with it.
+class RequestBatch(object):
+	def __init__(self, api):
+		self.api = api
+		self.calls = []
+
+	def __len__(self):
+		return len(self.calls)
+
+	def add(self, method, handler=None, **kwargs):
+		self.calls.append((method, handler, kwargs))
+
+	def call(self):
+		if not self.calls:
+			return {}
+
+		calls, self.calls = self.calls, []
+
+		req = self.api.create_request()
+		for method, handler, kwargs in calls:
+			getattr(req, method)(**kwargs)
+
+		response_dict = req.call() or {}
+		responses = response_dict.get('responses', {})
+
+		for method, handler, kwargs in calls:
+			if handler:
+				handler(responses.get(method.upper(), {}))
+
+		return responses
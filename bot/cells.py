@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+
+from s2sphere import CellId, LatLng
+from s2sphere.sphere import xyz_to_face_uv
+from pgoapi import utilities
+
+CELL_LEVEL = 15
+CELL_CACHE_SIZE = 64
+
+# utilities.get_cell_ids only depends on the level 15 cell containing the
+# position, so the neighbourhood is computed once per cell. Cells are keyed
+# by face and i/j coordinates rather than by CellId, whose construction is
+# most of get_cell_ids' cost (s2sphere does it in future.newint arithmetic
+# under Python 2). The server's timestamp for each cell is remembered,
+# letting get_map_objects ask only for what changed since the last response.
+class CellCache(object):
+	def __init__(self, size=CELL_CACHE_SIZE):
+		self.size = size
+		self.neighbourhoods = OrderedDict()
+		self.timestamps = {}
+
+	def cell_ids(self, lat, lng):
+		origin = cell_key(lat, lng)
+
+		cell_ids = self.neighbourhoods.pop(origin, None)
+		if cell_ids is None:
+			cell_ids = utilities.get_cell_ids(lat, lng)
+
+		self.neighbourhoods[origin] = cell_ids
+		while len(self.neighbourhoods) > self.size:
+			self.neighbourhoods.popitem(last=False)
+
+		return cell_ids
+
+	def since_timestamps(self, cell_ids):
+		return [self.timestamps.get(cell_id, 0) for cell_id in cell_ids]
+
+	def update(self, map_cells):
+		for cell in map_cells:
+			if 's2_cell_id' in cell and 'current_timestamp_ms' in cell:
+				self.timestamps[cell['s2_cell_id']] = cell['current_timestamp_ms']
+
+# Identifies the level CELL_LEVEL cell containing the position.
+def cell_key(lat, lng):
+	face, u, v = xyz_to_face_uv(LatLng.from_degrees(lat, lng).to_point())
+	shift = CellId.MAX_LEVEL - CELL_LEVEL
+
+	return (
+		int(face),
+		int(CellId.st_to_ij(CellId.uv_to_st(u))) >> shift,
+		int(CellId.st_to_ij(CellId.uv_to_st(v))) >> shift
+	)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import time
+import heapq
+import itertools
+
+from bot.metrics import metrics
+
+class Clock(object):
+	virtual = False
+
+	def time(self):
+		return time.time()
+
+	def sleep(self, seconds):
+		if seconds > 0:
+			time.sleep(seconds)
+
+# Advances instantly on sleep, so simulations and tests can run hours of bot
+# activity in seconds.
+class VirtualClock(Clock):
+	virtual = True
+
+	def __init__(self, start=None):
+		self.now = time.time() if start is None else start
+
+	def time(self):
+		return self.now
+
+	def sleep(self, seconds):
+		if seconds > 0:
+			self.now += seconds
+
+# Deadline scheduler for the bot thread. Instead of blocking outright, a
+# sleep runs every task that falls due before it ends, so periodic work
+# (pruning, flushes, refreshes) interleaves with the bot's own pacing.
+class Scheduler(object):
+	def __init__(self, clock=None):
+		self.clock = clock or Clock()
+		self.tasks = []
+		self.seq = itertools.count()
+
+	def time(self):
+		return self.clock.time()
+
+	def call_later(self, delay, callback):
+		heapq.heappush(self.tasks, (self.time() + delay, next(self.seq), None, callback))
+
+	def every(self, interval, callback, delay=None):
+		if delay is None:
+			delay = interval
+
+		heapq.heappush(self.tasks, (self.time() + delay, next(self.seq), interval, callback))
+
+	# Runs the tasks due now, each at most once, so a periodic task that
+	# takes longer than its interval cannot keep the loop from returning.
+	def run_pending(self):
+		now = self.time()
+		due = []
+		while self.tasks and self.tasks[0][0] <= now:
+			deadline, seq, interval, callback = heapq.heappop(self.tasks)
+			due.append(callback)
+
+			if interval is not None:
+				heapq.heappush(self.tasks, (max(deadline + interval, now), next(self.seq), interval, callback))
+
+		for callback in due:
+			callback()
+
+	def sleep(self, seconds):
+		if seconds > 0:
+			metrics.inc('sleep_seconds_total', seconds)
+
+		deadline = self.time() + seconds
+
+		while True:
+			self.run_pending()
+
+			now = self.time()
+			if now >= deadline:
+				break
+
+			wake = deadline
+			if self.tasks and self.tasks[0][0] < wake:
+				wake = self.tasks[0][0]
+
+			self.clock.sleep(wake - now)
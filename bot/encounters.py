@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import bot.models
+
+CATCH_WINDOW = 12 * 60 * 60
+
+# In-memory view of the Catch table for one account, so feed dedup does not
+# hit SQLite once per spawn. Entries expire with the same 12 hour window the
+# daily limit prunes the table with; callers persist the Catch row itself.
+class CaughtEncounters(object):
+	def __init__(self, username, window=CATCH_WINDOW, clock=time.time):
+		self.username = username
+		self.window = window
+		self.clock = clock
+		self.encounters = {}
+		self.next_prune = 0
+
+	def warm(self):
+		since = self.clock() - self.window
+		self.encounters = {
+			encounter_id: created
+			for encounter_id, created in bot.models.Catch.get_catchs(self.username)
+			if created >= since
+		}
+		self.next_prune = self.clock() + self.window
+
+	def __contains__(self, encounter_id):
+		created = self.encounters.get(encounter_id)
+		if created is None:
+			return False
+
+		if created < self.clock() - self.window:
+			del self.encounters[encounter_id]
+			return False
+
+		return True
+
+	def __len__(self):
+		return len(self.encounters)
+
+	def add(self, encounter_id):
+		self.encounters[encounter_id] = self.clock()
+
+		if self.clock() >= self.next_prune:
+			self.prune()
+
+	def prune(self):
+		since = self.clock() - self.window
+		for encounter_id, created in list(self.encounters.items()):
+			if created < since:
+				del self.encounters[encounter_id]
+
+		self.next_prune = self.clock() + self.window / 12
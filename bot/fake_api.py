@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import time
+import base64
+import random
+import threading
+from collections import defaultdict, OrderedDict
+
+try:
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from s2sphere import CellId, LatLng
+from pgoapi.exceptions import NotLoggedInException
+
+import bot.feed
+import bot.geometry
+import bot.game_data
+
+CELL_LEVEL = 15
+METERS_PER_DEGREE = 111320.0
+SEARCH_RADIUS = 40
+FORT_COOLDOWN = 300
+CATCH_RATE = 0.7
+BERRY_MULT = 1.5
+SPIN_EXP = 50
+CATCH_EXP = 100
+
+SPIN_ITEMS = (
+	(1, 3),
+	(2, 1),
+	(101, 1),
+	(701, 1)
+)
+
+START_ITEMS = {
+	1: 80,
+	2: 40,
+	3: 10,
+	101: 10,
+	201: 10,
+	701: 20
+}
+
+RPC_STATUS_OK = 1
+
+# A deterministic game server around one location: forts, feed spawns and a
+# player inventory, driven by the same clock as the bot so it can run under a
+# VirtualClock. Every RPC handler takes the pgoapi keyword arguments and
+# returns the response body pgoapi would put under responses[METHOD].
+class SyntheticWorld(object):
+	def __init__(self, lat, lng, forts=500, spawns=200, pokemons=100, radius=3000, seed=0, clock=time.time, username='bench'):
+		self.lat = lat
+		self.lng = lng
+		self.radius = radius
+		self.random = random.Random(seed)
+		self.clock = clock
+		self.lock = threading.Lock()
+		self.username = username
+
+		self.forts = {}
+		self.fort_cells = defaultdict(list)
+		self.cooldowns = {}
+		for i in range(forts):
+			fort_lat, fort_lng = self.random_position()
+			fort = {
+				'id': 'fort-%d' % i,
+				'latitude': fort_lat,
+				'longitude': fort_lng,
+				'type': 1,
+				'enabled': True
+			}
+			self.forts[fort['id']] = fort
+			self.fort_cells[cell_id(fort_lat, fort_lng)].append(fort)
+
+		self.next_id = 1
+		self.encounters = {}
+		self.spawn_count = spawns
+		self.spawns = []
+
+		self.items = dict(START_ITEMS)
+		self.pokemons = {}
+		for i in range(pokemons):
+			pokemon_data = self.random_pokemon()
+			self.pokemons[pokemon_data['id']] = pokemon_data
+
+		self.level = 5
+		self.exp = 0
+		self.next_exp = 10000
+
+		# Inventory changes keyed by entry, newest last, so a delta request only
+		# walks the entries changed since its timestamp.
+		self.timestamp_ms = 0
+		self.changes = OrderedDict()
+
+	def random_position(self):
+		# Uniform over a disc; the flat-earth offset is accurate enough for the
+		# few kilometres a synthetic world spans.
+		distance = self.radius * self.random.random() ** 0.5 / METERS_PER_DEGREE
+		bearing = self.random.uniform(0, 2 * math.pi)
+		return (
+			self.lat + distance * math.cos(bearing),
+			self.lng + distance * math.sin(bearing) / math.cos(math.radians(self.lat))
+		)
+
+	def random_pokemon(self, pokemon_id=None):
+		pokemon_data = {
+			'id': self.new_id(),
+			'pokemon_id': pokemon_id or self.random.randint(1, len(bot.game_data.pokemon_list())),
+			'cp': self.random.randint(10, 2500),
+			'individual_attack': self.random.randint(0, 15),
+			'individual_defense': self.random.randint(0, 15),
+			'individual_stamina': self.random.randint(0, 15),
+			'move_1': int(self.random.choice([key for key in bot.game_data.fast_moves() if key != '0'])),
+			'move_2': int(self.random.choice([key for key in bot.game_data.charged_moves() if key != '0']))
+		}
+		return pokemon_data
+
+	def new_id(self):
+		self.next_id += 1
+		return self.next_id
+
+	def now_ms(self):
+		return int(self.clock() * 1000)
+
+	def change(self, key, inventory_item):
+		self.timestamp_ms = max(self.timestamp_ms + 1, self.now_ms())
+		self.changes.pop(key, None)
+		self.changes[key] = (self.timestamp_ms, inventory_item)
+
+	def change_item(self, item_id, count):
+		self.items[item_id] = max(0, self.items.get(item_id, 0) + count)
+		self.change(('item', item_id), self.item_entry(item_id))
+
+	def change_stats(self, exp):
+		self.exp += exp
+		while self.exp >= self.next_exp:
+			self.level += 1
+			self.next_exp += self.level * 1000
+
+		self.change(('stats',), self.stats_entry())
+
+	def item_entry(self, item_id):
+		return {'inventory_item_data': {'item': {'item_id': item_id, 'count': self.items[item_id]}}}
+
+	def pokemon_entry(self, pokemon_data):
+		return {'inventory_item_data': {'pokemon_data': pokemon_data}}
+
+	def stats_entry(self):
+		return {'inventory_item_data': {'player_stats': {
+			'level': self.level,
+			'experience': self.exp,
+			'next_level_xp': self.next_exp
+		}}}
+
+	def feed(self):
+		with self.lock:
+			return self._feed()
+
+	def _feed(self):
+		now_ms = self.now_ms()
+		self.spawns = [spawn for spawn in self.spawns if spawn['disappear_time'] > now_ms]
+
+		rarities = list(bot.feed.RARE_RATE)
+		while len(self.spawns) < self.spawn_count:
+			encounter_id = self.new_id()
+			lat, lng = self.random_position()
+			pokemon_data = self.random_pokemon()
+			self.encounters[encounter_id] = pokemon_data
+			self.spawns.append({
+				'encounter_id': base64.b64encode(str(encounter_id).encode('ascii')).decode('ascii'),
+				'spawnpoint_id': '%x' % self.random.getrandbits(48),
+				'pokemon_id': pokemon_data['pokemon_id'],
+				'pokemon_rarity': self.random.choice(rarities),
+				'latitude': lat,
+				'longitude': lng,
+				'disappear_time': now_ms + self.random.randint(60, 900) * 1000
+			})
+
+		return [dict(spawn) for spawn in self.spawns]
+
+	def get_player(self):
+		return {'player_data': {
+			'username': self.username,
+			'currencies': [
+				{'name': 'POKECOIN', 'amount': 0},
+				{'name': 'STARDUST', 'amount': 1000}
+			]
+		}}
+
+	def get_inventory(self, last_timestamp_ms=None):
+		if not last_timestamp_ms:
+			inventory_items = [self.item_entry(item_id) for item_id in self.items]
+			inventory_items += [self.pokemon_entry(pokemon_data) for pokemon_data in self.pokemons.values()]
+			inventory_items.append(self.stats_entry())
+		else:
+			inventory_items = []
+			for timestamp_ms, inventory_item in reversed(list(self.changes.values())):
+				if timestamp_ms <= last_timestamp_ms:
+					break
+				inventory_items.append(inventory_item)
+
+		return {'success': True, 'inventory_delta': {
+			'new_timestamp_ms': max(self.timestamp_ms, last_timestamp_ms or 0, 1),
+			'inventory_items': inventory_items
+		}}
+
+	def get_map_objects(self, latitude, longitude, since_timestamp_ms=None, cell_id=()):
+		now_ms = self.now_ms()
+		map_cells = []
+		for s2_cell_id in cell_id:
+			map_cell = {'s2_cell_id': s2_cell_id, 'current_timestamp_ms': now_ms}
+			forts = [dict(fort) for fort in self.fort_cells.get(s2_cell_id, ())]
+			for fort in forts:
+				if self.cooldowns.get(fort['id'], 0) > now_ms:
+					fort['cooldown_complete_timestamp_ms'] = self.cooldowns[fort['id']]
+			if forts:
+				map_cell['forts'] = forts
+			map_cells.append(map_cell)
+
+		return {'status': RPC_STATUS_OK, 'map_cells': map_cells}
+
+	def fort_details(self, fort_id, latitude=None, longitude=None):
+		fort = self.forts[fort_id]
+		return {
+			'fort_id': fort_id,
+			'name': 'Pokestop %s' % fort_id.split('-')[-1],
+			'latitude': fort['latitude'],
+			'longitude': fort['longitude']
+		}
+
+	def fort_search(self, fort_id, fort_latitude, fort_longitude, player_latitude, player_longitude):
+		fort = self.forts.get(fort_id)
+		if fort is None:
+			return {'result': -1}
+
+		if bot.geometry.distance(player_latitude, player_longitude, fort['latitude'], fort['longitude']) > SEARCH_RADIUS:
+			return {'result': 2}
+
+		now_ms = self.now_ms()
+		if self.cooldowns.get(fort_id, 0) > now_ms:
+			return {'result': 3, 'cooldown_complete_timestamp_ms': self.cooldowns[fort_id]}
+
+		self.cooldowns[fort_id] = now_ms + FORT_COOLDOWN * 1000
+		items_awarded = []
+		for item_id, count in SPIN_ITEMS:
+			if self.random.random() < 0.7:
+				self.change_item(item_id, count)
+				items_awarded.append({'item_id': item_id, 'item_count': count})
+		self.change_stats(SPIN_EXP)
+
+		return {
+			'result': 1,
+			'experience_awarded': SPIN_EXP,
+			'items_awarded': items_awarded,
+			'cooldown_complete_timestamp_ms': self.cooldowns[fort_id]
+		}
+
+	def encounter(self, encounter_id, spawn_point_id=None, player_latitude=None, player_longitude=None):
+		pokemon_data = self.encounters.get(encounter_id)
+		if pokemon_data is None:
+			return {'status': 2}
+
+		return {
+			'status': 1,
+			'wild_pokemon': {'encounter_id': encounter_id, 'pokemon_data': dict(pokemon_data, id=0)},
+			'capture_probability': {'capture_probability': [0.4, 0.55, 0.7]}
+		}
+
+	def use_item_capture(self, item_id, encounter_id=None, spawn_point_id=None):
+		self.change_item(item_id, -1)
+		return {'success': True, 'item_capture_mult': BERRY_MULT}
+
+	def catch_pokemon(self, encounter_id, pokeball, **kwargs):
+		self.change_item(pokeball, -1)
+
+		pokemon_data = self.encounters.get(encounter_id)
+		if pokemon_data is None:
+			return {'status': 3}
+
+		if self.random.random() > CATCH_RATE:
+			return {'status': 2}
+
+		del self.encounters[encounter_id]
+		pokemon_data = dict(pokemon_data, id=self.new_id())
+		self.pokemons[pokemon_data['id']] = pokemon_data
+		self.change(('pokemon', pokemon_data['id']), self.pokemon_entry(pokemon_data))
+		self.change_stats(CATCH_EXP)
+
+		return {
+			'status': 1,
+			'captured_pokemon_id': pokemon_data['id'],
+			'capture_award': {'xp': [CATCH_EXP]}
+		}
+
+	def recycle_inventory_item(self, item_id, count):
+		self.change_item(item_id, -count)
+		return {'result': 1, 'new_count': self.items[item_id]}
+
+	def release_pokemon(self, pokemon_id):
+		if self.pokemons.pop(pokemon_id, None) is None:
+			return {'result': 2}
+
+		self.change(('pokemon', pokemon_id), {'deleted_item': {'pokemon_id': pokemon_id}})
+		return {'result': 1, 'candy_awarded': 1}
+
+	def check_awarded_badges(self):
+		return {'success': True}
+
+	def level_up_rewards(self, level=None):
+		return {'result': 1}
+
+def cell_id(lat, lng):
+	return CellId.from_lat_lng(LatLng.from_degrees(lat, lng)).parent(CELL_LEVEL).id()
+
+# Stand-in for pgoapi.PGoApi backed by a SyntheticWorld. Counts every RPC
+# envelope that would have gone over the network, each taking `latency`
+# seconds. With a token_lifetime, authentication takes auth_delay seconds and
+# RPCs raise NotLoggedInException once the token has expired.
+class FakeApi(object):
+	def __init__(self, world, token_lifetime=None, auth_delay=0, latency=0, sleep=time.sleep):
+		self.world = world
+		self.token_lifetime = token_lifetime
+		self.auth_delay = auth_delay
+		self.latency = latency
+		self.sleep = sleep
+		self.authenticated_at = None
+		self.position = (0.0, 0.0, 0.0)
+		self.rpcs = 0
+		self.calls = defaultdict(int)
+		self.logins = 0
+		self.signatures = 0
+
+	def set_position(self, lat, lng, alt=0.0):
+		self.position = (lat, lng, alt)
+
+	def get_position(self):
+		return self.position
+
+	def set_authentication(self, provider=None, username=None, password=None, **kwargs):
+		self.sleep(self.auth_delay)
+		self.authenticated_at = self.world.clock()
+		self.logins += 1
+
+	def activate_signature(self, lib_path):
+		self.signatures += 1
+
+	def create_request(self):
+		return FakeRequest(self)
+
+	def call(self, calls):
+		if self.token_lifetime and (self.authenticated_at is None or self.world.clock() - self.authenticated_at > self.token_lifetime):
+			raise NotLoggedInException()
+
+		self.rpcs += 1
+		self.sleep(self.latency)
+
+		responses = {}
+		with self.world.lock:
+			for method, kwargs in calls:
+				self.calls[method] += 1
+				responses[method.upper()] = getattr(self.world, method)(**kwargs)
+
+		return {'responses': responses, 'status_code': RPC_STATUS_OK}
+
+	def __getattr__(self, name):
+		if name.startswith('_') or not hasattr(self.world, name):
+			raise AttributeError(name)
+
+		def function(**kwargs):
+			return self.call([(name, kwargs)])
+
+		return function
+
+class FakeRequest(object):
+	def __init__(self, api):
+		self.api = api
+		self.calls = []
+
+	def call(self):
+		calls, self.calls = self.calls, []
+		return self.api.call(calls)
+
+	def __getattr__(self, name):
+		if name.startswith('_') or not hasattr(self.api.world, name):
+			raise AttributeError(name)
+
+		def function(**kwargs):
+			self.calls.append((name, kwargs))
+
+		return function
+
+# Serves raw_data the way the feed server does, from any callable returning a
+# list of feed pokemons (a SyntheticWorld's feed or a recorded snapshot).
+class FakeFeedServer(threading.Thread):
+	def __init__(self, pokemons, host='127.0.0.1', port=0):
+		threading.Thread.__init__(self, name='fake-feed')
+		self.daemon = True
+
+		source = pokemons
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				body = json.dumps({'pokemons': source()}).encode('utf-8')
+				self.send_response(200)
+				self.send_header('Content-Type', 'application/json')
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, *args):
+				pass
+
+		self.server = HTTPServer((host, port), Handler)
+		self.url = 'http://%s:%d/' % self.server.server_address
+
+	def run(self):
+		self.server.serve_forever()
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
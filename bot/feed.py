@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import time
+import heapq
+import logging
+import threading
+import requests
+
+import bot.geometry
+
+from bot.metrics import metrics
+
+URL = 'http://p.cve.tw:5566/'
+
+RARE_RATE = {
+	u'常見': 0,
+	u'少見': 1,
+	u'罕見': 2,
+	u'非常罕見': 3,
+	u'超罕見': 4
+}
+
+logger = logging.getLogger('feed')
+
+def fetch_pokemons(url=URL, timeout=10):
+	responses = requests.get(
+		url + 'raw_data?pokemon=true&pokestops=false&gyms=false&scanned=false&spawnpoints=false',
+		verify=False,
+		timeout=timeout
+	).json()['pokemons']
+
+	for pokemon in responses:
+		pokemon['pokemon_rarity'] = RARE_RATE.get(pokemon['pokemon_rarity'], 0)
+
+	return responses
+
+def select_pokemons(pokemons, count, rare_first, lat, lng, is_caught, now=None):
+	now_ms = (now if now is not None else time.time()) * 1000
+
+	candidates = [
+		pokemon for pokemon in pokemons
+		if pokemon['encounter_id'] and pokemon['disappear_time'] > now_ms and not is_caught(pokemon['encounter_id'])
+	]
+
+	if rare_first:
+		rank = lambda pokemon: (-pokemon['pokemon_rarity'], pokemon['disappear_time'])
+	else:
+		rank = lambda pokemon: (0, pokemon['disappear_time'])
+
+	selected = heapq.nsmallest(count, candidates, key=rank)
+	if not selected:
+		return []
+
+	# Distance only breaks ties, so it is computed for the picks ranked ahead
+	# of the last one and for every candidate tied with that last pick.
+	last = rank(selected[-1])
+	ranked = [pokemon for pokemon in selected if rank(pokemon) < last]
+	ranked += [
+		pokemon for pokemon in candidates
+		if pokemon['disappear_time'] == last[1] and rank(pokemon) == last
+	]
+	distances = bot.geometry.distances(
+		lat,
+		lng,
+		[(pokemon['latitude'], pokemon['longitude']) for pokemon in ranked]
+	)
+
+	keys = (
+		(rank(pokemon), distance, i, pokemon)
+		for i, (pokemon, distance) in enumerate(zip(ranked, distances))
+	)
+
+	return [pokemon for key, distance, i, pokemon in heapq.nsmallest(count, keys)]
+
+class FeedPrefetcher(threading.Thread):
+	def __init__(self, url=URL, interval=30, timeout=10, clock=time.time):
+		threading.Thread.__init__(self, name='feed')
+		self.daemon = True
+
+		self.url = url
+		self.interval = interval
+		self.timeout = timeout
+		self.clock = clock
+
+		# Each refresh builds a new list and swaps the reference, so readers
+		# always see a complete snapshot without locking. Snapshots are left
+		# unsorted; select_pokemons picks the few candidates a run needs.
+		self.snapshot = None
+		self.updated_at = None
+		self.latency = None
+		self.fetches = 0
+		self.errors = 0
+
+		self._stopped = threading.Event()
+
+	def run(self):
+		while not self._stopped.is_set():
+			self.refresh()
+			self._stopped.wait(self.interval)
+
+	def stop(self):
+		self._stopped.set()
+
+	def refresh(self):
+		started = self.clock()
+
+		try:
+			with metrics.timer('feed_fetch'):
+				pokemons = fetch_pokemons(self.url, self.timeout)
+		except (requests.exceptions.RequestException, ValueError, KeyError):
+			self.errors += 1
+			logger.error(
+				'Feed server is unstable, skip this :('
+			)
+			return
+
+		self.updated_at = self.clock()
+		self.latency = self.updated_at - started
+		self.fetches += 1
+		self.snapshot = pokemons
+
+	def age(self):
+		if self.updated_at is None:
+			return None
+
+		return self.clock() - self.updated_at
@@ -1,33 +1,117 @@
 # -*- coding: utf-8 -*-
 
 import time
+import threading
+from collections import OrderedDict
+
+import bot.models
 
 SPIN_REQUEST_RESULT_SUCCESS = 1
 SPIN_REQUEST_RESULT_OUT_OF_RANGE = 2
 SPIN_REQUEST_RESULT_IN_COOLDOWN_PERIOD = 3
 SPIN_REQUEST_RESULT_INVENTORY_FULL = 4
 
+FORT_CACHE_SIZE = 1000
+FORT_CACHE_TTL = 24 * 60 * 60
+
+# LRU cache of fort details keyed by fort id; entries older than the TTL are
+# fetched again so renamed or moved forts are eventually picked up. Details
+# loaded from the database keep the time they were fetched. The TTL runs on
+# `clock`, the bot's clock. The time spent in fort_details calls is
+# measured, so the wait saved by hits is estimated from real fetches rather
+# than assumed. Each Bot owns one; a lock keeps it consistent should it be
+# shared between threads.
+class FortCache(object):
+	def __init__(self, size=FORT_CACHE_SIZE, ttl=FORT_CACHE_TTL, clock=time.time):
+		self.size = size
+		self.ttl = ttl
+		self.clock = clock
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.fetches = 0
+		self.fetch_seconds = 0.0
+		self.lock = threading.Lock()
+
+	def load(self):
+		for fort_id, details, updated_date in bot.models.KnownFort.get_details():
+			self.set(fort_id, details, False, time.mktime(updated_date.timetuple()))
+
+	def get(self, fort_id):
+		with self.lock:
+			entry = self.entries.pop(fort_id, None)
+
+			if entry is None or entry[0] < self.clock() - self.ttl:
+				self.misses += 1
+				return None
+
+			self.entries[fort_id] = entry
+			self.hits += 1
+			return entry[1]
+
+	def set(self, fort_id, details, save=True, fetched_at=None):
+		with self.lock:
+			self.entries.pop(fort_id, None)
+			self.entries[fort_id] = (self.clock() if fetched_at is None else fetched_at, details)
+
+			while len(self.entries) > self.size:
+				self.entries.popitem(last=False)
+
+		if save:
+			bot.models.KnownFort.set_details(fort_id, details)
+
+	def hit_ratio(self):
+		lookups = self.hits + self.misses
+		return self.hits / float(lookups) if lookups else 0.0
+
+	def fetched(self, seconds):
+		with self.lock:
+			self.fetches += 1
+			self.fetch_seconds += seconds
+
+	def mean_fetch_seconds(self):
+		return self.fetch_seconds / self.fetches if self.fetches else 0.0
+
+	def seconds_saved(self):
+		return self.hits * self.mean_fetch_seconds()
+
 class Fort(object):
-	def __init__(self, fort, api):
+	def __init__(self, fort, api, cache):
 		self.id = fort['id']
 		self.lat = fort['latitude']
 		self.lng = fort['longitude']
-		self.name = None
+		self._name = None
 		self.api = api
+		self.cache = cache
 
-		self.detail()
+		details = cache.get(self.id)
+		if details:
+			self.lat = details['latitude']
+			self.lng = details['longitude']
+			self._name = details['name']
+
+	@property
+	def name(self):
+		if self._name is None:
+			self.detail()
+
+		return self._name
 
 	def detail(self):
-		time.sleep(1)
+		started = time.time()
 		response_dict = self.api.fort_details(
 			fort_id = self.id,
 			latitude = self.lat,
 			longitude = self.lng
 		)['responses']['FORT_DETAILS']
+		self.cache.fetched(time.time() - started)
 
 		self.lat = response_dict['latitude'] 
 		self.lng = response_dict['longitude']
-		self.name = response_dict['name']
-
-
+		self._name = response_dict['name']
 
+		self.cache.set(self.id, {
+			'latitude': self.lat,
+			'longitude': self.lng,
+			'name': self._name
+		})
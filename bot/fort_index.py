@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import math
+import time
+from collections import defaultdict
+
+import bot.models
+import bot.geometry
+
+GRID_SIZE = 0.005
+FORT_COOLDOWN_MS = 5 * 60 * 1000
+METERS_PER_DEGREE = 111320.0
+
+# Known forts bucketed on a lat/lng grid, so the nearest fort that is off
+# cooldown is found by scanning rings of nearby buckets instead of every
+# fort returned by the last map request.
+class FortIndex(object):
+	def __init__(self, grid_size=GRID_SIZE, clock=time.time):
+		self.grid_size = grid_size
+		self.clock = clock
+		self.forts = {}
+		self.cooldowns = {}
+		self.grid = defaultdict(set)
+		self.fetched = {}
+
+	def __len__(self):
+		return len(self.forts)
+
+	def key(self, lat, lng):
+		return int(math.floor(lat / self.grid_size)), int(math.floor(lng / self.grid_size))
+
+	# Loads the known forts and the cooldowns of one account.
+	def load(self, username):
+		self.add_forts(bot.models.KnownFort.get_forts(), False)
+		self.cooldowns.update(bot.models.FortCooldown.get_cooldowns(username))
+
+	def add_forts(self, forts, save=True):
+		changed = []
+
+		for fort in forts:
+			fort_id = fort['id']
+
+			if 'cooldown_complete_timestamp_ms' in fort:
+				self.set_cooldown(fort_id, fort['cooldown_complete_timestamp_ms'])
+
+			old_fort = self.forts.get(fort_id)
+			if old_fort:
+				if old_fort['latitude'] == fort['latitude'] and old_fort['longitude'] == fort['longitude']:
+					continue
+
+				self.grid[self.key(old_fort['latitude'], old_fort['longitude'])].discard(fort_id)
+
+			self.forts[fort_id] = {
+				'id': fort_id,
+				'latitude': fort['latitude'],
+				'longitude': fort['longitude']
+			}
+			self.grid[self.key(fort['latitude'], fort['longitude'])].add(fort_id)
+			changed.append(self.forts[fort_id])
+
+		if save and changed:
+			bot.models.KnownFort.save_forts(changed)
+
+	def set_cooldown(self, fort_id, timestamp_ms=None):
+		if not timestamp_ms:
+			timestamp_ms = self.clock() * 1000 + FORT_COOLDOWN_MS
+
+		self.cooldowns[fort_id] = timestamp_ms
+		return timestamp_ms
+
+	def available(self, fort_id, now_ms):
+		return self.cooldowns.get(fort_id, 0) <= now_ms
+
+	def is_stale(self, lat, lng, max_age, now=None):
+		if now is None:
+			now = self.clock()
+
+		fetched = self.fetched.get(self.key(lat, lng))
+		return fetched is None or now - fetched >= max_age
+
+	def mark_fetched(self, lat, lng, now=None):
+		self.fetched[self.key(lat, lng)] = self.clock() if now is None else now
+
+	def nearby(self, lat, lng, radius):
+		lat_i, lng_i = self.key(lat, lng)
+		lat_rings = int(math.ceil(radius / (self.grid_size * METERS_PER_DEGREE)))
+		lng_rings = int(math.ceil(radius / (self.grid_size * METERS_PER_DEGREE * math.cos(math.radians(lat)))))
+
+		forts = []
+		for i in range(lat_i - lat_rings, lat_i + lat_rings + 1):
+			for j in range(lng_i - lng_rings, lng_i + lng_rings + 1):
+				forts.extend(self.forts[fort_id] for fort_id in self.grid.get((i, j), ()))
+
+		distances = bot.geometry.distances(lat, lng, [(fort['latitude'], fort['longitude']) for fort in forts])
+		return [fort for fort, distance in zip(forts, distances) if distance <= radius]
+
+	def nearest(self, lat, lng, now=None, max_rings=20):
+		now_ms = (self.clock() if now is None else now) * 1000
+		lat_i, lng_i = self.key(lat, lng)
+
+		# Any fort outside ring r is at least r grid cells away along the
+		# shorter (longitude) axis.
+		ring_meters = self.grid_size * METERS_PER_DEGREE * math.cos(math.radians(lat))
+
+		best = None
+		best_distance = None
+		for ring in range(max_rings + 1):
+			forts = []
+			for i in range(lat_i - ring, lat_i + ring + 1):
+				for j in range(lng_i - ring, lng_i + ring + 1):
+					if ring and abs(i - lat_i) != ring and abs(j - lng_i) != ring:
+						continue
+
+					forts.extend(
+						self.forts[fort_id] for fort_id in self.grid.get((i, j), ())
+						if self.available(fort_id, now_ms)
+					)
+
+			distances = bot.geometry.distances(lat, lng, [(fort['latitude'], fort['longitude']) for fort in forts])
+			for fort, distance in zip(forts, distances):
+				if best_distance is None or distance < best_distance:
+					best = fort
+					best_distance = distance
+
+			if best is not None and best_distance <= ring * ring_meters:
+				break
+
+		return best
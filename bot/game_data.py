@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+
+from bot.base_dir import _base_dir
+
+# Static game data is parsed once per process and shared by every Bot,
+# Inventory and Pokemon. Callers must treat the returned objects as read-only.
+_cache = {}
+
+def _load(name):
+	data = _cache.get(name)
+	if data is None:
+		with open(os.path.join(_base_dir, 'data', name + '.json')) as data_file:
+			data = json.load(data_file)
+		_cache[name] = data
+
+	return data
+
+def pokemon_list():
+	return _load('pokemon')
+
+def fast_moves():
+	return _load('fast_moves')
+
+def charged_moves():
+	return _load('charged_moves')
+
+def item_list():
+	return _load('items')
+
+def item_ids():
+	ids = _cache.get('item_ids')
+	if ids is None:
+		ids = {name: int(item_id) for item_id, name in item_list().items()}
+		_cache['item_ids'] = ids
+
+	return ids
+
+def pokemon_name(num):
+	return pokemon_list()[int(num) - 1]['Name']
+
+def item_name(item_id):
+	return item_list()[str(item_id)]
+
+def item_id(name):
+	return item_ids()[name]
+
+def preload():
+	pokemon_list()
+	fast_moves()
+	charged_moves()
+	item_ids()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+# Same radius and formula as gpxpy.geo.haversine_distance, evaluated over a
+# whole batch of points with the origin terms hoisted out of the loop.
+EARTH_RADIUS = 6371000
+
+def distances(lat, lng, points):
+	sin = math.sin
+	cos = math.cos
+	atan2 = math.atan2
+	sqrt = math.sqrt
+	radians = math.radians
+
+	lat_1 = radians(lat)
+	lng_1 = radians(lng)
+	cos_lat_1 = cos(lat_1)
+	diameter = 2 * EARTH_RADIUS
+
+	result = []
+	for point_lat, point_lng in points:
+		lat_2 = radians(point_lat)
+		sin_d_lat = sin((lat_1 - lat_2) / 2)
+		sin_d_lng = sin((lng_1 - radians(point_lng)) / 2)
+		a = sin_d_lat * sin_d_lat + sin_d_lng * sin_d_lng * cos_lat_1 * cos(lat_2)
+		result.append(diameter * atan2(sqrt(a), sqrt(1 - a)))
+
+	return result
+
+def distance(lat_1, lng_1, lat_2, lng_2):
+	return distances(lat_1, lng_1, ((lat_2, lng_2),))[0]
+
+def walk_path(lat, lng, to_lat, to_lng, step, epsilon=10):
+	total = distance(lat, lng, to_lat, to_lng)
+	if total <= epsilon:
+		return []
+
+	divisions = total / step
+	d_lat = (to_lat - lat) / divisions
+	d_lng = (to_lng - lng) / divisions
+
+	# Straight-line steps in lat/lng; the last one lands on the target so the
+	# walk always ends within epsilon even when step is larger than epsilon.
+	count = int(math.ceil(divisions))
+	points = [(lat + d_lat * i, lng + d_lng * i) for i in range(1, count)]
+	points.append((to_lat, to_lng))
+
+	path = []
+	for point, remaining in zip(points, distances(to_lat, to_lng, points)):
+		path.append((point[0], point[1], remaining))
+		if remaining <= epsilon:
+			break
+
+	return path
+
+def sort_by_distance(lat, lng, items, position):
+	positions = [position(item) for item in items]
+	known = iter(distances(lat, lng, [point for point in positions if point is not None]))
+
+	keys = []
+	for point in positions:
+		keys.append(next(known) if point is not None else float('inf'))
+
+	return [item for key, i, item in sorted(zip(keys, range(len(items)), items))]
@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 
-import time
-import json
-import os
-
-from bot.base_dir import _base_dir
 from bot.item_list import Item
 from bot.pokemon import Pokemon
+from bot.pokemon_store import PokemonStore
+from bot.transfer_filter import TransferFilter
+from bot.batch import RequestBatch
+from bot.profiler import phase
+
+import bot.game_data
 
 ITEM_UNKNOWN = 0
 ITEM_POKE_BALL = 1
@@ -44,28 +45,71 @@ class Inventory(object):
 		self.api = api
 		self.config = config
 		self.logger = logger
-		self.item_list = json.load(
-			open(os.path.join(_base_dir, 'data', 'items.json'))
-		)
-		self.pokemon_list = json.load(
-			open(os.path.join(_base_dir, 'data', 'pokemon.json'))
-		)
-		
+		self.item_list = bot.game_data.item_list()
+		self.transfer_filter = TransferFilter(self.config['transfer_filter'])
+
 		self.items = None
 		self.pokemons = None
 		self.exp = None
 		self.next_exp = None
 		self.level = None
+		self.last_timestamp_ms = None
 
 		self.get_inventory()
 
 	def get_inventory(self):
-		time.sleep(1)
-		inventorys = self.api.get_inventory()['responses']['GET_INVENTORY']['inventory_delta']['inventory_items']
+		inventory_delta = self.api.get_inventory()['responses']['GET_INVENTORY']['inventory_delta']
+		inventorys = inventory_delta.get('inventory_items', [])
 
 		self.inventory_items(inventorys)
 		self.inventory_pokemons(inventorys)
 		self.inventory_stats(inventorys)
+		self.last_timestamp_ms = inventory_delta.get('new_timestamp_ms')
+
+	def update_inventory(self, batch=None):
+		if not self.last_timestamp_ms:
+			self.get_inventory()
+			return
+
+		if batch is None:
+			inventory_delta = self.api.get_inventory(
+				last_timestamp_ms = self.last_timestamp_ms
+			)['responses']['GET_INVENTORY']['inventory_delta']
+
+			self.apply_inventory_delta(inventory_delta)
+			return
+
+		batch.add(
+			'get_inventory',
+			lambda response: self.apply_inventory_delta(response.get('inventory_delta', {})),
+			last_timestamp_ms = self.last_timestamp_ms
+		)
+
+	def apply_inventory_delta(self, inventory_delta):
+		for inventory_item in inventory_delta.get('inventory_items', []):
+			deleted_item = inventory_item.get('deleted_item', {})
+			if deleted_item.get('pokemon_id'):
+				self.pokemons.remove(deleted_item['pokemon_id'])
+				continue
+
+			inventory_item_data = inventory_item.get('inventory_item_data', {})
+
+			item_dict = inventory_item_data.get('item', {})
+			item_id = item_dict.get('item_id')
+			if item_id in self.items:
+				self.items[item_id] = item_dict.get('count', 0)
+
+			pokemon_dict = inventory_item_data.get('pokemon_data', {})
+			if pokemon_dict:
+				self.pokemons.add(self.create_pokemon(pokemon_dict))
+
+			stats = inventory_item_data.get('player_stats', {})
+			if stats:
+				self.exp = stats.get('experience', self.exp)
+				self.next_exp = stats.get('next_level_xp', self.next_exp)
+				self.level = stats.get('level', self.level)
+
+		self.last_timestamp_ms = inventory_delta.get('new_timestamp_ms', self.last_timestamp_ms)
 
 	def inventory_stats(self, inventorys):
 		stats = {}
@@ -94,10 +138,10 @@ class Inventory(object):
 
 		self.items = items_stock
 
-	def check_items(self):
+	def check_items(self, batch=None):
 		recycle_inventorys = []
 		for item in self.config['item_limit']:
-			item_id = int(self.item_list.keys()[self.item_list.values().index(item)])
+			item_id = bot.game_data.item_id(item)
 			item_limit = self.config['item_limit'][item]
 			item_count = self.items[item_id]
 
@@ -113,18 +157,21 @@ class Inventory(object):
 					item_count - item_limit	
 				)
 
-		self.recycle_items(recycle_inventorys)
+		self.recycle_items(recycle_inventorys, batch)
 
-	def recycle_items(self, items):
+	def recycle_items(self, items, batch=None):
 		if items:
-			req = self.api.create_request()
+			req = batch if batch is not None else RequestBatch(self.api)
 			for item in items:
 				self.items[item['item_id']] -= item['count']
-				req.recycle_inventory_item(
+				req.add(
+					'recycle_inventory_item',
 					item_id = item['item_id'],
 					count = item['count']
 				)
-			req.call()
+
+			if batch is None:
+				req.call()
 
 	def inventory_pokemons(self, inventorys):
 		pokemons_stock = []
@@ -132,54 +179,41 @@ class Inventory(object):
 		for pokemons in inventorys:
 			pokemon_dict = pokemons.get('inventory_item_data', {}).get('pokemon_data', {})
 			if pokemon_dict:
-				pokemon = Pokemon(self.pokemon_list, pokemon_dict, None)
-				if pokemon_dict.get('is_egg', None):
-					pokemon.is_egg = True
-				pokemons_stock.append(pokemon)
+				pokemons_stock.append(self.create_pokemon(pokemon_dict))
+
+		self.pokemons = PokemonStore(pokemons_stock)
+
+	def create_pokemon(self, pokemon_dict):
+		pokemon = Pokemon(pokemon_dict, None)
+		if pokemon_dict.get('is_egg', None):
+			pokemon.is_egg = True
 
-		self.pokemons = pokemons_stock
+		return pokemon
 
-	def check_pokemons(self):
-		pokemons = self.pokemons
-		transfer_pokemons = []
-		for pokemon in pokemons:
-			if not pokemon.is_egg:
-				transfer = self.pokemon_threshold(pokemon)
+	@phase('check_pokemons')
+	def check_pokemons(self, batch=None):
+		transfer_pokemons = self.transfer_filter.select(self.pokemons)
 
-				if transfer:
-					transfer_pokemons.append(pokemon)
+		for pokemon in transfer_pokemons:
+			self.logger.info(
+				'Tranferred %s [CP %s] [IV %s] [A/D/S %s]',
+				pokemon.name,
+				pokemon.cp,
+				pokemon.iv(),
+				pokemon.iv_display()
+			)
 
-		self.transfer_pokemons(transfer_pokemons)
+		self.transfer_pokemons(transfer_pokemons, batch)
 
-	def transfer_pokemons(self, pokemons):
+	def transfer_pokemons(self, pokemons, batch=None):
 		if pokemons:
-			req = self.api.create_request()
+			req = batch if batch is not None else RequestBatch(self.api)
 			for pokemon in pokemons:
 				self.pokemons.remove(pokemon)
-				req.release_pokemon(
+				req.add(
+					'release_pokemon',
 					pokemon_id = pokemon.id
 				)
-			req.call()
-
-	def pokemon_threshold(self, pokemon):
-		if self.config['transfer_filter']['logic'] == 'or':
-			if pokemon.cp < self.config['transfer_filter']['below_cp'] and pokemon.iv() < self.config['transfer_filter']['below_iv']:
-				self.logger.info(
-					'Tranferred %s [CP %s] [IV %s] [A/D/S %s]',
-					pokemon.name,
-					pokemon.cp,
-					pokemon.iv(),
-					pokemon.iv_display()
-				)
-				return True
-		else:
-			if pokemon.cp < self.config['transfer_filter']['below_cp'] or pokemon.iv() < self.config['transfer_filter']['below_iv']:
-				self.logger.info(
-					'Tranferred %s [CP %s] [IV %s] [A/D/S %s]',
-					pokemon.name,
-					pokemon.cp,
-					pokemon.iv(),
-					pokemon.iv_display()
-				)
-				return True
-		return False
\ No newline at end of file
+
+			if batch is None:
+				req.call()
\ No newline at end of file
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+import time
+import bisect
+from collections import deque
+
+LIMIT_WINDOW = 12 * 60 * 60
+
+# Counts events inside a sliding window, matching the daily limit semantics
+# of the Catch/Pokestop tables: an event expires once it is older than the
+# window, so an event exactly `window` seconds old still counts.
+class RollingCounter(object):
+	def __init__(self, timestamps=(), window=LIMIT_WINDOW, clock=time.time):
+		self.window = window
+		self.clock = clock
+		self.timestamps = deque(sorted(timestamps))
+
+	def add(self, timestamp=None):
+		if timestamp is None:
+			timestamp = self.clock()
+
+		if self.timestamps and timestamp < self.timestamps[-1]:
+			timestamps = list(self.timestamps)
+			bisect.insort(timestamps, timestamp)
+			self.timestamps = deque(timestamps)
+		else:
+			self.timestamps.append(timestamp)
+
+	# Events in [now - window, now]. Expired events are dropped, so `now`
+	# must not go backwards between calls.
+	def count(self, now=None):
+		if now is None:
+			now = self.clock()
+
+		since = now - self.window
+		while self.timestamps and self.timestamps[0] < since:
+			self.timestamps.popleft()
+
+		return len(self.timestamps)
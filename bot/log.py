@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import atexit
+import logging
+import threading
+import contextlib
+import logging.handlers
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+LOG_FORMAT = '%(asctime)s [%(name)s] [%(levelname)s] %(message)s'
+# A queued record takes about 1.5 KB, and a process keeps the memory of its
+# largest backlog after the listener drains it. A login alone logs about a
+# hundred lines, so a deeper queue mostly buys resident memory.
+QUEUE_SIZE = 1000
+
+DEFAULT_OPTIONS = {
+	'file': 'log/bot.log',
+	'format': 'text',
+	'max_bytes': 10 * 1024 * 1024,
+	'backup_count': 5,
+	'when': None,
+	'per_account': True,
+	'console': True
+}
+
+try:
+	from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+	# Python 2 has neither; these follow the Python 3 implementations.
+	class QueueHandler(logging.Handler):
+		def __init__(self, records):
+			logging.Handler.__init__(self)
+			self.queue = records
+
+		def prepare(self, record):
+			# Formatting here keeps the arguments and traceback from being
+			# touched by the listener thread after the caller moved on.
+			message = self.format(record)
+			record.message = message
+			record.msg = message
+			record.args = None
+			record.exc_info = None
+			record.exc_text = None
+			return record
+
+		def enqueue(self, record):
+			self.queue.put_nowait(record)
+
+		def emit(self, record):
+			try:
+				self.enqueue(self.prepare(record))
+			except Exception:
+				self.handleError(record)
+
+	class QueueListener(object):
+		_sentinel = None
+
+		def __init__(self, records, *handlers, **kwargs):
+			self.queue = records
+			self.handlers = handlers
+			self.respect_handler_level = kwargs.get('respect_handler_level', False)
+			self._thread = None
+
+		def start(self):
+			self._thread = threading.Thread(target=self._monitor, name='log')
+			self._thread.daemon = True
+			self._thread.start()
+
+		def handle(self, record):
+			for handler in self.handlers:
+				if not self.respect_handler_level or record.levelno >= handler.level:
+					handler.handle(record)
+
+		def _monitor(self):
+			while True:
+				record = self.queue.get()
+				if record is self._sentinel:
+					break
+				self.handle(record)
+
+		def enqueue_sentinel(self):
+			self.queue.put_nowait(self._sentinel)
+
+		def stop(self):
+			self.enqueue_sentinel()
+			self._thread.join()
+			self._thread = None
+
+# Logging never waits on file I/O unless the listener falls QUEUE_SIZE records
+# behind, at which point callers block instead of growing the queue without
+# bound.
+class BoundedQueueHandler(QueueHandler):
+	def enqueue(self, record):
+		self.queue.put(record)
+
+class BoundedQueueListener(QueueListener):
+	def enqueue_sentinel(self):
+		self.queue.put(self._sentinel)
+
+class JsonFormatter(logging.Formatter):
+	def format(self, record):
+		entry = {
+			'time': self.formatTime(record),
+			'name': record.name,
+			'level': record.levelname,
+			'thread': record.threadName,
+			'message': record.getMessage()
+		}
+		if record.exc_info:
+			entry['exc_info'] = self.formatException(record.exc_info)
+
+		return json.dumps(entry)
+
+# Tags the records of an account logger. The tag travels with the record,
+# so a listener in another process still knows it belongs to an account.
+class AccountFilter(logging.Filter):
+	def filter(self, record):
+		record.account = True
+		return True
+
+# Sends the records of account loggers to log/<account>.log, opening each
+# file on the listener thread the first time it is needed.
+class AccountHandler(logging.Handler):
+	def __init__(self, directory, create_handler):
+		logging.Handler.__init__(self)
+		self.directory = directory
+		self.create_handler = create_handler
+		self.handlers = {}
+
+	def emit(self, record):
+		if not getattr(record, 'account', False):
+			return
+
+		handler = self.handlers.get(record.name)
+		if handler is None:
+			filename = record.name.replace(os.sep, '_') + '.log'
+			handler = self.handlers[record.name] = self.create_handler(os.path.join(self.directory, filename))
+
+		handler.handle(record)
+
+	def close(self):
+		for handler in self.handlers.values():
+			handler.close()
+		self.handlers = {}
+		logging.Handler.close(self)
+
+_listener = None
+_lock = threading.Lock()
+
+def file_handler(path, options, formatter):
+	directory = os.path.dirname(path)
+	if directory and not os.path.isdir(directory):
+		os.makedirs(directory)
+
+	if options['when']:
+		handler = logging.handlers.TimedRotatingFileHandler(
+			path,
+			when = options['when'],
+			backupCount = options['backup_count']
+		)
+	else:
+		handler = logging.handlers.RotatingFileHandler(
+			path,
+			maxBytes = options['max_bytes'],
+			backupCount = options['backup_count']
+		)
+
+	handler.setFormatter(formatter)
+	return handler
+
+# Configures the root logger once per process: callers only enqueue records,
+# and a listener thread does the console and file I/O. Calling it again
+# replaces the previous pipeline. `records` may be a multiprocessing queue
+# that other processes forward their records to.
+def setup(config=None, log_file=None, records=None):
+	global _listener
+
+	options = dict(DEFAULT_OPTIONS, **(config or {}).get('log', {}))
+	if options['format'] == 'json':
+		formatter = JsonFormatter()
+	else:
+		formatter = logging.Formatter(LOG_FORMAT)
+
+	with _lock:
+		# The old pipeline is drained first, so it cannot rotate a file the
+		# new handlers already have open.
+		shutdown()
+
+		handlers = [file_handler(log_file or options['file'], options, formatter)]
+		if options['console']:
+			console = logging.StreamHandler()
+			console.setFormatter(logging.Formatter(LOG_FORMAT))
+			handlers.insert(0, console)
+
+		if options['per_account']:
+			handlers.append(AccountHandler(
+				os.path.dirname(options['file']),
+				lambda path: file_handler(path, options, formatter)
+			))
+
+		if records is None:
+			records = queue.Queue(QUEUE_SIZE)
+		enqueue(records)
+
+		_listener = BoundedQueueListener(records, *handlers, respect_handler_level=True)
+		_listener.start()
+
+# For processes whose records are written by another process's listener,
+# such as fleet workers: the root logger only puts records on `records`.
+def forward(records):
+	with _lock:
+		shutdown()
+		enqueue(records)
+
+def enqueue(records):
+	root = logging.getLogger()
+	for handler in list(root.handlers):
+		root.removeHandler(handler)
+	root.addHandler(BoundedQueueHandler(records))
+	root.setLevel(logging.INFO)
+
+# A fork while the listener thread holds a handler's lock leaves that lock
+# held forever in the child, so processes are forked with the listener
+# stopped. Records logged meanwhile wait in the queue. _lock itself is not
+# held across the fork, as the child needs it for forward().
+@contextlib.contextmanager
+def paused():
+	with _lock:
+		listener = _listener
+		if listener is not None and listener._thread is not None:
+			listener.stop()
+
+	try:
+		yield
+	finally:
+		with _lock:
+			if listener is not None and listener is _listener and listener._thread is None:
+				listener.start()
+
+def shutdown():
+	global _listener
+
+	listener, _listener = _listener, None
+	if listener is None:
+		return
+
+	# A listener inherited through fork has no running thread to stop.
+	if listener._thread is not None and listener._thread.is_alive():
+		listener.stop()
+
+	for handler in listener.handlers:
+		handler.close()
+
+atexit.register(shutdown)
+
+# Logger for one account. Its records also go to log/<account>.log, and
+# asking again for the same account returns the same logger unchanged.
+def account_logger(name):
+	account = logging.getLogger(name)
+	account.setLevel(logging.INFO)
+	if not any(isinstance(f, AccountFilter) for f in account.filters):
+		account.addFilter(AccountFilter())
+
+	return account
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+from collections import defaultdict
+
+try:
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Upper bounds in seconds, covering a local SQLite query up to a slow RPC.
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class Histogram(object):
+	__slots__ = ('counts', 'sum', 'count')
+
+	def __init__(self):
+		self.counts = [0] * (len(BUCKETS) + 1)
+		self.sum = 0.0
+		self.count = 0
+
+	def observe(self, value):
+		self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+		self.sum += value
+		self.count += 1
+
+	def quantile(self, q):
+		if not self.count:
+			return 0.0
+
+		rank = q * self.count
+		seen = 0
+		for bound, count in zip(BUCKETS, self.counts):
+			seen += count
+			if seen >= rank:
+				return bound
+
+		return float('inf')
+
+class Timer(object):
+	__slots__ = ('metrics', 'name', 'labels', 'started')
+
+	def __init__(self, metrics, name, labels):
+		self.metrics = metrics
+		self.name = name
+		self.labels = labels
+
+	def __enter__(self):
+		self.started = time.time()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.metrics.observe_key((self.name + '_seconds', self.labels), time.time() - self.started)
+		if exc_type is not None:
+			self.metrics.inc_key((self.name + '_errors_total', self.labels), 1)
+
+		return False
+
+def key(name, labels):
+	return (name, tuple(sorted(labels.items())))
+
+def format_key(metric_key, extra=()):
+	name, labels = metric_key
+	labels = labels + tuple(extra)
+	if not labels:
+		return name
+
+	return '%s{%s}' % (name, ','.join('%s="%s"' % (label, value) for label, value in labels))
+
+# Process-wide counters, gauges and latency histograms. Every update is a
+# dict lookup and a few additions under one lock, cheap enough to sit on the
+# RPC, SQLite and bot phase paths permanently.
+class Metrics(object):
+	def __init__(self):
+		self.counters = defaultdict(float)
+		self.gauges = {}
+		self.histograms = {}
+		self.started = time.time()
+		self.lock = threading.Lock()
+
+	def inc(self, name, value=1, **labels):
+		self.inc_key(key(name, labels), value)
+
+	def inc_key(self, metric_key, value):
+		with self.lock:
+			self.counters[metric_key] += value
+
+	def set(self, name, value, **labels):
+		with self.lock:
+			self.gauges[key(name, labels)] = value
+
+	def observe(self, name, value, **labels):
+		self.observe_key(key(name, labels), value)
+
+	def observe_key(self, metric_key, value):
+		with self.lock:
+			histogram = self.histograms.get(metric_key)
+			if histogram is None:
+				histogram = self.histograms[metric_key] = Histogram()
+			histogram.observe(value)
+
+	def timer(self, name, **labels):
+		return Timer(self, name, tuple(sorted(labels.items())))
+
+	def timed(self, name, **labels):
+		labels = tuple(sorted(labels.items()))
+
+		def decorator(function):
+			@functools.wraps(function)
+			def wrapper(*args, **kwargs):
+				with Timer(self, name, labels):
+					return function(*args, **kwargs)
+
+			return wrapper
+
+		return decorator
+
+	def count(self, name):
+		with self.lock:
+			return sum(histogram.count for (histogram_name, labels), histogram in self.histograms.items() if histogram_name == name)
+
+	def snapshot(self):
+		uptime = time.time() - self.started
+
+		with self.lock:
+			return {
+				'uptime_seconds': round(uptime, 1),
+				'counters': {format_key(k): v for k, v in self.counters.items()},
+				'per_hour': {format_key(k): round(v * 3600 / uptime, 2) for k, v in self.counters.items() if uptime},
+				'gauges': {format_key(k): v for k, v in self.gauges.items()},
+				'histograms': {
+					format_key(k): {
+						'count': histogram.count,
+						'sum': round(histogram.sum, 6),
+						'mean': round(histogram.sum / histogram.count, 6) if histogram.count else 0.0,
+						'p50': histogram.quantile(0.5),
+						'p90': histogram.quantile(0.9),
+						'p99': histogram.quantile(0.99)
+					}
+					for k, histogram in self.histograms.items()
+				}
+			}
+
+	def prometheus(self):
+		lines = []
+
+		with self.lock:
+			for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+				for name in sorted(set(k[0] for k in values)):
+					lines.append('# TYPE %s %s' % (name, kind))
+					for k in sorted(k for k in values if k[0] == name):
+						lines.append('%s %s' % (format_key(k), values[k]))
+
+			for name in sorted(set(k[0] for k in self.histograms)):
+				lines.append('# TYPE %s histogram' % name)
+				for k in sorted(k for k in self.histograms if k[0] == name):
+					histogram = self.histograms[k]
+					seen = 0
+					for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+						seen += count
+						lines.append('%s %d' % (format_key((name + '_bucket', k[1]), (('le', bound),)), seen))
+					lines.append('%s %f' % (format_key((name + '_sum', k[1])), histogram.sum))
+					lines.append('%s %d' % (format_key((name + '_count', k[1])), histogram.count))
+
+		return '\n'.join(lines) + '\n'
+
+	def dump(self, path):
+		# Written next to the target and renamed, so readers never see a
+		# partial file.
+		temp_path = path + '.tmp'
+		with open(temp_path, 'w') as dump_file:
+			json.dump(self.snapshot(), dump_file, sort_keys=True)
+		os.rename(temp_path, path)
+
+	# Starts the registry over, as a forked process does so it does not
+	# report its parent's counts as its own.
+	def reset(self):
+		with self.lock:
+			self.counters = defaultdict(float)
+			self.gauges = {}
+			self.histograms = {}
+			self.started = time.time()
+
+	# Plain data copy of the registry that can be pickled to another process.
+	def export(self):
+		with self.lock:
+			return {
+				'started': self.started,
+				'counters': dict(self.counters),
+				'gauges': dict(self.gauges),
+				'histograms': {
+					k: (list(histogram.counts), histogram.sum, histogram.count)
+					for k, histogram in self.histograms.items()
+				}
+			}
+
+	# Adds the counters and histograms of an export to this registry; its
+	# gauges replace ours.
+	def add(self, state):
+		with self.lock:
+			self.started = min(self.started, state['started'])
+
+			for k, value in state['counters'].items():
+				self.counters[k] += value
+
+			self.gauges.update(state['gauges'])
+
+			for k, (counts, total, count) in state['histograms'].items():
+				histogram = self.histograms.get(k)
+				if histogram is None:
+					histogram = self.histograms[k] = Histogram()
+				histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+				histogram.sum += total
+				histogram.count += count
+
+metrics = Metrics()
+
+# Sum of the registries of several processes, such as fleet workers, each
+# sending its latest export. When a source restarts, the last export of its
+# previous run stays in the totals.
+class MergedMetrics(object):
+	def __init__(self):
+		self.sources = {}
+		self.retired = Metrics()
+		self.lock = threading.Lock()
+
+	def update(self, source, state):
+		with self.lock:
+			previous = self.sources.get(source)
+			if previous is not None and previous['started'] != state['started']:
+				self.retired.add(previous)
+
+			self.sources[source] = state
+
+	def registry(self):
+		merged = Metrics()
+
+		with self.lock:
+			merged.add(self.retired.export())
+			for state in self.sources.values():
+				merged.add(state)
+
+		return merged
+
+	def snapshot(self):
+		return self.registry().snapshot()
+
+	def prometheus(self):
+		return self.registry().prometheus()
+
+	def dump(self, path):
+		self.registry().dump(path)
+
+def timed(name, **labels):
+	return metrics.timed(name, **labels)
+
+# Serves the registry as Prometheus text on /metrics and as JSON on
+# /metrics.json.
+class MetricsServer(threading.Thread):
+	def __init__(self, registry, port, host='127.0.0.1'):
+		threading.Thread.__init__(self, name='metrics')
+		self.daemon = True
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				if self.path == '/metrics':
+					body = registry.prometheus()
+					content_type = 'text/plain; version=0.0.4'
+				elif self.path == '/metrics.json':
+					body = json.dumps(registry.snapshot(), sort_keys=True)
+					content_type = 'application/json'
+				else:
+					self.send_error(404)
+					return
+
+				body = body.encode('utf-8')
+				self.send_response(200)
+				self.send_header('Content-Type', content_type)
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, *args):
+				pass
+
+		self.server = HTTPServer((host, port), Handler)
+
+	def run(self):
+		self.server.serve_forever()
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
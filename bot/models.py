@@ -1,9 +1,31 @@
 from peewee import *
 from playhouse.sqlite_ext import SqliteExtDatabase
+from playhouse.migrate import SqliteMigrator, migrate
 import datetime
+import time
 
-db_schema_version = 1
-db = SqliteExtDatabase('bot.db')
+from bot.metrics import metrics
+
+db_schema_version = 3
+
+# WAL lets several bot processes share one database: readers no longer block
+# the writer, and synchronous=normal only fsyncs at checkpoints.
+db_pragmas = (
+	('journal_mode', 'wal'),
+	('synchronous', 'normal'),
+	('cache_size', -8000),
+	('mmap_size', 64 * 1024 * 1024),
+)
+# Times every statement by kind, which covers the helpers below as well as
+# the write-behind transactions.
+class MeteredDatabase(SqliteExtDatabase):
+	def execute_sql(self, sql, params=None, require_commit=True):
+		with metrics.timer('db_query', statement=sql.split(None, 1)[0].upper()):
+			return super(MeteredDatabase, self).execute_sql(sql, params, require_commit)
+
+db = MeteredDatabase(None, pragmas=db_pragmas)
+
+_user_ids = {}
 
 class BaseModel(Model):
 	class Meta:
@@ -20,6 +42,15 @@ class User(BaseModel):
 		except IntegrityError:
 			None
 
+	@staticmethod
+	def get_user_id(name):
+		user_id = _user_ids.get(name)
+		if user_id is None:
+			user_id = User.select(User.id).where(User.username == name).get().id
+			_user_ids[name] = user_id
+
+		return user_id
+
 
 class Location(BaseModel):
 	user = ForeignKeyField(User, related_name='locations', primary_key=True)
@@ -31,7 +62,7 @@ class Location(BaseModel):
 	@staticmethod
 	def check_location(name, lat, lng):
 		locations = Location.select().where(
-			Location.user == User.select().where(User.username == name), 
+			Location.user == User.get_user_id(name), 
 			Location.start_lat == lat,
 			Location.start_lng == lng
 		).count()
@@ -43,7 +74,7 @@ class Location(BaseModel):
 					lat = lat,
 					lng = lng,
 				).where(
-					Location.user == User.select().where(User.username == name)
+					Location.user == User.get_user_id(name)
 				)
 			q.execute()
 
@@ -54,7 +85,7 @@ class Location(BaseModel):
 	@staticmethod
 	def get_location(name):
 		locations = Location.select().where(
-			Location.user == User.select().where(User.username == name)
+			Location.user == User.get_user_id(name)
 		).get()
 
 		return locations.lat, locations.lng
@@ -65,7 +96,7 @@ class Location(BaseModel):
 				lat = lat,
 				lng = lng,
 			).where(
-				Location.user == User.select().where(User.username == name)
+				Location.user == User.get_user_id(name)
 			)
 		q.execute()
 
@@ -75,17 +106,32 @@ class Catch(BaseModel):
 	encounter_id = CharField(max_length=50)
 	created_date = DateTimeField(default=datetime.datetime.now)
 
+	class Meta:
+		indexes = (
+			(('user', 'encounter_id'), False),
+			(('user', 'created_date'), False),
+		)
+
 	@staticmethod
-	def insert_catch(name, encounter_id):
+	def insert_catch(name, encounter_id, created_date=None):
 		Catch.create(
-			user = User.select().where(User.username == name),
-			encounter_id = encounter_id
+			user = User.get_user_id(name),
+			encounter_id = encounter_id,
+			created_date = created_date or datetime.datetime.now()
 		)
 
+	@staticmethod
+	def get_catchs(name):
+		catchs = Catch.select(Catch.encounter_id, Catch.created_date).where(
+			Catch.user == User.get_user_id(name)
+		).tuples()
+
+		return [(encounter_id, time.mktime(created_date.timetuple())) for encounter_id, created_date in catchs]
+
 	@staticmethod
 	def check_catch(name, encounter_id):
 		catchs = Catch.select().where(
-			Catch.user == User.select().where(User.username == name),
+			Catch.user == User.get_user_id(name),
 			Catch.encounter_id == encounter_id
 		).count()
 
@@ -94,15 +140,19 @@ class Catch(BaseModel):
 		return True
 
 	@staticmethod
-	def check_catch_count(name):
+	def prune_catchs(name, now=None):
 		q = Catch.delete().where(
-			Catch.user == User.select().where(User.username == name),
-			Catch.created_date < datetime.datetime.now() - datetime.timedelta(hours=12)
+			Catch.user == User.get_user_id(name),
+			Catch.created_date < (now or datetime.datetime.now()) - datetime.timedelta(hours=12)
 		)
 		q.execute()
 
+	@staticmethod
+	def check_catch_count(name):
+		Catch.prune_catchs(name)
+
 		catchs = Catch.select().where(
-			Catch.user == User.select().where(User.username == name)
+			Catch.user == User.get_user_id(name)
 		).count()
 
 		return catchs
@@ -111,27 +161,173 @@ class Pokestop(BaseModel):
 	user = ForeignKeyField(User, related_name='stops')
 	created_date = DateTimeField(default=datetime.datetime.now)
 
+	class Meta:
+		indexes = (
+			(('user', 'created_date'), False),
+		)
+
 	@staticmethod
-	def insert_spin(name):
+	def insert_spin(name, created_date=None):
 		Pokestop.create(
-			user = User.select().where(User.username == name),
+			user = User.get_user_id(name),
+			created_date = created_date or datetime.datetime.now()
 		)
 
 	@staticmethod
-	def check_spin_count(name):
+	def get_spins(name):
+		spins = Pokestop.select(Pokestop.created_date).where(
+			Pokestop.user == User.get_user_id(name)
+		).tuples()
+
+		return [time.mktime(created_date.timetuple()) for created_date, in spins]
+
+	@staticmethod
+	def prune_spins(name, now=None):
 		q = Pokestop.delete().where(
-			Pokestop.user == User.select().where(User.username == name),
-			Pokestop.created_date < datetime.datetime.now() - datetime.timedelta(hours=12)
+			Pokestop.user == User.get_user_id(name),
+			Pokestop.created_date < (now or datetime.datetime.now()) - datetime.timedelta(hours=12)
 		)
 		q.execute()
 
+	@staticmethod
+	def check_spin_count(name):
+		Pokestop.prune_spins(name)
+
 		spins = Pokestop.select().where(
-			Pokestop.user == User.select().where(User.username == name)
+			Pokestop.user == User.get_user_id(name)
 		).count()
 
 		return spins
+
+class KnownFort(BaseModel):
+	fort_id = CharField(primary_key=True)
+	latitude = DoubleField()
+	longitude = DoubleField()
+	name = CharField(null=True)
+	updated_date = DateTimeField(default=datetime.datetime.now)
+
+	@staticmethod
+	def get_forts():
+		forts = KnownFort.select(KnownFort.fort_id, KnownFort.latitude, KnownFort.longitude).tuples()
+
+		return [{'id': fort_id, 'latitude': lat, 'longitude': lng} for fort_id, lat, lng in forts]
+
+	@staticmethod
+	def save_forts(forts):
+		now = datetime.datetime.now()
+		rows = [{
+			'fort_id': fort['id'],
+			'latitude': fort['latitude'],
+			'longitude': fort['longitude'],
+			'updated_date': now
+		} for fort in forts]
+
+		with db.atomic():
+			for i in range(0, len(rows), 100):
+				KnownFort.insert_many(rows[i:i + 100]).on_conflict('IGNORE').execute()
+
+			# updated_date is left alone here: for forts with details it is
+			# when they were fetched, which is what their TTL counts from.
+			for row in rows:
+				KnownFort.update(
+					latitude = row['latitude'],
+					longitude = row['longitude']
+				).where(KnownFort.fort_id == row['fort_id']).execute()
+
+	@staticmethod
+	def get_details():
+		forts = KnownFort.select(
+			KnownFort.fort_id,
+			KnownFort.latitude,
+			KnownFort.longitude,
+			KnownFort.name,
+			KnownFort.updated_date
+		).where(
+			KnownFort.name.is_null(False)
+		).tuples()
+
+		return [
+			(fort_id, {'latitude': lat, 'longitude': lng, 'name': name}, updated_date)
+			for fort_id, lat, lng, name, updated_date in forts
+		]
+
+	@staticmethod
+	def set_details(fort_id, details):
+		# Updated in place, so the row keeps the columns details do not carry.
+		with db.atomic():
+			KnownFort.insert(
+				fort_id = fort_id,
+				latitude = details['latitude'],
+				longitude = details['longitude']
+			).on_conflict('IGNORE').execute()
+
+			KnownFort.update(
+				latitude = details['latitude'],
+				longitude = details['longitude'],
+				name = details['name'],
+				updated_date = datetime.datetime.now()
+			).where(KnownFort.fort_id == fort_id).execute()
 			
-def init_db():
+# Spin cooldowns belong to one player, so they are kept per account rather
+# than on the shared fort row.
+class FortCooldown(BaseModel):
+	user = ForeignKeyField(User, related_name='cooldowns')
+	fort_id = CharField()
+	cooldown_complete_timestamp_ms = BigIntegerField()
+
+	class Meta:
+		primary_key = CompositeKey('user', 'fort_id')
+
+	@staticmethod
+	def get_cooldowns(name):
+		cooldowns = FortCooldown.select(FortCooldown.fort_id, FortCooldown.cooldown_complete_timestamp_ms).where(
+			FortCooldown.user == User.get_user_id(name)
+		).tuples()
+
+		return dict(cooldowns)
+
+	@staticmethod
+	def set_cooldowns(name, cooldowns):
+		user_id = User.get_user_id(name)
+		for fort_id, timestamp_ms in cooldowns.items():
+			FortCooldown.insert(
+				user = user_id,
+				fort_id = fort_id,
+				cooldown_complete_timestamp_ms = timestamp_ms
+			).upsert().execute()
+
+	@staticmethod
+	def prune_cooldowns(name, now_ms):
+		FortCooldown.delete().where(
+			FortCooldown.user == User.get_user_id(name),
+			FortCooldown.cooldown_complete_timestamp_ms <= now_ms
+		).execute()
+
+def init_db(path='bot.db', timeout=30):
+	# User ids belong to the database they were read from.
+	_user_ids.clear()
+	db.init(path, timeout=timeout)
+
 	db.connect()
-	db.create_tables([User, Location, Catch, Pokestop], safe=True)
+	version = db.execute_sql('PRAGMA user_version').fetchone()[0]
+	if version < db_schema_version and Catch.table_exists():
+		migrate_db(version)
+
+	db.create_tables([User, Location, Catch, Pokestop, KnownFort, FortCooldown], safe=True)
+	db.execute_sql('PRAGMA user_version = %d' % db_schema_version)
 	db.close()
+
+def migrate_db(version):
+	migrator = SqliteMigrator(db)
+
+	if version < 2:
+		migrate(
+			migrator.add_index('catch', ('user_id', 'encounter_id'), False),
+			migrator.add_index('catch', ('user_id', 'created_date'), False),
+			migrator.add_index('pokestop', ('user_id', 'created_date'), False),
+		)
+
+	if version < 3 and KnownFort.table_exists():
+		migrate(
+			migrator.add_column('knownfort', 'name', KnownFort.name),
+		)
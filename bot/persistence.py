@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import time
+import atexit
+import signal
+import weakref
+import logging
+import datetime
+import threading
+
+import bot.models
+
+from bot.metrics import metrics
+
+logger = logging.getLogger('persistence')
+
+_writers = weakref.WeakSet()
+
+# Write-behind buffer for the rows the bot loop produces. Location updates
+# are coalesced to the latest position and fort cooldowns to the latest one
+# per fort; catches and spins keep their own timestamps. Everything is
+# written together in one transaction every `interval` seconds, so at most
+# one interval of writes is lost on a hard crash. Rows are stamped with
+# `clock`, the same clock the bot's counters and caches use.
+class WriteBehind(threading.Thread):
+	def __init__(self, username, interval=10, clock=time.time):
+		threading.Thread.__init__(self, name='write-behind')
+		self.daemon = True
+
+		self.username = username
+		self.interval = interval
+		self.clock = clock
+
+		self.location = None
+		self.catchs = []
+		self.spins = []
+		self.cooldowns = {}
+		self.flushes = 0
+
+		self._lock = threading.Lock()
+		self._flush_lock = threading.Lock()
+		self._stopped = threading.Event()
+
+		_writers.add(self)
+
+	def run(self):
+		try:
+			while not self._stopped.wait(self.interval):
+				self.flush()
+		finally:
+			if not bot.models.db.is_closed():
+				bot.models.db.close()
+
+	def stop(self):
+		self._stopped.set()
+		self.flush()
+		_writers.discard(self)
+
+	def set_location(self, lat, lng):
+		with self._lock:
+			self.location = (lat, lng)
+
+	def insert_catch(self, encounter_id):
+		with self._lock:
+			self.catchs.append((encounter_id, self.now()))
+
+	def insert_spin(self):
+		with self._lock:
+			self.spins.append(self.now())
+
+	def set_cooldown(self, fort_id, timestamp_ms):
+		with self._lock:
+			self.cooldowns[fort_id] = timestamp_ms
+
+	def now(self):
+		return datetime.datetime.fromtimestamp(self.clock())
+
+	def flush(self):
+		with self._flush_lock:
+			with self._lock:
+				location, catchs, spins, cooldowns = self.location, self.catchs, self.spins, self.cooldowns
+				self.location, self.catchs, self.spins, self.cooldowns = None, [], [], {}
+
+			if location is None and not catchs and not spins and not cooldowns:
+				return
+
+			try:
+				with metrics.timer('db_flush'), bot.models.db.atomic():
+					if location is not None:
+						bot.models.Location.set_location(self.username, location[0], location[1])
+
+					for encounter_id, created_date in catchs:
+						bot.models.Catch.insert_catch(self.username, encounter_id, created_date)
+
+					for created_date in spins:
+						bot.models.Pokestop.insert_spin(self.username, created_date)
+
+					bot.models.FortCooldown.set_cooldowns(self.username, cooldowns)
+			except bot.models.DatabaseError as e:
+				logger.error('Failed to flush pending writes: %s', e)
+
+				with self._lock:
+					if self.location is None:
+						self.location = location
+					self.catchs = catchs + self.catchs
+					self.spins = spins + self.spins
+					cooldowns.update(self.cooldowns)
+					self.cooldowns = cooldowns
+				return
+
+			self.flushes += 1
+
+# Flushes every live writer. Runs at exit, so rows queued by bots that never
+# reached stop() are still written on a normal exit or SIGTERM.
+def flush_all():
+	for writer in list(_writers):
+		writer.flush()
+
+atexit.register(flush_all)
+
+# SIGTERM kills a process without running atexit hooks; turned into
+# SystemExit in the main thread, it unwinds through them.
+def flush_on_sigterm():
+	signal.signal(signal.SIGTERM, _terminate)
+
+def _terminate(signum, frame):
+	raise SystemExit(128 + signum)
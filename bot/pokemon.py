@@ -1,28 +1,25 @@
 # -*- coding: utf-8 -*-
 
 import base64
-import os
-import json
 
-from bot.base_dir import _base_dir
+import bot.game_data
 
 class Pokemon(object):
-	def __init__(self, pokemon_list, pokemon_data, encounter):
+	__slots__ = (
+		'id', 'num', 'name', 'cp', 'attack', 'defense', 'stamina',
+		'move_1', 'move_2', 'encounter_id', 'spawn_point_id', 'is_egg'
+	)
+
+	def __init__(self, pokemon_data, encounter):
 		self.id = pokemon_data.get('id', 0)
 		self.num = int(pokemon_data.get('pokemon_id', 0))
-		self.name = pokemon_list[int(self.num) - 1]['Name']
+		self.name = bot.game_data.pokemon_name(self.num)
 		self.cp = pokemon_data.get('cp', 0)
 		self.attack = pokemon_data.get('individual_attack', 0)
 		self.defense = pokemon_data.get('individual_defense', 0)
 		self.stamina = pokemon_data.get('individual_stamina', 0)
-		self.fast_move_list = json.load(
-			open(os.path.join(_base_dir, 'data', 'fast_moves.json'))
-		)
-		self.charged_move_list = json.load(
-			open(os.path.join(_base_dir, 'data', 'charged_moves.json'))
-		)
-		self.move_1 = self.fast_move_list[str(pokemon_data.get('move_1', 0))]["name"]
-		self.move_2 = self.charged_move_list[str(pokemon_data.get('move_2', 0))]["name"]
+		self.move_1 = bot.game_data.fast_moves()[str(pokemon_data.get('move_1', 0))]["name"]
+		self.move_2 = bot.game_data.charged_moves()[str(pokemon_data.get('move_2', 0))]["name"]
 		self.encounter_id = long(base64.b64decode(encounter.get('encounter_id', 0))) if encounter else None,
 		self.spawn_point_id = encounter.get('spawnpoint_id', 0) if encounter else None
 		self.is_egg = False
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import itertools
+
+# Inventory pokemons keyed by id, with CP and IV orderings kept sorted.
+# Removal only drops the id entry; stale index entries are skipped on read
+# and compacted once they outnumber the live ones.
+class PokemonStore(object):
+	def __init__(self, pokemons=()):
+		self._by_id = {}
+		self._by_cp = []
+		self._by_iv = []
+		self._stale = 0
+		self._seq = itertools.count()
+
+		for pokemon in pokemons:
+			self.add(pokemon)
+
+	def __len__(self):
+		return len(self._by_id)
+
+	def __iter__(self):
+		return iter(list(self._by_id.values()))
+
+	def __contains__(self, pokemon):
+		return self._by_id.get(getattr(pokemon, 'id', pokemon)) is not None
+
+	def get(self, pokemon_id):
+		return self._by_id.get(pokemon_id)
+
+	def add(self, pokemon):
+		if pokemon.id in self._by_id:
+			self.remove(pokemon.id)
+
+		seq = next(self._seq)
+		self._by_id[pokemon.id] = pokemon
+		bisect.insort(self._by_cp, (pokemon.cp, seq, pokemon))
+		bisect.insort(self._by_iv, (pokemon.iv(), seq, pokemon))
+
+	append = add
+
+	def remove(self, pokemon):
+		pokemon_id = getattr(pokemon, 'id', pokemon)
+		removed = self._by_id.pop(pokemon_id, None)
+
+		if removed is not None:
+			self._stale += 1
+			if self._stale > len(self._by_id):
+				self._compact()
+
+		return removed
+
+	def best_cp(self, minimum=None):
+		return self._descending(self._by_cp, minimum)
+
+	def best_iv(self, minimum=None):
+		return self._descending(self._by_iv, minimum)
+
+	def below_cp(self, cp):
+		return self._below(self._by_cp, cp)
+
+	def below_iv(self, iv):
+		return self._below(self._by_iv, iv)
+
+	def _live(self, pokemon):
+		return self._by_id.get(pokemon.id) is pokemon
+
+	def _descending(self, index, minimum):
+		stop = bisect.bisect_left(index, (minimum,)) if minimum is not None else 0
+		for i in range(len(index) - 1, stop - 1, -1):
+			pokemon = index[i][2]
+			if self._live(pokemon):
+				yield pokemon
+
+	def _below(self, index, value):
+		stop = bisect.bisect_left(index, (value,))
+		if not self._stale:
+			return [entry[2] for entry in index[:stop]]
+
+		return [entry[2] for entry in index[:stop] if self._live(entry[2])]
+
+	def _compact(self):
+		self._by_cp = [entry for entry in self._by_cp if self._live(entry[2])]
+		self._by_iv = [entry for entry in self._by_iv if self._live(entry[2])]
+		self._stale = 0
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import signal
+import logging
+import cProfile
+import functools
+import threading
+
+from bot.metrics import metrics, Timer
+
+PROFILE_INTERVAL = 300
+
+logger = logging.getLogger('profiler')
+
+# Scoped cProfile for the named bot phases. Each thread keeps one profile per
+# phase; a nested phase pauses its parent, so every profile only holds the
+# time spent in its own phase. Profiles are written to `directory` every
+# `interval` seconds and when profiling is switched off, always from the
+# bot's own thread between phases.
+class Profiler(object):
+	def __init__(self):
+		self.enabled = False
+		self.active = False
+		self.toggle_requested = False
+		self.phases = None
+		self.interval = PROFILE_INTERVAL
+		self.directory = 'log'
+		self.generation = 0
+		self.pending = 0
+		self.lock = threading.Lock()
+		self.local = threading.local()
+
+	def configure(self, enabled=False, phases=None, interval=PROFILE_INTERVAL, directory='log'):
+		self.phases = set(phases) if phases else None
+		self.interval = interval
+		self.directory = directory
+
+		if enabled:
+			self.start()
+
+	def start(self):
+		with self.lock:
+			self.enabled = True
+			self.active = True
+		logger.info('Profiling started.')
+
+	def stop(self):
+		with self.lock:
+			self.enabled = False
+			self.generation += 1
+			if not self.pending and not self.toggle_requested:
+				self.active = False
+		logger.info('Profiling stopped, writing profiles to %s.', self.directory)
+
+	# SIGUSR1 handler. It may interrupt a thread holding self.lock or a
+	# logging lock, so it only raises a flag that the next phase acts on.
+	def toggle(self, *args):
+		self.toggle_requested = True
+		self.active = True
+
+	def apply_toggle(self):
+		with self.lock:
+			if not self.toggle_requested:
+				return
+			self.toggle_requested = False
+			enable = not self.enabled
+
+		if enable:
+			self.start()
+		else:
+			self.stop()
+
+	def install_signal(self):
+		if hasattr(signal, 'SIGUSR1') and threading.current_thread().name == 'MainThread':
+			signal.signal(signal.SIGUSR1, self.toggle)
+
+	def run(self, name, function, args, kwargs):
+		if self.toggle_requested:
+			self.apply_toggle()
+
+		state = self.state()
+
+		if state.generation != self.generation:
+			self.flush()
+
+		if not self.enabled or (self.phases is not None and name not in self.phases):
+			return function(*args, **kwargs)
+
+		profile = state.profiles.get(name)
+		if profile is None:
+			if not state.profiles:
+				self.acquire(state)
+			profile = state.profiles[name] = cProfile.Profile()
+
+		if state.stack:
+			state.stack[-1].disable()
+		state.stack.append(profile)
+		profile.enable()
+
+		try:
+			return function(*args, **kwargs)
+		finally:
+			profile.disable()
+			state.stack.pop()
+
+			if state.stack:
+				state.stack[-1].enable()
+			elif time.time() - state.dumped_at >= self.interval:
+				# The next profile taken by this thread registers itself again.
+				self.dump(state)
+				self.release(state)
+
+	# Writes out the calling thread's profiles unless one of its phases is
+	# still running.
+	def flush(self):
+		state = self.state()
+		if not state.stack and state.profiles:
+			self.dump(state)
+			self.release(state)
+
+	def state(self):
+		state = self.local
+		if not hasattr(state, 'stack'):
+			state.stack = []
+			state.profiles = {}
+			state.generation = self.generation
+			state.dumped_at = time.time()
+
+		return state
+
+	def acquire(self, state):
+		with self.lock:
+			self.pending += 1
+			state.generation = self.generation
+
+	def release(self, state):
+		with self.lock:
+			self.pending -= 1
+			if not self.pending and not self.enabled and not self.toggle_requested:
+				self.active = False
+
+	def dump(self, state):
+		profiles, state.profiles = state.profiles, {}
+		state.dumped_at = time.time()
+
+		stamp = time.strftime('%Y%m%d-%H%M%S')
+		thread = threading.current_thread().name
+		for name, profile in profiles.items():
+			path = os.path.join(self.directory, 'profile-%s-%s-%s.prof' % (thread, name, stamp))
+			try:
+				profile.dump_stats(path)
+			except (IOError, OSError) as e:
+				logger.error('Failed to write %s: %s', path, e)
+
+profiler = Profiler()
+
+# Marks a bot phase: always timed into phase_seconds, and profiled while the
+# profiler is on. When it is off the only extra cost is one attribute check.
+def phase(name):
+	labels = (('phase', name),)
+
+	def decorator(function):
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			with Timer(metrics, 'phase', labels):
+				if profiler.active:
+					return profiler.run(name, function, args, kwargs)
+
+				return function(*args, **kwargs)
+
+		return wrapper
+
+	return decorator
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+from bot.metrics import metrics
+
+# Calls per minute. These match the fixed sleeps that used to precede each
+# call, but a call only waits when the previous one was too recent.
+DEFAULT_LIMITS = {
+	'global': 300,
+	'methods': {
+		'get_map_objects': 60,
+		'fort_details': 60,
+		'fort_search': 60,
+		'get_player': 60,
+		'get_inventory': 60,
+		'level_up_rewards': 60,
+		'check_awarded_badges': 60,
+		'encounter': 600,
+		'catch_pokemon': 600
+	},
+	'burst': 1
+}
+
+# PGoApi methods that never reach the server, so they are neither limited
+# nor recorded.
+LOCAL_METHODS = (
+	'set_position',
+	'set_authentication',
+	'activate_signature',
+	'get_auth_provider',
+	'get_position',
+	'set_logger',
+	'create_request'
+)
+
+class TokenBucket(object):
+	def __init__(self, per_minute, burst, clock):
+		self.rate = per_minute / 60.0
+		self.capacity = float(burst)
+		self.tokens = float(burst)
+		self.clock = clock
+		self.updated = clock()
+
+	def reserve(self):
+		now = self.clock()
+		self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+		self.tokens -= 1
+
+		if self.tokens >= 0:
+			return 0
+
+		return -self.tokens / self.rate
+
+# Wraps a pgoapi.PGoApi so every RPC takes a token from the global bucket and
+# from its method's bucket, sleeping only for whatever budget is missing.
+class RateLimitedApi(object):
+	def __init__(self, api, scheduler, limits=None):
+		limits = dict(DEFAULT_LIMITS, **(limits or {}))
+		methods = dict(DEFAULT_LIMITS['methods'], **limits.get('methods', {}))
+
+		self.api = api
+		self.scheduler = scheduler
+		self.global_bucket = TokenBucket(limits['global'], limits.get('global_burst', 10), scheduler.time)
+		self.buckets = {
+			method: TokenBucket(per_minute, limits['burst'], scheduler.time)
+			for method, per_minute in methods.items()
+		}
+
+		self.calls = defaultdict(int)
+		self.waits = defaultdict(float)
+
+	def acquire(self, methods):
+		wait = self.global_bucket.reserve()
+		for method in methods:
+			bucket = self.buckets.get(method)
+			if bucket:
+				wait = max(wait, bucket.reserve())
+
+			self.calls[method] += 1
+			self.waits[method] += wait
+			metrics.inc('rpc_methods_total', method=method)
+
+		metrics.observe('rate_limit_wait_seconds', wait)
+		self.scheduler.sleep(wait)
+
+	def create_request(self):
+		return RateLimitedRequest(self.api.create_request(), self)
+
+	def __getattr__(self, name):
+		attr = getattr(self.api, name)
+
+		if name in LOCAL_METHODS or name.startswith('_') or not callable(attr):
+			return attr
+
+		def function(*args, **kwargs):
+			self.acquire((name,))
+			with metrics.timer('rpc', method=name):
+				return attr(*args, **kwargs)
+
+		return function
+
+	def average_wait(self, method):
+		if not self.calls[method]:
+			return 0.0
+
+		return self.waits[method] / self.calls[method]
+
+class RateLimitedRequest(object):
+	def __init__(self, req, limiter):
+		self.req = req
+		self.limiter = limiter
+		self.methods = []
+
+	def call(self, *args, **kwargs):
+		self.limiter.acquire(self.methods or ('create_request',))
+		with metrics.timer('rpc', method='batch'):
+			return self.req.call(*args, **kwargs)
+
+	def __getattr__(self, name):
+		attr = getattr(self.req, name)
+
+		if name.startswith('_') or not callable(attr):
+			return attr
+
+		def function(*args, **kwargs):
+			self.methods.append(name)
+			return attr(*args, **kwargs)
+
+		return function
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+
+from bot.rate_limit import LOCAL_METHODS
+
+logger = logging.getLogger('replay')
+
+# Wraps a pgoapi.PGoApi and appends every RPC envelope with its response dict
+# to a JSON lines file, for ReplayApi to serve back later.
+class RecordingApi(object):
+	def __init__(self, api, path):
+		self.api = api
+		self.path = path
+		self.lock = threading.Lock()
+
+	def record(self, methods, response):
+		try:
+			line = json.dumps({
+				'time': time.time(),
+				'methods': methods,
+				'response': response
+			})
+		except (TypeError, ValueError, UnicodeDecodeError):
+			logger.warning(
+				'Response to %s is not serializable, skip recording.',
+				', '.join(methods)
+			)
+			return
+
+		with self.lock:
+			with open(self.path, 'a') as record_file:
+				record_file.write(line + '\n')
+
+	def create_request(self):
+		return RecordingRequest(self.api.create_request(), self)
+
+	def __getattr__(self, name):
+		attr = getattr(self.api, name)
+
+		if name in LOCAL_METHODS or name.startswith('_') or not callable(attr):
+			return attr
+
+		def function(*args, **kwargs):
+			response = attr(*args, **kwargs)
+			self.record([name], response)
+			return response
+
+		return function
+
+class RecordingRequest(object):
+	def __init__(self, req, recorder):
+		self.req = req
+		self.recorder = recorder
+		self.methods = []
+
+	def call(self, *args, **kwargs):
+		response = self.req.call(*args, **kwargs)
+		self.recorder.record(self.methods, response)
+		return response
+
+	def __getattr__(self, name):
+		attr = getattr(self.req, name)
+
+		if name.startswith('_') or not callable(attr):
+			return attr
+
+		def function(*args, **kwargs):
+			self.methods.append(name)
+			return attr(*args, **kwargs)
+
+		return function
+
+# Stand-in for pgoapi.PGoApi serving a RecordingApi file. Responses are
+# matched on the methods in each envelope and handed out in recorded order,
+# starting over once exhausted so a short recording can drive a long run.
+class ReplayApi(object):
+	def __init__(self, path):
+		self.responses = defaultdict(deque)
+		self.started_at = None
+		self.position = (0.0, 0.0, 0.0)
+		self.rpcs = 0
+		self.calls = defaultdict(int)
+		self.misses = 0
+
+		with open(path) as record_file:
+			for line in record_file:
+				if not line.strip():
+					continue
+
+				record = json.loads(line)
+				if self.started_at is None:
+					self.started_at = record['time']
+				self.responses[tuple(record['methods'])].append(record['response'])
+
+	def set_position(self, lat, lng, alt=0.0):
+		self.position = (lat, lng, alt)
+
+	def get_position(self):
+		return self.position
+
+	def set_authentication(self, provider=None, username=None, password=None, **kwargs):
+		pass
+
+	def activate_signature(self, lib_path):
+		pass
+
+	def create_request(self):
+		return ReplayRequest(self)
+
+	def call(self, methods):
+		self.rpcs += 1
+		for method in methods:
+			self.calls[method] += 1
+
+		responses = self.responses.get(tuple(methods))
+		if not responses:
+			self.misses += 1
+			return {}
+
+		response = responses.popleft()
+		responses.append(response)
+		return response
+
+	def __getattr__(self, name):
+		if name.startswith('_'):
+			raise AttributeError(name)
+
+		def function(*args, **kwargs):
+			return self.call((name,))
+
+		return function
+
+class ReplayRequest(object):
+	def __init__(self, api):
+		self.api = api
+		self.methods = []
+
+	def call(self):
+		methods, self.methods = self.methods, []
+		return self.api.call(methods)
+
+	def __getattr__(self, name):
+		if name.startswith('_'):
+			raise AttributeError(name)
+
+		def function(*args, **kwargs):
+			self.methods.append(name)
+
+		return function
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import bot.geometry
+
+def distance(a, b):
+	return bot.geometry.distance(a[0], a[1], b[0], b[1])
+
+def position(fort):
+	return fort['latitude'], fort['longitude']
+
+def route_length(start, route):
+	length = 0
+	current = start
+	for fort in route:
+		length += distance(current, position(fort))
+		current = position(fort)
+
+	return length
+
+# Builds a multi-stop spinning route: greedy nearest neighbour over the forts
+# that will be off cooldown when the bot arrives, improved with 2-opt moves
+# that keep every stop reachable after its cooldown. Forts left out for
+# their cooldown, and forts spun along the way, are tracked so the route is
+# planned again once one of them comes off cooldown.
+class RoutePlanner(object):
+	def __init__(self, fort_index, speed, max_stops=10, radius=1000):
+		self.fort_index = fort_index
+		self.speed = float(speed)
+		self.max_stops = max_stops
+		self.radius = radius
+		self.route = []
+		self.cooling = {}
+
+	def plan(self, lat, lng, now=None):
+		if now is None:
+			now = self.fort_index.clock()
+
+		candidates = self.fort_index.nearby(lat, lng, self.radius)
+		route = self.nearest_neighbour((lat, lng), candidates, now)
+		self.route = self.two_opt((lat, lng), route, now)
+
+		planned = set(fort['id'] for fort in self.route)
+		self.cooling = dict(
+			(fort['id'], fort) for fort in candidates
+			if fort['id'] not in planned and not self.fort_index.available(fort['id'], now * 1000)
+		)
+
+		return self.route
+
+	def next_fort(self, lat, lng, now=None):
+		if now is None:
+			now = self.fort_index.clock()
+
+		self.replan_expired(lat, lng, now)
+
+		while self.route:
+			fort = self.route.pop(0)
+			# Either spun now or skipped for its cooldown; both come back
+			# once the cooldown expires.
+			self.cooling[fort['id']] = fort
+			arrival = now + distance((lat, lng), position(fort)) / self.speed
+			if self.fort_index.available(fort['id'], arrival * 1000):
+				return fort
+
+		self.plan(lat, lng, now)
+		if self.route:
+			fort = self.route.pop(0)
+			self.cooling[fort['id']] = fort
+			return fort
+
+		return None
+
+	# Plans again from here as soon as a fort that was left out comes off
+	# cooldown; forts that are now out of range are forgotten.
+	def replan_expired(self, lat, lng, now):
+		start = (lat, lng)
+		expired = False
+		for fort_id, fort in list(self.cooling.items()):
+			if distance(start, position(fort)) > self.radius:
+				del self.cooling[fort_id]
+			elif self.fort_index.available(fort_id, now * 1000):
+				del self.cooling[fort_id]
+				expired = True
+
+		if expired:
+			self.plan(lat, lng, now)
+
+	def nearest_neighbour(self, start, candidates, now):
+		route = []
+		remaining = list(candidates)
+		current = start
+		clock = now
+
+		while remaining and len(route) < self.max_stops:
+			best = None
+			best_distance = None
+			for fort in remaining:
+				fort_distance = distance(current, position(fort))
+				arrival = clock + fort_distance / self.speed
+				if not self.fort_index.available(fort['id'], arrival * 1000):
+					continue
+
+				if best_distance is None or fort_distance < best_distance:
+					best = fort
+					best_distance = fort_distance
+
+			if best is None:
+				break
+
+			route.append(best)
+			remaining.remove(best)
+			current = position(best)
+			clock += best_distance / self.speed
+
+		return route
+
+	def feasible(self, start, route, now):
+		clock = now
+		current = start
+		for fort in route:
+			clock += distance(current, position(fort)) / self.speed
+			if not self.fort_index.available(fort['id'], clock * 1000):
+				return False
+			current = position(fort)
+
+		return True
+
+	def two_opt(self, start, route, now):
+		best_length = route_length(start, route)
+
+		improved = True
+		while improved:
+			improved = False
+			for i in range(len(route) - 1):
+				for j in range(i + 1, len(route)):
+					candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+					candidate_length = route_length(start, candidate)
+					if candidate_length < best_length - 1e-6 and self.feasible(start, candidate, now):
+						route = candidate
+						best_length = candidate_length
+						improved = True
+
+		return route
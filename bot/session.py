@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+from pgoapi.exceptions import NotLoggedInException
+from pgoapi.exceptions import AuthException
+from pgoapi.exceptions import ServerSideRequestThrottlingException
+
+from bot.metrics import metrics
+
+RECOVER_BACKOFF = 2
+MAX_BACKOFF = 300
+
+# Recovers a Bot after a failed cycle. A throttled request only needs to
+# wait; an expired token is renewed on the existing api object, keeping its
+# position, signature library, rate limit budget and the bot's inventory.
+# Only when that fails, or the bot never finished a login, does it rebuild
+# everything through Bot.login. Waits double on every consecutive failure
+# and reset after a successful cycle.
+class Session(object):
+	def __init__(self, bot, backoff=RECOVER_BACKOFF, max_backoff=MAX_BACKOFF):
+		self.bot = bot
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+		self.delay = backoff
+		self.refreshes = 0
+		self.logins = 0
+
+	def succeeded(self):
+		self.delay = self.backoff
+
+	def valid(self):
+		return (
+			self.bot.api is not None and
+			self.bot.inventorys is not None and
+			bool(self.bot.inventorys.last_timestamp_ms) and
+			self.bot.config.get('session_refresh', True)
+		)
+
+	def recover(self, error):
+		started = self.bot.scheduler.time()
+		delay, self.delay = self.delay, min(self.delay * 2, self.max_backoff)
+
+		self.bot.logger.info(
+			'%s, retry in %d seconds.',
+			'Request throttled' if isinstance(error, ServerSideRequestThrottlingException) else 'Session lost',
+			delay
+		)
+		self.bot.scheduler.sleep(delay)
+
+		if isinstance(error, ServerSideRequestThrottlingException):
+			mode = 'wait'
+		elif self.valid() and self.refresh():
+			mode = 'refresh'
+		else:
+			self.logins += 1
+			self.bot.login()
+			mode = 'login'
+
+		metrics.observe('session_recovery_seconds', self.bot.scheduler.time() - started, mode=mode)
+
+	def refresh(self):
+		try:
+			self.bot.authenticate()
+			# Cheap authenticated call that both proves the new token works and
+			# catches the inventory up with whatever happened meanwhile.
+			self.bot.inventorys.update_inventory()
+		except (AuthException, NotLoggedInException, ServerSideRequestThrottlingException, TypeError, KeyError) as e:
+			self.bot.logger.warning('Token refresh failed (%s), login again.', e)
+			return False
+
+		self.refreshes += 1
+		self.bot.logger.info('Token refreshed.')
+		return True
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+def compile_rule(rule):
+	below_cp = rule.get('below_cp', 0)
+	below_iv = rule.get('below_iv', 0)
+
+	# IV is only computed when the CP test leaves the outcome open.
+	if rule.get('logic', 'or') == 'or':
+		return lambda pokemon: pokemon.cp < below_cp and pokemon.iv() < below_iv
+
+	return lambda pokemon: pokemon.cp < below_cp or pokemon.iv() < below_iv
+
+class TransferFilter(object):
+	def __init__(self, transfer_filter):
+		self.default = compile_rule(transfer_filter)
+		self.keep_top = transfer_filter.get('keep_top', 0)
+
+		self.species = {}
+		self.species_keep_top = {}
+		rules = [transfer_filter]
+		for name, species_filter in transfer_filter.get('species', {}).items():
+			rule = dict(transfer_filter)
+			rule.update(species_filter)
+			self.species[name] = compile_rule(rule)
+			self.species_keep_top[name] = rule.get('keep_top', 0)
+			rules.append(rule)
+
+		# When every rule needs a low CP, nothing at or above the highest
+		# below_cp can be released, and ranking aside those are never looked at.
+		self.cp_bound = None
+		if all(rule.get('logic', 'or') == 'or' for rule in rules):
+			self.cp_bound = max(rule.get('below_cp', 0) for rule in rules)
+		self.ranked = bool(self.keep_top or any(self.species_keep_top.values()))
+
+	# One pass over the inventory, or over the part of a PokemonStore's CP
+	# index below cp_bound; only species with a keep_top are grouped and
+	# ranked by CP.
+	def select(self, pokemons):
+		if self.cp_bound is not None and not self.ranked and hasattr(pokemons, 'below_cp'):
+			pokemons = pokemons.below_cp(self.cp_bound)
+
+		if not self.species and not self.ranked:
+			rule = self.default
+			return [pokemon for pokemon in pokemons if not pokemon.is_egg and rule(pokemon)]
+
+		default = self.default
+		species = self.species
+		species_keep_top = self.species_keep_top
+		keep_top = self.keep_top
+
+		transfer_pokemons = []
+		ranked = defaultdict(list)
+		for pokemon in pokemons:
+			if pokemon.is_egg:
+				continue
+
+			if species_keep_top.get(pokemon.name, keep_top):
+				ranked[pokemon.name].append(pokemon)
+			elif species.get(pokemon.name, default)(pokemon):
+				transfer_pokemons.append(pokemon)
+
+		for name, candidates in ranked.items():
+			rule = species.get(name, default)
+			candidates.sort(key=lambda k: k.cp, reverse=True)
+
+			for pokemon in candidates[species_keep_top.get(name, keep_top):]:
+				if rule(pokemon):
+					transfer_pokemons.append(pokemon)
+
+		return transfer_pokemons
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*- 
+
+import os
+import json
+import time
+import logging
+import threading
+import multiprocessing
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+from bot.base_dir import _base_dir
+from bot import Bot
+from bot.clock import Clock, Scheduler
+from bot.metrics import metrics, MetricsServer, MergedMetrics
+from bot.profiler import profiler
+
+import bot.models
+import bot.game_data
+import bot.log
+import bot.persistence
+import run
+
+logger = logging.getLogger('fleet')
+logger.setLevel(logging.INFO)
+
+MAX_BACKOFF = 300
+STABLE_RUN = 600
+METRICS_INTERVAL = 10
+
+def main():
+	logger.info('Alpha Bot v1.1 - fleet mode')
+	config = run.init_config()
+	configs = init_accounts(config)
+	if not configs:
+		return
+
+	# Workers forward their log records to this queue, so one listener in
+	# the supervisor writes the console, the log file and the account logs.
+	records = multiprocessing.Queue(bot.log.QUEUE_SIZE)
+	run.setup_logging(configs[0], records)
+	for account in configs[1:]:
+		bot.models.User.create_user(account['username'])
+
+	# Loaded before forking so every worker shares the parsed game data
+	# copy-on-write instead of parsing its own copy.
+	bot.game_data.preload()
+
+	workers = min(len(configs), config.get('workers') or multiprocessing.cpu_count())
+	shards = shard(configs, workers)
+
+	# Workers send their metrics here every METRICS_INTERVAL seconds.
+	channel = multiprocessing.Queue()
+	merged = MergedMetrics()
+	if config.get('metrics_port'):
+		logger.info('Serve fleet metrics on port %d', config['metrics_port'])
+		MetricsServer(merged, config['metrics_port']).start()
+
+	logger.info('Running %d accounts in %d workers', len(configs), workers)
+	supervise(shards, config, records, channel, merged)
+
+def init_accounts(config):
+	accounts_file = os.path.join(_base_dir, 'configs', 'accounts.json')
+
+	if not os.path.isfile(accounts_file):
+		logger.error('No /configs/accounts.json')
+		return []
+
+	with open(accounts_file, 'rb') as data:
+		accounts = json.load(data)
+
+	configs = []
+	for account in accounts:
+		account_config = dict(config)
+		account_config.update(account)
+		configs.append(account_config)
+
+	return configs
+
+def shard(configs, workers):
+	return [configs[i::workers] for i in range(workers)]
+
+def supervise(shards, config, records, channel, merged):
+	supervisor = Supervisor(shards, config, records, channel, merged)
+
+	while True:
+		supervisor.poll()
+		time.sleep(1)
+
+# Keeps one worker process per shard alive, restarting a worker that exits
+# after a backoff that doubles up to MAX_BACKOFF. `api_factory(config, clock)`
+# and `clock_factory` are handed to the workers, so a fleet can run against
+# FakeApi on virtual clocks; `clock` paces the supervisor itself.
+class Supervisor(object):
+	def __init__(self, shards, config, records, channel, merged, api_factory=None, clock_factory=Clock, clock=None):
+		self.shards = shards
+		self.records = records
+		self.channel = channel
+		self.merged = merged
+		self.api_factory = api_factory
+		self.clock_factory = clock_factory
+		self.clock = clock or Clock()
+		self.status_interval = config.get('status_interval', 300)
+		self.dump_interval = config.get('metrics_dump_interval')
+		self.metrics_file = config.get('metrics_file', 'log/metrics.json')
+
+		self.processes = [None] * len(shards)
+		self.started_at = [0] * len(shards)
+		self.restart_at = [0] * len(shards)
+		self.backoff = [1] * len(shards)
+		self.next_report = self.clock.time() + self.status_interval
+		self.next_dump = self.clock.time() + (self.dump_interval or 0)
+
+	def poll(self):
+		now = self.clock.time()
+		collect(self.channel, self.merged)
+
+		for i, configs in enumerate(self.shards):
+			process = self.processes[i]
+
+			if process is not None:
+				if process.is_alive():
+					continue
+
+				if now - self.started_at[i] >= STABLE_RUN:
+					self.backoff[i] = 1
+
+				logger.error(
+					'Worker %d exited with %s, restarting in %d seconds.',
+					i,
+					process.exitcode,
+					self.backoff[i]
+				)
+				self.processes[i] = None
+				self.restart_at[i] = now + self.backoff[i]
+				self.backoff[i] = min(self.backoff[i] * 2, MAX_BACKOFF)
+				continue
+
+			if now >= self.restart_at[i]:
+				process = multiprocessing.Process(
+					target=worker,
+					name='worker-%d' % i,
+					args=(configs, self.status_interval, i, self.records, self.channel, self.api_factory, self.clock_factory)
+				)
+				process.daemon = True
+				with bot.log.paused():
+					process.start()
+				self.processes[i] = process
+				self.started_at[i] = now
+
+		if now >= self.next_report:
+			report_fleet(self.merged, self.processes)
+			self.next_report = now + self.status_interval
+
+		if self.dump_interval and now >= self.next_dump:
+			self.merged.dump(self.metrics_file)
+			self.next_dump = now + self.dump_interval
+
+	def stop(self):
+		for process in self.processes:
+			if process is not None and process.is_alive():
+				process.terminate()
+
+		for process in self.processes:
+			if process is not None:
+				process.join()
+
+def collect(channel, merged):
+	while True:
+		try:
+			index, state = channel.get_nowait()
+		except queue.Empty:
+			return
+
+		merged.update(index, state)
+
+def worker(configs, status_interval, index, records, channel, api_factory=None, clock_factory=Clock):
+	bots = {}
+
+	# The supervisor's listener writes every record, so workers never
+	# rotate the shared log files themselves.
+	bot.log.forward(records)
+	# Counts inherited from the supervisor are not this worker's.
+	metrics.reset()
+
+	profiler.configure(
+		configs[0].get('profile', False),
+		configs[0].get('profile_phases'),
+		configs[0].get('profile_interval', 300)
+	)
+	profiler.install_signal()
+	bot.persistence.flush_on_sigterm()
+
+	for config in configs:
+		# The supervisor dumps the fleet's merged metrics instead.
+		config = dict(config, metrics_dump_interval=None)
+		thread = threading.Thread(
+			target=run_bot,
+			name=config['username'],
+			args=(config, bots, api_factory, clock_factory())
+		)
+		thread.daemon = True
+		thread.start()
+
+	reported_cycles = {}
+	next_report = time.time() + status_interval
+	try:
+		while True:
+			time.sleep(METRICS_INTERVAL)
+			channel.put((index, metrics.export()))
+
+			if time.time() >= next_report:
+				report(bots, reported_cycles, status_interval)
+				next_report += status_interval
+	finally:
+		# multiprocessing children exit without running atexit hooks.
+		bot.persistence.flush_all()
+
+def run_bot(config, bots, api_factory=None, clock=None):
+	clock = clock or Clock()
+	backoff = 1
+
+	while True:
+		started_at = clock.time()
+		account = Bot(
+			config,
+			Scheduler(clock),
+			api_factory and (lambda: api_factory(config, clock))
+		)
+		bots[config['username']] = account
+
+		try:
+			account.start()
+		except Exception:
+			logger.exception('Bot %s crashed.', config['username'])
+		finally:
+			account.stop()
+
+		if clock.time() - started_at >= STABLE_RUN:
+			backoff = 1
+
+		logger.info('Restarting %s in %d seconds.', config['username'], backoff)
+		clock.sleep(backoff)
+		backoff = min(backoff * 2, MAX_BACKOFF)
+
+def report(bots, reported_cycles, status_interval):
+	try:
+		import resource
+		rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	except ImportError:
+		rss = 0
+
+	logger.info(
+		'[%s] Peak RSS: %d KB',
+		multiprocessing.current_process().name,
+		rss
+	)
+
+	for username, account in list(bots.items()):
+		cycles = account.cycles
+		last_cycles = reported_cycles.get(username, 0)
+		reported_cycles[username] = cycles
+
+		logger.info(
+			'[%s] Cycles: %d (%.2f/min) | Catches: %d | Spins: %d',
+			username,
+			cycles,
+			(cycles - last_cycles) * 60.0 / status_interval,
+			account.catch_counter.count() if account.catch_counter else 0,
+			account.spin_counter.count() if account.spin_counter else 0
+		)
+
+def report_fleet(merged, processes):
+	counters = merged.registry().counters
+
+	def total(name):
+		return sum(value for (counter, labels), value in counters.items() if counter == name)
+
+	logger.info(
+		'[fleet] Workers: %d/%d | Cycles: %d | Catches: %d | Spins: %d | Logins: %d | Failed cycles: %d',
+		sum(1 for process in processes if process is not None and process.is_alive()),
+		len(processes),
+		total('cycles_total'),
+		total('catches_total'),
+		total('spins_total'),
+		total('logins_total'),
+		total('cycle_errors_total')
+	)
+
+
+if __name__ == '__main__':
+	main()
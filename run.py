@@ -7,10 +7,17 @@ import time
 import sys
 import platform
 
+from pgoapi import pgoapi
+
 from bot.base_dir import _base_dir
+from bot.replay import RecordingApi
+from bot.metrics import metrics, MetricsServer
+from bot.profiler import profiler
+from bot.persistence import flush_on_sigterm
 from bot import Bot
 
 import bot.models
+import bot.log
 
 logging.basicConfig(
 	level=logging.INFO,
@@ -22,8 +29,29 @@ def main():
 	logger.info('Alpha Bot v1.1')
 	config = init_config()
 	setup_logging(config)
-	bot = Bot(config)
-	bot.start()
+
+	if config.get('metrics_port'):
+		logger.info('Serve metrics on port %d', config['metrics_port'])
+		MetricsServer(metrics, config['metrics_port']).start()
+
+	profiler.configure(
+		config.get('profile', False),
+		config.get('profile_phases'),
+		config.get('profile_interval', 300)
+	)
+	profiler.install_signal()
+	flush_on_sigterm()
+
+	api_factory = None
+	if config.get('record_api'):
+		logger.info('Record API responses to %s', config['record_api'])
+		api_factory = lambda: RecordingApi(pgoapi.PGoApi(), config['record_api'])
+
+	bot = Bot(config, api_factory=api_factory)
+	try:
+		bot.start()
+	finally:
+		bot.stop()
 
 def init_config():
 	config_file = os.path.join(_base_dir, 'configs', 'config.json')
@@ -79,7 +107,9 @@ def get_encrypt_lib():
 	lib_path = os.path.join(_base_dir, "libencrypt", lib_name)
 	return lib_path
 
-def setup_logging(config):
+def setup_logging(config, records=None):
+	bot.log.setup(config, records=records)
+
 	logging.getLogger("requests").setLevel(logging.ERROR)
 	logging.getLogger("websocket").setLevel(logging.ERROR)
 	logging.getLogger("socketio").setLevel(logging.ERROR)
@@ -88,7 +118,10 @@ def setup_logging(config):
 	logging.getLogger("pgoapi").setLevel(logging.ERROR)
 	logging.getLogger("rpc_api").setLevel(logging.ERROR)
 
-	bot.models.init_db()
+	bot.models.init_db(
+		config.get('db_path', 'bot.db'),
+		config.get('db_timeout', 30)
+	)
 	bot.models.User.create_user(config['username'])
 
 
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from bot import Bot
+from bot.base_dir import _base_dir
+from bot.clock import Scheduler, VirtualClock
+from bot.fake_api import SyntheticWorld, FakeApi, FakeFeedServer
+
+import bot.models
+
+def load_config():
+	with open(os.path.join(_base_dir, 'configs', 'config.json.example'), 'rb') as data:
+		config = json.load(data)
+
+	config.update({
+		'auth_service': 'ptc',
+		'username': 'test',
+		'password': '',
+		'encrypt_location': ''
+	})
+	# Never switch to farming, so every cycle runs the full schedule.
+	config['farming_mode']['all_pokeball']['min'] = 0
+	return config
+
+class BotCycleTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='alphabot-test-')
+		bot.models.init_db(os.path.join(self.directory, 'bot.db'))
+
+		self.config = load_config()
+		bot.models.User.create_user(self.config['username'])
+
+		lat, lng = [float(x) for x in self.config['location'].split(',')]
+		self.clock = VirtualClock()
+		self.world = SyntheticWorld(
+			lat,
+			lng,
+			forts = 50,
+			spawns = 20,
+			pokemons = 50,
+			seed = 1,
+			clock = self.clock.time,
+			username = self.config['username']
+		)
+		self.api = FakeApi(self.world, sleep=self.clock.sleep)
+
+		self.feed_server = FakeFeedServer(self.world.feed)
+		self.feed_server.start()
+		self.config['feed_url'] = self.feed_server.url
+
+		self.account = Bot(self.config, Scheduler(self.clock), api_factory=lambda: self.api)
+		self.account.setup()
+
+	def tearDown(self):
+		self.account.stop()
+		self.feed_server.stop()
+		bot.models.db.close()
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def test_badges_checked_every_cycle(self):
+		# The map is only fetched again once the fort index goes stale, so
+		# badges must not ride along with get_map_objects.
+		checked = self.api.calls['check_awarded_badges']
+		fetched = self.api.calls['get_map_objects']
+
+		for i in range(5):
+			self.account.run_cycle()
+
+		self.assertEqual(self.account.cycles, 5)
+		self.assertEqual(self.api.calls['check_awarded_badges'] - checked, 5)
+		self.assertLess(self.api.calls['get_map_objects'] - fetched, 5)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from pgoapi import utilities
+
+from bot.cells import CellCache
+
+class CellCacheTest(unittest.TestCase):
+	def test_matches_pgoapi(self):
+		cache = CellCache()
+		rng = random.Random(0)
+
+		for i in range(200):
+			lat = rng.uniform(-80, 80)
+			lng = rng.uniform(-180, 180)
+			self.assertEqual(cache.cell_ids(lat, lng), utilities.get_cell_ids(lat, lng))
+
+	def test_face_edges_match_pgoapi(self):
+		cache = CellCache()
+
+		for lat, lng in ((0, 0), (0, 45), (0, -135), (35.26, 45), (89.99, 10), (-89.99, -170), (45, 180), (-45, -180)):
+			for d_lat, d_lng in ((0, 0), (1e-7, 1e-7), (-1e-7, -1e-7)):
+				point = (lat + d_lat, lng + d_lng)
+				self.assertEqual(cache.cell_ids(*point), utilities.get_cell_ids(*point))
+
+	def test_cached_walk_matches_pgoapi(self):
+		cache = CellCache()
+
+		# Ten metre steps mostly stay in the same level 15 cell, so most of
+		# these come from the cache.
+		for i in range(300):
+			lat = 40.0 + i * 0.00009
+			lng = -74.0 + i * 0.00005
+			self.assertEqual(cache.cell_ids(lat, lng), utilities.get_cell_ids(lat, lng))
+
+		self.assertLess(len(cache.neighbourhoods), 300)
+
+	def test_size_bound(self):
+		cache = CellCache(size=4)
+		for i in range(10):
+			cache.cell_ids(40.0 + i * 0.01, -74.0)
+
+		self.assertEqual(len(cache.neighbourhoods), 4)
+
+	def test_since_timestamps(self):
+		cache = CellCache()
+		cell_ids = cache.cell_ids(40.0, -74.0)
+		cache.update([{'s2_cell_id': cell_ids[3], 'current_timestamp_ms': 1234}, {'s2_cell_id': 1}])
+
+		timestamps = cache.since_timestamps(cell_ids)
+		self.assertEqual(timestamps[3], 1234)
+		self.assertEqual(timestamps.count(0), len(cell_ids) - 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+from bot.clock import Scheduler, VirtualClock
+
+START = 1500000000
+
+class SchedulerTest(unittest.TestCase):
+	def setUp(self):
+		self.clock = VirtualClock(START)
+		self.scheduler = Scheduler(self.clock)
+		self.calls = []
+
+	def record(self, name):
+		return lambda: self.calls.append((name, self.clock.time() - START))
+
+	def test_call_later_and_every_run_in_deadline_order(self):
+		self.scheduler.call_later(5, self.record('later'))
+		self.scheduler.every(3, self.record('every'))
+		self.scheduler.call_later(1, self.record('soon'))
+		self.scheduler.every(4, self.record('first'), 0)
+
+		self.scheduler.sleep(10)
+
+		self.assertEqual(self.calls, [
+			('first', 0),
+			('soon', 1),
+			('every', 3),
+			('first', 4),
+			('later', 5),
+			('every', 6),
+			('first', 8),
+			('every', 9)
+		])
+		self.assertEqual(self.clock.time(), START + 10)
+
+	def test_same_deadline_runs_in_scheduling_order(self):
+		for name in ('a', 'b', 'c'):
+			self.scheduler.call_later(2, self.record(name))
+
+		self.scheduler.sleep(2)
+
+		self.assertEqual(self.calls, [('a', 2), ('b', 2), ('c', 2)])
+
+	def test_periodic_task_is_rescheduled(self):
+		self.scheduler.every(10, self.record('tick'))
+
+		self.scheduler.sleep(35)
+		self.assertEqual([at for name, at in self.calls], [10, 20, 30])
+		self.assertEqual(len(self.scheduler.tasks), 1)
+		self.assertEqual(self.scheduler.tasks[0][0], START + 40)
+
+	def test_late_periodic_task_does_not_catch_up(self):
+		def slow():
+			self.calls.append(('slow', self.clock.time() - START))
+			self.clock.sleep(25)
+
+		self.scheduler.every(10, slow)
+		self.scheduler.sleep(60)
+
+		# Each pass runs an overdue task once rather than once for every
+		# period it missed, so the sleep returns.
+		self.assertEqual([at for name, at in self.calls], [10, 35, 60])
+		self.assertEqual(self.clock.time(), START + 85)
+
+	def test_tasks_run_inside_sleep(self):
+		self.scheduler.call_later(3, self.record('task'))
+
+		self.scheduler.sleep(2)
+		self.assertEqual(self.calls, [])
+
+		self.scheduler.sleep(2)
+		self.assertEqual(self.calls, [('task', 3)])
+		self.assertEqual(self.clock.time(), START + 4)
+
+	def test_call_later_from_a_task(self):
+		self.scheduler.call_later(1, lambda: self.scheduler.call_later(2, self.record('chained')))
+
+		self.scheduler.sleep(5)
+
+		self.assertEqual(self.calls, [('chained', 3)])
+
+	def test_virtual_day_runs_quickly(self):
+		counts = {'flush': 0, 'prune': 0}
+
+		def count(name):
+			def task():
+				counts[name] += 1
+			return task
+
+		self.scheduler.every(10, count('flush'))
+		self.scheduler.every(3600, count('prune'), 0)
+
+		started = time.time()
+		# The bot's own pacing: a cycle every few seconds.
+		while self.clock.time() < START + 24 * 60 * 60:
+			self.scheduler.sleep(3)
+
+		self.assertLess(time.time() - started, 5)
+		self.assertEqual(counts, {'flush': 8640, 'prune': 25})
+
+
+if __name__ == '__main__':
+	unittest.main()
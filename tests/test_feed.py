@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from bot.clock import VirtualClock
+from bot.fake_api import FakeFeedServer
+from bot.feed import FeedPrefetcher, RARE_RATE, select_pokemons
+
+FETCH_SECONDS = 0.25
+LAT = 24.787466
+LNG = 120.983666
+NOW = 1500000000
+
+def feed_pokemon(encounter_id, rarity=u'常見'):
+	return {
+		'encounter_id': encounter_id,
+		'spawnpoint_id': 'spawn-%s' % encounter_id,
+		'pokemon_id': 16,
+		'pokemon_rarity': rarity,
+		'latitude': 24.787466,
+		'longitude': 120.983666,
+		'disappear_time': 1500000900000
+	}
+
+class FeedPrefetcherTest(unittest.TestCase):
+	def setUp(self):
+		self.clock = VirtualClock(1500000000)
+		self.pokemons = [feed_pokemon('a'), feed_pokemon('b', u'罕見')]
+
+		self.server = FakeFeedServer(self.serve)
+		self.server.start()
+		self.prefetcher = FeedPrefetcher(self.server.url, clock=self.clock.time)
+
+	def tearDown(self):
+		if self.server is not None:
+			self.server.stop()
+
+	# Every fetch takes FETCH_SECONDS on the virtual clock.
+	def serve(self):
+		self.clock.sleep(FETCH_SECONDS)
+		return self.pokemons
+
+	def test_refresh(self):
+		self.assertIsNone(self.prefetcher.snapshot)
+		self.assertIsNone(self.prefetcher.age())
+
+		self.prefetcher.refresh()
+
+		self.assertEqual([pokemon['encounter_id'] for pokemon in self.prefetcher.snapshot], ['a', 'b'])
+		self.assertEqual([pokemon['pokemon_rarity'] for pokemon in self.prefetcher.snapshot], [0, RARE_RATE[u'罕見']])
+		self.assertEqual(self.prefetcher.fetches, 1)
+		self.assertEqual(self.prefetcher.errors, 0)
+
+	def test_refresh_swaps_snapshot(self):
+		self.prefetcher.refresh()
+		snapshot = self.prefetcher.snapshot
+
+		self.pokemons = [feed_pokemon('c')]
+		self.prefetcher.refresh()
+
+		# Readers holding the old snapshot keep a complete list.
+		self.assertIsNot(self.prefetcher.snapshot, snapshot)
+		self.assertEqual([pokemon['encounter_id'] for pokemon in snapshot], ['a', 'b'])
+		self.assertEqual([pokemon['encounter_id'] for pokemon in self.prefetcher.snapshot], ['c'])
+		self.assertEqual(self.prefetcher.fetches, 2)
+
+	def test_failed_fetch_keeps_snapshot(self):
+		self.prefetcher.refresh()
+		snapshot = self.prefetcher.snapshot
+		updated_at = self.prefetcher.updated_at
+
+		self.server.stop()
+		self.server = None
+		self.clock.sleep(30)
+		self.prefetcher.refresh()
+
+		self.assertIs(self.prefetcher.snapshot, snapshot)
+		self.assertEqual(self.prefetcher.updated_at, updated_at)
+		self.assertEqual(self.prefetcher.fetches, 1)
+		self.assertEqual(self.prefetcher.errors, 1)
+
+	def test_latency_and_age(self):
+		self.prefetcher.refresh()
+
+		self.assertEqual(self.prefetcher.latency, FETCH_SECONDS)
+		self.assertEqual(self.prefetcher.age(), 0)
+
+		self.clock.sleep(12)
+		self.assertEqual(self.prefetcher.age(), 12)
+
+# The feed order select_pokemons replaced: sort by disappear time, then by
+# rarity, and walk it skipping caught encounters. Expired spawns were
+# skipped later, when the encounter failed.
+def sorted_selection(pokemons, count, rare_first, is_caught, now):
+	pokemons = sorted(pokemons, key=lambda k: k['disappear_time'])
+	if rare_first:
+		pokemons = sorted(pokemons, key=lambda k: k['pokemon_rarity'], reverse=True)
+
+	return [
+		pokemon for pokemon in pokemons
+		if pokemon['encounter_id'] and pokemon['disappear_time'] > now * 1000 and not is_caught(pokemon['encounter_id'])
+	][:count]
+
+def spawn(encounter_id, rarity, disappear_in, north=0):
+	return {
+		'encounter_id': encounter_id,
+		'pokemon_rarity': rarity,
+		'latitude': LAT + north / 111195.0,
+		'longitude': LNG,
+		'disappear_time': (NOW + disappear_in) * 1000
+	}
+
+def ids(pokemons):
+	return [pokemon['encounter_id'] for pokemon in pokemons]
+
+class SelectPokemonsTest(unittest.TestCase):
+	def select(self, pokemons, count, rare_first=True, caught=()):
+		return select_pokemons(pokemons, count, rare_first, LAT, LNG, lambda encounter_id: encounter_id in caught, NOW)
+
+	def test_rare_first(self):
+		pokemons = [spawn('common', 0, 60), spawn('rare', 2, 600), spawn('uncommon', 1, 120), spawn('rare-soon', 2, 300)]
+
+		self.assertEqual(ids(self.select(pokemons, 4)), ['rare-soon', 'rare', 'uncommon', 'common'])
+		self.assertEqual(ids(self.select(pokemons, 4, rare_first=False)), ['common', 'uncommon', 'rare-soon', 'rare'])
+
+	def test_ties_broken_by_distance(self):
+		pokemons = [spawn('far', 1, 300, 500), spawn('near', 1, 300, 50), spawn('middle', 1, 300, 200), spawn('later', 1, 400)]
+
+		self.assertEqual(ids(self.select(pokemons, 4)), ['near', 'middle', 'far', 'later'])
+		# The cut falls inside the tie, so the nearest of the tied ones win.
+		self.assertEqual(ids(self.select(pokemons, 2)), ['near', 'middle'])
+
+	def test_expired_caught_and_anonymous_skipped(self):
+		pokemons = [spawn('expired', 4, -1), spawn('caught', 3, 300), spawn(None, 3, 300), spawn('gone-now', 3, 0), spawn('kept', 0, 300)]
+
+		self.assertEqual(ids(self.select(pokemons, 5, caught=('caught',))), ['kept'])
+		self.assertEqual(self.select([], 5), [])
+		self.assertEqual(self.select(pokemons, 0), [])
+
+	def test_count_matches_sorted_selection(self):
+		rng = random.Random(0)
+		pokemons = [
+			spawn('encounter-%d' % i, rng.randint(0, 4), rng.randint(-300, 900), rng.uniform(0, 1000))
+			for i in range(500)
+		]
+		caught = set(pokemon['encounter_id'] for pokemon in rng.sample(pokemons, 50))
+
+		# Spawns share a disappear second often enough that distance decides
+		# between them, which the sort never looked at; compare on the
+		# ranking the sort did use.
+		for rare_first in (True, False):
+			if rare_first:
+				rank = lambda pokemon: (pokemon['pokemon_rarity'], pokemon['disappear_time'])
+			else:
+				rank = lambda pokemon: pokemon['disappear_time']
+
+			for count in (1, 5, 20, 100, 1000):
+				selected = self.select(pokemons, count, rare_first, caught)
+				expected = sorted_selection(pokemons, count, rare_first, lambda encounter_id: encounter_id in caught, NOW)
+
+				self.assertEqual(len(selected), len(expected))
+				self.assertEqual([rank(pokemon) for pokemon in selected], [rank(pokemon) for pokemon in expected])
+
+
+if __name__ == '__main__':
+	unittest.main()
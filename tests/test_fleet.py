@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import shutil
+import signal
+import tempfile
+import unittest
+import multiprocessing
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+from bot.clock import VirtualClock
+from bot.fake_api import SyntheticWorld, FakeApi, FakeFeedServer
+from bot.metrics import MergedMetrics
+from tests.test_bot import load_config
+
+import bot.log
+import bot.models
+import fleet
+
+USERNAMES = ('alpha', 'bravo', 'crash')
+CRASHES = 3
+
+# Runs in the workers: every account gets its own world on its own clock, and
+# the `crash` account fails to log in a few times before it comes up.
+def fake_api(config, clock):
+	if config['username'] == 'crash':
+		crashes = fake_api.crashes = getattr(fake_api, 'crashes', 0) + 1
+		if crashes <= CRASHES:
+			raise RuntimeError('login failed')
+
+	lat, lng = [float(x) for x in config['location'].split(',')]
+	world = SyntheticWorld(lat, lng, forts=30, spawns=0, pokemons=20, seed=1, clock=clock.time, username=config['username'])
+	return FakeApi(world, sleep=clock.sleep)
+
+class FleetTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='alphabot-test-')
+		bot.models.init_db(os.path.join(self.directory, 'bot.db'))
+
+		self.feed_server = FakeFeedServer(lambda: [])
+		self.feed_server.start()
+
+		self.configs = []
+		for username in USERNAMES:
+			config = dict(load_config(), username=username, feed_url=self.feed_server.url)
+			bot.models.User.create_user(username)
+			self.configs.append(config)
+
+		self.metrics_interval = fleet.METRICS_INTERVAL
+		fleet.METRICS_INTERVAL = 0.05
+
+		self.records = multiprocessing.Queue(bot.log.QUEUE_SIZE)
+		self.channel = multiprocessing.Queue()
+		self.merged = MergedMetrics()
+		self.clock = VirtualClock(1500000000)
+		self.logged = []
+		self.supervisor = None
+
+	def tearDown(self):
+		if self.supervisor is not None:
+			self.supervisor.stop()
+		fleet.METRICS_INTERVAL = self.metrics_interval
+		self.feed_server.stop()
+		bot.models.db.close()
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def drain(self):
+		while True:
+			try:
+				self.logged.append(self.records.get_nowait())
+			except queue.Empty:
+				return
+
+	def cycles(self, username):
+		return self.merged.registry().counters.get(('cycles_total', (('account', username),)), 0)
+
+	# Polls the supervisor on wall-clock time until `condition` holds, while
+	# its virtual clock stands still.
+	def wait(self, condition, timeout=60):
+		deadline = time.time() + timeout
+		while not condition():
+			self.assertLess(time.time(), deadline)
+			self.drain()
+			self.supervisor.poll()
+			time.sleep(0.05)
+
+	def test_fleet_on_fake_api(self):
+		shards = fleet.shard(self.configs, 2)
+		self.assertEqual([[config['username'] for config in configs] for configs in shards], [['alpha', 'crash'], ['bravo']])
+
+		self.supervisor = fleet.Supervisor(
+			shards,
+			{'status_interval': 3600},
+			self.records,
+			self.channel,
+			self.merged,
+			api_factory = fake_api,
+			clock_factory = VirtualClock,
+			clock = self.clock
+		)
+		self.wait(lambda: all(self.cycles(username) > 0 for username in USERNAMES))
+
+		# Each account logs from the worker of its shard, and the records
+		# reach the supervisor's queue.
+		workers = {}
+		for record in self.logged:
+			if record.threadName in USERNAMES:
+				workers.setdefault(record.threadName, set()).add(record.processName)
+		self.assertEqual(workers, {'alpha': {'worker-0'}, 'crash': {'worker-0'}, 'bravo': {'worker-1'}})
+
+		# A bot that raises is restarted by its worker with a doubling backoff.
+		messages = [record.getMessage() for record in self.logged if record.threadName == 'crash']
+		self.assertEqual(sum(1 for message in messages if message.startswith('Bot crash crashed.')), CRASHES)
+		for seconds in (1, 2, 4):
+			self.assertIn('Restarting crash in %d seconds.' % seconds, messages)
+
+		# A worker that dies is restarted by the supervisor, once its backoff
+		# has passed on the supervisor's clock.
+		process = self.supervisor.processes[1]
+		os.kill(process.pid, signal.SIGTERM)
+		process.join()
+
+		self.supervisor.poll()
+		before = self.cycles('bravo')
+		self.assertIsNone(self.supervisor.processes[1])
+		self.assertEqual(self.supervisor.backoff[1], 2)
+		self.supervisor.poll()
+		self.assertIsNone(self.supervisor.processes[1])
+
+		self.clock.sleep(1)
+		self.supervisor.poll()
+		restarted = self.supervisor.processes[1]
+		self.assertIsNotNone(restarted)
+		self.assertNotEqual(restarted.pid, process.pid)
+
+		# The restarted worker counts from zero, and the merged totals keep
+		# the cycles of its previous run on top.
+		self.wait(lambda: self.cycles('bravo') > before)
+		self.assertEqual(len(self.merged.sources), 2)
+
+		os.kill(restarted.pid, signal.SIGTERM)
+		restarted.join()
+		self.supervisor.poll()
+		self.assertEqual(self.supervisor.backoff[1], 4)
+		self.assertEqual(self.supervisor.restart_at[1], self.clock.time() + 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
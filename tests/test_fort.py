@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import datetime
+import threading
+import tempfile
+import unittest
+
+from bot.clock import VirtualClock
+from bot.fort import FortCache, FORT_CACHE_TTL
+
+import bot.models
+
+DETAILS = {'latitude': 40.0, 'longitude': -74.0, 'name': 'Fountain'}
+
+class FortCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='alphabot-test-')
+		bot.models.init_db(os.path.join(self.directory, 'bot.db'))
+
+	def tearDown(self):
+		if not bot.models.db.is_closed():
+			bot.models.db.close()
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def test_load_keeps_fetch_time(self):
+		bot.models.KnownFort.set_details('fresh', DETAILS)
+		bot.models.KnownFort.set_details('stale', DETAILS)
+		bot.models.KnownFort.update(
+			updated_date = datetime.datetime.now() - datetime.timedelta(hours=25)
+		).where(bot.models.KnownFort.fort_id == 'stale').execute()
+
+		cache = FortCache()
+		cache.load()
+
+		self.assertEqual(cache.get('fresh'), DETAILS)
+		self.assertIsNone(cache.get('stale'))
+		self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+	def test_position_update_keeps_fetch_time(self):
+		bot.models.KnownFort.set_details('fort', DETAILS)
+		updated_date = datetime.datetime.now() - datetime.timedelta(hours=25)
+		bot.models.KnownFort.update(updated_date=updated_date).execute()
+
+		bot.models.KnownFort.save_forts([{'id': 'fort', 'latitude': 40.001, 'longitude': -74.0}])
+
+		cache = FortCache()
+		cache.load()
+		self.assertIsNone(cache.get('fort'))
+
+	def test_ttl_runs_on_clock(self):
+		clock = VirtualClock(1500000000)
+		cache = FortCache(clock=clock.time)
+		cache.set('fort', DETAILS, False)
+
+		clock.sleep(FORT_CACHE_TTL)
+		self.assertEqual(cache.get('fort'), DETAILS)
+
+		clock.sleep(1)
+		self.assertIsNone(cache.get('fort'))
+		self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+	def test_shared_between_threads(self):
+		cache = FortCache(size=50)
+		errors = []
+
+		def worker(offset):
+			try:
+				for i in range(2000):
+					fort_id = 'fort-%d' % ((i + offset) % 80)
+					if cache.get(fort_id) is None:
+						cache.set(fort_id, DETAILS, False)
+						cache.fetched(0.1)
+			except Exception as e:
+				errors.append(e)
+
+		threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(0, 80, 10)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		self.assertEqual(errors, [])
+		self.assertEqual(cache.hits + cache.misses, 16000)
+		self.assertEqual(cache.fetches, cache.misses)
+		self.assertLessEqual(len(cache.entries), 50)
+
+	def test_seconds_saved_from_measured_fetches(self):
+		cache = FortCache()
+		self.assertEqual(cache.seconds_saved(), 0)
+
+		cache.fetched(0.2)
+		cache.fetched(0.4)
+		cache.set('fort', DETAILS, False)
+		for i in range(10):
+			cache.get('fort')
+
+		self.assertAlmostEqual(cache.mean_fetch_seconds(), 0.3)
+		self.assertAlmostEqual(cache.seconds_saved(), 3.0)
+
+
+if __name__ == '__main__':
+	unittest.main()
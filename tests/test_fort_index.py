@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from bot.fort_index import FortIndex, FORT_COOLDOWN_MS
+from bot.persistence import WriteBehind
+
+import bot.models
+import bot.geometry
+
+START = 1500000000
+
+def random_forts(count, seed=0):
+	rng = random.Random(seed)
+	return [{
+		'id': 'fort-%d' % i,
+		'latitude': 40.0 + rng.uniform(-0.05, 0.05),
+		'longitude': -74.0 + rng.uniform(-0.05, 0.05)
+	} for i in range(count)]
+
+class FortIndexTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='alphabot-test-')
+		self.path = os.path.join(self.directory, 'bot.db')
+		bot.models.init_db(self.path)
+		for username in ('test', 'alice', 'bob', 'carol'):
+			bot.models.User.create_user(username)
+		self.now = START
+
+	def tearDown(self):
+		if not bot.models.db.is_closed():
+			bot.models.db.close()
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def index(self):
+		return FortIndex(clock=lambda: self.now)
+
+	def test_nearest_matches_brute_force(self):
+		forts = random_forts(2000)
+		index = self.index()
+		index.add_forts(forts, False)
+		for fort in forts[::3]:
+			index.set_cooldown(fort['id'])
+
+		available = [fort for fort in forts if index.available(fort['id'], self.now * 1000)]
+		rng = random.Random(1)
+		for i in range(50):
+			lat = 40.0 + rng.uniform(-0.06, 0.06)
+			lng = -74.0 + rng.uniform(-0.06, 0.06)
+			distances = bot.geometry.distances(lat, lng, [(fort['latitude'], fort['longitude']) for fort in available])
+			self.assertEqual(index.nearest(lat, lng)['id'], available[distances.index(min(distances))]['id'])
+
+	def test_cooldown_survives_restart(self):
+		forts = random_forts(3)
+		index = self.index()
+		index.add_forts(forts)
+
+		writer = WriteBehind('test', clock=lambda: self.now)
+		writer.set_cooldown('fort-0', index.set_cooldown('fort-0'))
+		writer.flush()
+
+		index = self.index()
+		index.load('test')
+		self.assertEqual(len(index), 3)
+		self.assertFalse(index.available('fort-0', self.now * 1000))
+		self.assertTrue(index.available('fort-1', self.now * 1000))
+		self.assertTrue(index.available('fort-0', self.now * 1000 + FORT_COOLDOWN_MS))
+
+	def test_cooldowns_are_per_account(self):
+		index = self.index()
+		index.add_forts(random_forts(2))
+
+		bot.models.FortCooldown.set_cooldowns('alice', {'fort-0': START * 1000 + 60000})
+		bot.models.FortCooldown.set_cooldowns('bob', {'fort-1': START * 1000 + 30000})
+		bot.models.FortCooldown.set_cooldowns('bob', {'fort-1': START * 1000 + 90000})
+
+		alice = self.index()
+		alice.load('alice')
+		bob = self.index()
+		bob.load('bob')
+		carol = self.index()
+		carol.load('carol')
+
+		self.assertEqual(alice.cooldowns, {'fort-0': START * 1000 + 60000})
+		self.assertEqual(bob.cooldowns, {'fort-1': START * 1000 + 90000})
+		self.assertEqual(carol.cooldowns, {})
+		self.assertTrue(bob.available('fort-0', self.now * 1000))
+		self.assertFalse(alice.available('fort-0', self.now * 1000))
+
+	def test_details_keep_cooldown(self):
+		index = self.index()
+		index.add_forts(random_forts(1))
+		bot.models.FortCooldown.set_cooldowns('test', {'fort-0': START * 1000 + 60000})
+		bot.models.KnownFort.set_details('fort-0', {'latitude': 40.0, 'longitude': -74.0, 'name': 'Fountain'})
+
+		index = self.index()
+		index.load('test')
+		self.assertEqual(index.cooldowns, {'fort-0': START * 1000 + 60000})
+
+	def test_prune_cooldowns(self):
+		bot.models.FortCooldown.set_cooldowns('alice', {'fort-0': 1000, 'fort-1': 3000})
+		bot.models.FortCooldown.set_cooldowns('bob', {'fort-0': 1000})
+		bot.models.FortCooldown.prune_cooldowns('alice', 2000)
+
+		self.assertEqual(bot.models.FortCooldown.get_cooldowns('alice'), {'fort-1': 3000})
+		self.assertEqual(bot.models.FortCooldown.get_cooldowns('bob'), {'fort-0': 1000})
+
+
+if __name__ == '__main__':
+	unittest.main()
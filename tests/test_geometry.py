@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+import gpxpy.geo
+
+import bot.geometry
+
+LAT = 24.787466
+LNG = 120.983666
+METERS_PER_DEGREE = 111195.0
+
+# The walk loop walk_path replaced.
+def legacy_walk(lat, lng, to_lat, to_lng, step, epsilon=10):
+	dist = gpxpy.geo.haversine_distance(lat, lng, to_lat, to_lng)
+	divisions = dist / step or 1
+	d_lat = (lat - to_lat) / divisions
+	d_lng = (lng - to_lng) / divisions
+
+	path = []
+	while dist > epsilon and len(path) <= divisions:
+		lat -= d_lat
+		lng -= d_lng
+		dist = gpxpy.geo.haversine_distance(lat, lng, to_lat, to_lng)
+		path.append((lat, lng, dist))
+
+	return path
+
+class GeometryTest(unittest.TestCase):
+	def test_distance_matches_gpxpy(self):
+		rng = random.Random(0)
+		points = [(LAT + rng.uniform(-0.1, 0.1), LNG + rng.uniform(-0.1, 0.1)) for i in range(100)]
+
+		for point, meters in zip(points, bot.geometry.distances(LAT, LNG, points)):
+			self.assertAlmostEqual(meters, gpxpy.geo.haversine_distance(LAT, LNG, point[0], point[1]), 6)
+
+	def test_walk_path_ends_on_target(self):
+		# 120 metres in 25 metre steps: the fourth step is still 20 metres
+		# out, so the fifth lands on the target instead of overshooting.
+		to_lat = LAT + 120 / METERS_PER_DEGREE
+		path = bot.geometry.walk_path(LAT, LNG, to_lat, LNG, 25)
+
+		self.assertEqual(len(path), 5)
+		self.assertGreater(path[-2][2], 10)
+		self.assertEqual(path[-1], (to_lat, LNG, 0.0))
+
+	def test_walk_path_within_epsilon(self):
+		self.assertEqual(bot.geometry.walk_path(LAT, LNG, LAT, LNG, 10), [])
+		self.assertEqual(bot.geometry.walk_path(LAT, LNG, LAT + 9 / METERS_PER_DEGREE, LNG, 10), [])
+
+	def test_walk_path_steps_match_legacy_walk(self):
+		rng = random.Random(1)
+		for i in range(200):
+			to_lat = LAT + rng.uniform(-0.007, 0.007)
+			to_lng = LNG + rng.uniform(-0.007, 0.007)
+			step = rng.choice((5, 10, 25, 50))
+
+			path = bot.geometry.walk_path(LAT, LNG, to_lat, to_lng, step)
+			legacy = legacy_walk(LAT, LNG, to_lat, to_lng, step)
+
+			# Same steps, except that the last one no longer overshoots.
+			self.assertEqual(len(path), len(legacy))
+			self.assertLessEqual(path[-1][2], 10)
+			for point, old in zip(path[:-1], legacy[:-1]):
+				self.assertAlmostEqual(point[2], old[2], 3)
+
+	def test_sort_by_distance(self):
+		items = [
+			{'name': 'far', 'position': (LAT + 0.01, LNG)},
+			{'name': 'unknown', 'position': None},
+			{'name': 'near', 'position': (LAT + 0.001, LNG)},
+			{'name': 'also unknown', 'position': None},
+			{'name': 'middle', 'position': (LAT, LNG + 0.005)}
+		]
+
+		ordered = bot.geometry.sort_by_distance(LAT, LNG, items, lambda item: item['position'])
+
+		self.assertEqual([item['name'] for item in ordered], ['near', 'middle', 'far', 'unknown', 'also unknown'])
+
+	def test_sort_by_distance_is_stable(self):
+		items = [{'name': name, 'position': (LAT + 0.001, LNG)} for name in 'abcde']
+		items.insert(2, {'name': 'first', 'position': (LAT, LNG)})
+
+		ordered = bot.geometry.sort_by_distance(LAT, LNG, items, lambda item: item['position'])
+
+		self.assertEqual([item['name'] for item in ordered], ['first', 'a', 'b', 'c', 'd', 'e'])
+
+
+if __name__ == '__main__':
+	unittest.main()
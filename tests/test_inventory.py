@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import unittest
+
+from bot.fake_api import SyntheticWorld, FakeApi
+from bot.inventory import Inventory
+from bot.batch import RequestBatch
+
+import bot.inventory
+
+CONFIG = {
+	'transfer_filter': {
+		'below_cp': 1000,
+		'below_iv': 0.5,
+		'logic': 'or'
+	},
+	'item_limit': {}
+}
+
+logger = logging.getLogger('test')
+
+def pokemon_state(pokemons):
+	return sorted(
+		(pokemon.id, pokemon.num, pokemon.cp, pokemon.attack, pokemon.defense,
+			pokemon.stamina, pokemon.move_1, pokemon.move_2, pokemon.is_egg)
+		for pokemon in pokemons
+	)
+
+# Every change is applied through update_inventory, then compared with a
+# fresh Inventory built from a full get_inventory of the same world.
+class InventoryDeltaTest(unittest.TestCase):
+	def setUp(self):
+		self.world = SyntheticWorld(0, 0, forts=0, spawns=5, pokemons=40, seed=1)
+		self.api = FakeApi(self.world)
+		self.inventory = Inventory(self.api, CONFIG, logger)
+
+	def assertSameAsFullFetch(self):
+		full = Inventory(self.api, CONFIG, logger)
+
+		self.assertEqual(self.inventory.items, full.items)
+		self.assertEqual(pokemon_state(self.inventory.pokemons), pokemon_state(full.pokemons))
+		self.assertEqual(
+			(self.inventory.level, self.inventory.exp, self.inventory.next_exp),
+			(full.level, full.exp, full.next_exp)
+		)
+		self.assertEqual(
+			[pokemon.id for pokemon in self.inventory.pokemons.best_cp()],
+			[pokemon.id for pokemon in full.pokemons.best_cp()]
+		)
+
+	def catch(self):
+		self.world.feed()
+		while True:
+			encounter_id = next(iter(self.world.encounters))
+			response = self.api.catch_pokemon(encounter_id=encounter_id, pokeball=bot.inventory.ITEM_POKE_BALL)
+			if response['responses']['CATCH_POKEMON']['status'] == 1:
+				return
+
+	def test_delta_only_carries_changes(self):
+		self.api.recycle_inventory_item(item_id=bot.inventory.ITEM_POTION, count=1)
+
+		delta = self.api.get_inventory(
+			last_timestamp_ms = self.inventory.last_timestamp_ms
+		)['responses']['GET_INVENTORY']['inventory_delta']
+
+		self.assertEqual(delta['inventory_items'], [
+			{'inventory_item_data': {'item': {'item_id': bot.inventory.ITEM_POTION, 'count': 9}}}
+		])
+
+	def test_item_removal(self):
+		self.inventory.recycle_items([
+			{'item_id': bot.inventory.ITEM_POKE_BALL, 'count': 30},
+			{'item_id': bot.inventory.ITEM_RAZZ_BERRY, 'count': self.inventory.items[bot.inventory.ITEM_RAZZ_BERRY]}
+		])
+		self.inventory.update_inventory()
+
+		self.assertEqual(self.inventory.items[bot.inventory.ITEM_RAZZ_BERRY], 0)
+		self.assertSameAsFullFetch()
+
+	def test_pokemon_transfer(self):
+		released = list(self.inventory.pokemons)[:5]
+		self.inventory.transfer_pokemons(released)
+		self.inventory.update_inventory()
+
+		for pokemon in released:
+			self.assertNotIn(pokemon.id, self.inventory.pokemons)
+		self.assertSameAsFullFetch()
+
+	def test_release_elsewhere(self):
+		# Only the delta tells this inventory the Pokemon is gone.
+		pokemon = list(self.inventory.pokemons)[0]
+		self.api.release_pokemon(pokemon_id=pokemon.id)
+		self.inventory.update_inventory()
+
+		self.assertNotIn(pokemon.id, self.inventory.pokemons)
+		self.assertSameAsFullFetch()
+
+	def test_catch_spin_and_level_up(self):
+		self.catch()
+		self.world.change_item(bot.inventory.ITEM_GREAT_BALL, 5)
+		self.world.change_stats(self.world.next_exp)
+		self.inventory.update_inventory()
+
+		self.assertEqual(len(self.inventory.pokemons), 41)
+		self.assertEqual(self.inventory.level, 6)
+		self.assertSameAsFullFetch()
+
+	def test_batched_deltas(self):
+		self.catch()
+		released = list(self.inventory.pokemons)[:3]
+
+		batch = RequestBatch(self.api)
+		self.inventory.transfer_pokemons(released, batch)
+		self.inventory.recycle_items([{'item_id': bot.inventory.ITEM_POTION, 'count': 4}], batch)
+		batch.call()
+
+		batch = RequestBatch(self.api)
+		self.inventory.update_inventory(batch)
+		batch.call()
+
+		self.assertSameAsFullFetch()
+
+	def test_repeated_updates(self):
+		for i in range(3):
+			self.catch()
+			self.inventory.transfer_pokemons(list(self.inventory.pokemons)[:2])
+			self.inventory.update_inventory()
+
+		self.inventory.update_inventory()
+		self.assertSameAsFullFetch()
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from bot.clock import VirtualClock
+from bot.limits import RollingCounter
+
+EPSILON = 0.001
+
+class RollingCounterTest(unittest.TestCase):
+	def test_event_exactly_window_old_counts(self):
+		self.assertEqual(RollingCounter([0, 100, 200], window=100).count(200), 2)
+
+	def test_window_boundaries(self):
+		window = 12 * 60 * 60
+		for now, expected in (
+			(window - EPSILON, 1),
+			(window, 1),
+			(window + EPSILON, 0)
+		):
+			counter = RollingCounter([0], window=window)
+			self.assertEqual(counter.count(now), expected, now)
+
+	def test_boundaries_for_each_event(self):
+		counter = RollingCounter([10, 20, 30], window=100)
+
+		self.assertEqual(counter.count(110 - EPSILON), 3)
+		self.assertEqual(counter.count(110), 3)
+		self.assertEqual(counter.count(110 + EPSILON), 2)
+		self.assertEqual(counter.count(120), 2)
+		self.assertEqual(counter.count(120 + EPSILON), 1)
+		self.assertEqual(counter.count(130 + EPSILON), 0)
+
+	def test_out_of_order_add(self):
+		counter = RollingCounter([50, 10], window=100)
+		counter.add(30)
+
+		self.assertEqual(counter.count(110), 3)
+		self.assertEqual(counter.count(130), 2)
+		self.assertEqual(counter.count(150 + EPSILON), 0)
+
+	def test_clock(self):
+		clock = VirtualClock(1000)
+		counter = RollingCounter(window=60, clock=clock.time)
+
+		counter.add()
+		clock.sleep(30)
+		counter.add()
+		self.assertEqual(counter.count(), 2)
+
+		clock.sleep(30)
+		self.assertEqual(counter.count(), 2)
+
+		clock.sleep(EPSILON)
+		self.assertEqual(counter.count(), 1)
+
+		clock.sleep(30)
+		self.assertEqual(counter.count(), 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+import multiprocessing
+
+from bot import Bot
+from bot.clock import Scheduler, VirtualClock
+from bot.fake_api import SyntheticWorld, FakeApi
+from tests.test_bot import load_config
+
+import bot.log
+import bot.models
+
+def forwarding_worker(records):
+	bot.log.forward(records)
+	logging.getLogger('worker').info('from the worker')
+	bot.log.account_logger('alice').info('caught a pokemon')
+
+class ForwardTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='alphabot-test-')
+		self.root = logging.getLogger()
+		self.handlers = list(self.root.handlers)
+		self.level = self.root.level
+
+	def tearDown(self):
+		bot.log.shutdown()
+		for handler in list(self.root.handlers):
+			self.root.removeHandler(handler)
+		for handler in self.handlers:
+			self.root.addHandler(handler)
+		self.root.setLevel(self.level)
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def read(self, name):
+		with open(os.path.join(self.directory, name)) as log_file:
+			return log_file.read()
+
+	def test_worker_records_reach_parent_files(self):
+		records = multiprocessing.Queue(bot.log.QUEUE_SIZE)
+		bot.log.setup({'log': {'file': os.path.join(self.directory, 'bot.log'), 'console': False}}, records=records)
+
+		process = multiprocessing.Process(target=forwarding_worker, args=(records,))
+		process.start()
+		process.join(10)
+		self.assertEqual(process.exitcode, 0)
+
+		logging.getLogger('parent').info('from the parent')
+		# Stopping the listener drains everything queued before it.
+		bot.log.shutdown()
+
+		log = self.read('bot.log')
+		self.assertIn('[worker] [INFO] from the worker', log)
+		self.assertIn('[alice] [INFO] caught a pokemon', log)
+		self.assertIn('[parent] [INFO] from the parent', log)
+
+		account_log = self.read('alice.log')
+		self.assertIn('caught a pokemon', account_log)
+		self.assertNotIn('from the worker', account_log)
+
+	def test_fork_while_paused(self):
+		records = multiprocessing.Queue(bot.log.QUEUE_SIZE)
+		bot.log.setup({'log': {'file': os.path.join(self.directory, 'bot.log'), 'console': False}}, records=records)
+
+		logging.getLogger('parent').info('before the fork')
+		with bot.log.paused():
+			logging.getLogger('parent').info('while paused')
+			process = multiprocessing.Process(target=forwarding_worker, args=(records,))
+			process.start()
+		process.join(10)
+		self.assertEqual(process.exitcode, 0)
+
+		logging.getLogger('parent').info('after the fork')
+		bot.log.shutdown()
+
+		log = self.read('bot.log')
+		for message in ('before the fork', 'while paused', 'from the worker', 'after the fork'):
+			self.assertIn(message, log)
+
+class LoginSoakTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='alphabot-test-')
+		self.root = logging.getLogger()
+		self.handlers = list(self.root.handlers)
+		self.level = self.root.level
+
+		bot.models.init_db(os.path.join(self.directory, 'bot.db'))
+		self.config = load_config()
+		bot.models.User.create_user(self.config['username'])
+		bot.log.setup({'log': {'file': os.path.join(self.directory, 'bot.log'), 'console': False}})
+
+		world = SyntheticWorld(0, 0, forts=0, spawns=0, pokemons=50, username=self.config['username'])
+		api = FakeApi(world)
+		self.account = Bot(self.config, Scheduler(VirtualClock()), api_factory=lambda: api)
+
+	def tearDown(self):
+		self.account.stop()
+		bot.log.shutdown()
+		for handler in list(self.root.handlers):
+			self.root.removeHandler(handler)
+		for handler in self.handlers:
+			self.root.addHandler(handler)
+		self.root.setLevel(self.level)
+		bot.models.db.close()
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def state(self):
+		# Stopping the listener drains the queue, so every record logged so
+		# far has reached its file.
+		with bot.log.paused():
+			account = logging.getLogger(self.config['username'])
+			return {
+				'root_handlers': len(self.root.handlers),
+				'account_handlers': len(account.handlers),
+				'account_filters': len(account.filters),
+				'fds': len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else 0
+			}
+
+	def test_logins_keep_handlers_and_fds(self):
+		# The first login opens the account's log file.
+		self.account.login()
+		started = self.state()
+
+		for i in range(300):
+			self.account.login()
+			bot.log.account_logger(self.config['username'])
+
+		self.assertEqual(self.state(), started)
+		self.assertEqual(started['account_filters'], 1)
+
+		with open(os.path.join(self.directory, self.config['username'] + '.log')) as log_file:
+			self.assertEqual(log_file.read().count('Trainer Name: '), 301)
+
+
+if __name__ == '__main__':
+	unittest.main()
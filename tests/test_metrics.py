@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+import unittest
+
+from bot.metrics import Metrics, MergedMetrics
+
+def worker_metrics(catches, latency, started):
+	registry = Metrics()
+	registry.started = started
+	registry.inc('catches_total', catches, account='a')
+	registry.set('pokemons', catches, account='a')
+	registry.observe('rpc_seconds', latency, method='get_map_objects')
+	return registry
+
+class MergedMetricsTest(unittest.TestCase):
+	def test_export_survives_pickle(self):
+		state = worker_metrics(3, 0.2, 100).export()
+		self.assertEqual(pickle.loads(pickle.dumps(state)), state)
+
+	def test_sums_workers(self):
+		merged = MergedMetrics()
+		merged.update(0, worker_metrics(3, 0.2, 100).export())
+		merged.update(1, worker_metrics(4, 0.4, 50).export())
+
+		registry = merged.registry()
+		self.assertEqual(registry.counters[('catches_total', (('account', 'a'),))], 7)
+		histogram = registry.histograms[('rpc_seconds', (('method', 'get_map_objects'),))]
+		self.assertEqual(histogram.count, 2)
+		self.assertAlmostEqual(histogram.sum, 0.6)
+		self.assertEqual(registry.started, 50)
+
+	def test_latest_export_replaces_previous(self):
+		merged = MergedMetrics()
+		merged.update(0, worker_metrics(3, 0.2, 100).export())
+		merged.update(0, worker_metrics(5, 0.2, 100).export())
+
+		self.assertEqual(merged.registry().counters[('catches_total', (('account', 'a'),))], 5)
+
+	def test_restart_keeps_previous_run(self):
+		merged = MergedMetrics()
+		merged.update(0, worker_metrics(3, 0.2, 100).export())
+		merged.update(0, worker_metrics(1, 0.2, 200).export())
+		merged.update(0, worker_metrics(2, 0.2, 200).export())
+
+		registry = merged.registry()
+		self.assertEqual(registry.counters[('catches_total', (('account', 'a'),))], 5)
+		self.assertEqual(registry.gauges[('pokemons', (('account', 'a'),))], 2)
+		self.assertIn('catches_total{account="a"} 5', merged.prometheus())
+
+
+if __name__ == '__main__':
+	unittest.main()
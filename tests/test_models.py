@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import bot.models
+
+class UserIdTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='alphabot-test-')
+
+	def tearDown(self):
+		if not bot.models.db.is_closed():
+			bot.models.db.close()
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def test_reinit_forgets_user_ids(self):
+		bot.models.init_db(os.path.join(self.directory, 'first.db'))
+		bot.models.User.create_user('other')
+		bot.models.User.create_user('test')
+		self.assertEqual(bot.models.User.get_user_id('test'), 2)
+
+		bot.models.init_db(os.path.join(self.directory, 'second.db'))
+		bot.models.User.create_user('test')
+		self.assertEqual(bot.models.User.get_user_id('test'), 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
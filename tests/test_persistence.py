@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import shutil
+import signal
+import sqlite3
+import datetime
+import tempfile
+import unittest
+
+from bot.clock import Scheduler, VirtualClock
+from bot.persistence import WriteBehind
+
+import bot.persistence
+
+import bot.models
+
+USERNAME = 'test'
+START = 1500000000
+
+class WriteBehindTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='alphabot-test-')
+		self.path = os.path.join(self.directory, 'bot.db')
+		bot.models.init_db(self.path, timeout=0.1)
+		bot.models.User.create_user(USERNAME)
+
+		self.clock = VirtualClock(START)
+		self.scheduler = Scheduler(self.clock)
+		self.writer = WriteBehind(USERNAME, interval=10, clock=self.clock.time)
+
+	def tearDown(self):
+		# Unflushed writers would otherwise be flushed into the next test's
+		# database by flush_all().
+		del self.writer, self.scheduler
+
+		if not bot.models.db.is_closed():
+			bot.models.db.close()
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def catchs(self):
+		return sorted(bot.models.Catch.get_catchs(USERNAME))
+
+	def spins(self):
+		return sorted(bot.models.Pokestop.get_spins(USERNAME))
+
+	def test_timestamps_come_from_clock(self):
+		self.writer.insert_catch('1')
+		self.clock.sleep(5)
+		self.writer.insert_spin()
+		self.writer.flush()
+
+		self.assertEqual(self.catchs(), [('1', START)])
+		self.assertEqual(self.spins(), [START + 5])
+
+	def test_flush_on_interval(self):
+		self.scheduler.every(self.writer.interval, self.writer.flush)
+
+		self.writer.insert_catch('1')
+		self.writer.insert_spin()
+		self.writer.set_location(1.5, 2.5)
+		self.scheduler.sleep(9)
+		self.assertEqual(self.catchs(), [])
+		self.assertEqual(self.spins(), [])
+
+		self.scheduler.sleep(1)
+		self.assertEqual(self.catchs(), [('1', START)])
+		self.assertEqual(self.spins(), [START])
+		self.assertEqual(bot.models.Location.get_location(USERNAME), (1.5, 2.5))
+
+	def test_flush_on_interval_thread(self):
+		writer = WriteBehind(USERNAME, interval=0.05)
+		writer.insert_catch('1')
+		writer.start()
+
+		deadline = time.time() + 5
+		while writer.flushes == 0 and time.time() < deadline:
+			time.sleep(0.01)
+
+		writer.stop()
+		writer.join()
+		self.assertEqual([encounter_id for encounter_id, created in self.catchs()], ['1'])
+
+	def test_flush_on_stop(self):
+		writer = WriteBehind(USERNAME, interval=3600)
+		writer.start()
+		writer.insert_catch('1')
+		writer.insert_spin()
+		writer.stop()
+		writer.join()
+
+		self.assertEqual(len(self.catchs()), 1)
+		self.assertEqual(len(self.spins()), 1)
+
+	def test_crash_loses_at_most_one_interval(self):
+		self.scheduler.every(self.writer.interval, self.writer.flush)
+
+		# One catch and one spin a second for 35 seconds, then the process
+		# dies without stop(): whatever is still queued is lost.
+		for i in range(35):
+			self.writer.insert_catch(str(i))
+			self.writer.insert_spin()
+			self.scheduler.sleep(1)
+
+		last_flush = START + 30
+		self.assertEqual(self.catchs(), sorted((str(i), START + i) for i in range(30)))
+		self.assertEqual(self.spins(), [START + i for i in range(30)])
+
+		lost = [created for encounter_id, created in self.writer.catchs] + self.writer.spins
+		self.assertEqual(len(lost), 10)
+		for created in lost:
+			created = time.mktime(created.timetuple())
+			self.assertTrue(last_flush <= created < last_flush + self.writer.interval)
+
+	def test_requeue_on_database_error(self):
+		self.writer.set_location(1.5, 2.5)
+		self.writer.insert_catch('1')
+		self.writer.insert_spin()
+
+		# Another process holding the write lock makes the flush fail.
+		other = sqlite3.connect(self.path, timeout=0)
+		other.execute('BEGIN EXCLUSIVE')
+		try:
+			self.writer.flush()
+		finally:
+			other.rollback()
+			other.close()
+
+		self.assertEqual(self.writer.flushes, 0)
+		self.assertEqual(self.writer.location, (1.5, 2.5))
+		self.assertEqual(len(self.writer.catchs), 1)
+		self.assertEqual(len(self.writer.spins), 1)
+
+		self.writer.insert_catch('2')
+		self.writer.flush()
+
+		self.assertEqual(self.writer.flushes, 1)
+		self.assertEqual(self.catchs(), [('1', START), ('2', START)])
+		self.assertEqual(self.spins(), [START])
+		self.assertEqual(bot.models.Location.get_location(USERNAME), (1.5, 2.5))
+
+	def test_requeue_keeps_newer_location(self):
+		self.writer.set_location(1.5, 2.5)
+
+		other = sqlite3.connect(self.path, timeout=0)
+		other.execute('BEGIN EXCLUSIVE')
+		try:
+			self.writer.flush()
+		finally:
+			other.rollback()
+			other.close()
+
+		self.writer.set_location(3.5, 4.5)
+		self.writer.flush()
+
+		self.assertEqual(bot.models.Location.get_location(USERNAME), (3.5, 4.5))
+
+
+	def test_flush_all(self):
+		self.writer.insert_catch('1')
+		bot.persistence.flush_all()
+
+		self.assertEqual(self.catchs(), [('1', START)])
+
+	def test_sigterm_flushes(self):
+		if not hasattr(os, 'fork'):
+			return
+
+		pid = os.fork()
+		if pid == 0:
+			code = 1
+			try:
+				bot.persistence.flush_on_sigterm()
+				writer = WriteBehind(USERNAME, interval=3600, clock=self.clock.time)
+				writer.insert_catch('1')
+				os.kill(os.getpid(), signal.SIGTERM)
+				time.sleep(5)
+			except SystemExit:
+				bot.persistence.flush_all()
+				code = 0
+			finally:
+				os._exit(code)
+
+		status = os.waitpid(pid, 0)[1]
+		self.assertEqual(os.WEXITSTATUS(status), 0)
+		self.assertEqual(self.catchs(), [('1', START)])
+
+	def test_prune_by_bot_clock(self):
+		self.writer.insert_catch('old')
+		self.writer.insert_spin()
+		self.clock.sleep(13 * 3600)
+		self.writer.insert_catch('new')
+		self.writer.flush()
+
+		now = datetime.datetime.fromtimestamp(self.clock.time())
+		bot.models.Catch.prune_catchs(USERNAME, now)
+		bot.models.Pokestop.prune_spins(USERNAME, now)
+
+		self.assertEqual([encounter_id for encounter_id, created in self.catchs()], ['new'])
+		self.assertEqual(self.spins(), [])
+
+
+if __name__ == '__main__':
+	unittest.main()
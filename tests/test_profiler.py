@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import glob
+import pstats
+import shutil
+import signal
+import tempfile
+import unittest
+
+from bot.metrics import metrics, Timer
+from bot.profiler import profiler, phase
+
+def inner_work():
+	return sum(range(1000))
+
+def outer_work():
+	return sum(range(1000))
+
+@phase('inner')
+def inner():
+	return inner_work()
+
+@phase('outer')
+def outer():
+	outer_work()
+	return inner()
+
+@phase('noop')
+def noop():
+	pass
+
+class ProfilerTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='alphabot-test-')
+
+	def tearDown(self):
+		if profiler.enabled:
+			profiler.stop()
+		profiler.toggle_requested = False
+		profiler.flush()
+		profiler.configure(False)
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def profiles(self, name):
+		return glob.glob(os.path.join(self.directory, 'profile-*-%s-*.prof' % name))
+
+	def functions(self, name):
+		paths = self.profiles(name)
+		self.assertEqual(len(paths), 1)
+		return set(function for filename, line, function in pstats.Stats(paths[0]).stats)
+
+	def test_nested_phases_are_attributed_to_their_own_profile(self):
+		profiler.configure(True, interval=3600, directory=self.directory)
+		for i in range(3):
+			outer()
+		profiler.stop()
+		profiler.flush()
+
+		self.assertIn('outer_work', self.functions('outer'))
+		self.assertNotIn('inner_work', self.functions('outer'))
+		self.assertIn('inner_work', self.functions('inner'))
+		self.assertNotIn('outer_work', self.functions('inner'))
+
+	def test_profiles_dumped_every_interval(self):
+		profiler.configure(True, interval=3600, directory=self.directory)
+		outer()
+		self.assertEqual(self.profiles('outer'), [])
+
+		profiler.interval = 0
+		outer()
+		self.assertEqual(len(self.profiles('outer')), 1)
+		self.assertEqual(len(self.profiles('inner')), 1)
+		self.assertTrue(profiler.enabled)
+
+	def test_stop_writes_profiles_at_next_phase(self):
+		profiler.configure(True, interval=3600, directory=self.directory)
+		outer()
+		profiler.stop()
+		self.assertTrue(profiler.active)
+		self.assertEqual(self.profiles('outer'), [])
+
+		noop()
+		self.assertEqual(len(self.profiles('outer')), 1)
+		self.assertFalse(profiler.active)
+		self.assertEqual(profiler.pending, 0)
+
+	def test_phases_filter(self):
+		profiler.configure(True, phases=['inner'], interval=3600, directory=self.directory)
+		outer()
+		profiler.stop()
+		profiler.flush()
+
+		self.assertEqual(self.profiles('outer'), [])
+		self.assertEqual(len(self.profiles('inner')), 1)
+
+	def test_toggle_does_not_take_the_lock(self):
+		profiler.configure(False, interval=3600, directory=self.directory)
+
+		# A signal arriving while the lock is held must not block on it.
+		with profiler.lock:
+			profiler.toggle()
+		self.assertFalse(profiler.enabled)
+
+		outer()
+		self.assertTrue(profiler.enabled)
+
+		with profiler.lock:
+			profiler.toggle()
+		noop()
+		self.assertFalse(profiler.enabled)
+		self.assertFalse(profiler.active)
+		self.assertEqual(len(self.profiles('outer')), 1)
+
+	@unittest.skipUnless(hasattr(signal, 'SIGUSR1'), 'needs SIGUSR1')
+	def test_sigusr1_toggles(self):
+		handler = signal.getsignal(signal.SIGUSR1)
+		try:
+			profiler.configure(False, interval=3600, directory=self.directory)
+			profiler.install_signal()
+			os.kill(os.getpid(), signal.SIGUSR1)
+			noop()
+			self.assertTrue(profiler.enabled)
+		finally:
+			signal.signal(signal.SIGUSR1, handler)
+
+	def test_disabled_overhead(self):
+		profiler.configure(False)
+		labels = (('phase', 'noop'),)
+
+		def timer_only():
+			with Timer(metrics, 'phase', labels):
+				pass
+
+		def best(function, calls=20000, repeat=5):
+			results = []
+			for i in range(repeat):
+				started = time.time()
+				for j in range(calls):
+					function()
+				results.append((time.time() - started) / calls)
+			return min(results)
+
+		# With the profiler off, a phase costs its timer and one attribute
+		# check on top.
+		self.assertLess(best(noop), best(timer_only) * 1.5 + 1e-6)
+
+
+if __name__ == '__main__':
+	unittest.main()
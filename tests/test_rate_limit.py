@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from bot.clock import Scheduler, VirtualClock
+from bot.rate_limit import TokenBucket, RateLimitedApi
+
+START = 1500000000
+
+class Api(object):
+	def __init__(self):
+		self.calls = []
+
+	def get_map_objects(self, **kwargs):
+		self.calls.append('get_map_objects')
+		return {}
+
+	def set_position(self, lat, lng, alt=0.0):
+		self.calls.append('set_position')
+
+class TokenBucketTest(unittest.TestCase):
+	def setUp(self):
+		self.clock = VirtualClock(START)
+
+	def test_burst_then_wait(self):
+		bucket = TokenBucket(60, 3, self.clock.time)
+
+		self.assertEqual([bucket.reserve() for i in range(3)], [0, 0, 0])
+		self.assertAlmostEqual(bucket.reserve(), 1.0)
+		self.assertAlmostEqual(bucket.reserve(), 2.0)
+
+	def test_refill(self):
+		bucket = TokenBucket(120, 1, self.clock.time)
+		bucket.reserve()
+
+		self.clock.sleep(0.25)
+		self.assertAlmostEqual(bucket.reserve(), 0.25)
+
+		self.clock.sleep(0.75)
+		self.assertEqual(bucket.reserve(), 0)
+
+	def test_refill_capped_at_burst(self):
+		bucket = TokenBucket(60, 2, self.clock.time)
+		bucket.reserve()
+		bucket.reserve()
+
+		# An hour idle still only banks two calls.
+		self.clock.sleep(3600)
+		self.assertEqual([bucket.reserve() for i in range(2)], [0, 0])
+		self.assertAlmostEqual(bucket.reserve(), 1.0)
+
+class RateLimitedApiTest(unittest.TestCase):
+	def setUp(self):
+		self.clock = VirtualClock(START)
+		self.api = Api()
+		self.limited = RateLimitedApi(self.api, Scheduler(self.clock))
+
+	def test_blocks_until_token(self):
+		self.limited.get_map_objects()
+		self.assertEqual(self.clock.time(), START)
+
+		self.limited.get_map_objects()
+		self.assertAlmostEqual(self.clock.time(), START + 1)
+		self.assertEqual(self.api.calls, ['get_map_objects'] * 2)
+
+	def test_spaced_calls_do_not_wait(self):
+		self.limited.get_map_objects()
+		self.clock.sleep(1)
+		self.limited.get_map_objects()
+
+		self.assertEqual(self.clock.time(), START + 1)
+
+	def test_local_methods_not_limited(self):
+		for i in range(100):
+			self.limited.set_position(1.0, 2.0)
+
+		self.assertEqual(self.clock.time(), START)
+		self.assertEqual(self.limited.calls, {})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+
+from bot import Bot
+from bot.clock import Scheduler, VirtualClock
+from bot.fake_api import SyntheticWorld, FakeApi, FakeFeedServer
+from bot.replay import RecordingApi, ReplayApi
+from tests.test_bot import load_config
+
+import bot.models
+
+START = 1500000000
+CYCLES = 5
+
+# Keeps every envelope it answers, in order.
+class LoggingFakeApi(FakeApi):
+	def __init__(self, *args, **kwargs):
+		FakeApi.__init__(self, *args, **kwargs)
+		self.answered = []
+
+	def call(self, calls):
+		response = FakeApi.call(self, calls)
+		self.answered.append(([method for method, kwargs in calls], response))
+		return response
+
+class LoggingReplayApi(ReplayApi):
+	def __init__(self, path):
+		ReplayApi.__init__(self, path)
+		self.answered = []
+
+	def call(self, methods):
+		response = ReplayApi.call(self, methods)
+		self.answered.append((list(methods), response))
+		return response
+
+class ReplayTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='alphabot-test-')
+		self.path = os.path.join(self.directory, 'api.jsonl')
+		self.config = load_config()
+
+		# No feed, so both runs take the same decisions from the same
+		# responses.
+		self.feed_server = FakeFeedServer(lambda: [])
+		self.feed_server.start()
+		self.config['feed_url'] = self.feed_server.url
+
+	def tearDown(self):
+		self.feed_server.stop()
+		bot.models.db.close()
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	# Runs a bot on a fresh database, seed and clock, so the recorded and the
+	# replayed run start from the same state.
+	def run_bot(self, name, create_api):
+		bot.models.init_db(os.path.join(self.directory, name + '.db'))
+		bot.models.User.create_user(self.config['username'])
+		random.seed(0)
+
+		clock = VirtualClock(START)
+		api = create_api(clock)
+		account = Bot(self.config, Scheduler(clock), api_factory=lambda: api.wrapped)
+		try:
+			account.setup()
+			for i in range(CYCLES):
+				account.run_cycle()
+		finally:
+			account.stop()
+
+		self.assertEqual(account.cycles, CYCLES)
+		return api
+
+	def test_round_trip(self):
+		def record(clock):
+			lat, lng = [float(x) for x in self.config['location'].split(',')]
+			world = SyntheticWorld(lat, lng, forts=30, spawns=0, pokemons=30, seed=1, clock=clock.time, username=self.config['username'])
+			api = LoggingFakeApi(world, sleep=clock.sleep)
+			api.wrapped = RecordingApi(api, self.path)
+			return api
+
+		def replay(clock):
+			api = LoggingReplayApi(self.path)
+			api.wrapped = api
+			return api
+
+		recorded = self.run_bot('record', record)
+
+		with open(self.path) as record_file:
+			lines = [json.loads(line) for line in record_file]
+		self.assertEqual(len(lines), recorded.rpcs)
+		self.assertTrue(any(len(line['methods']) == 1 for line in lines))
+		self.assertTrue(any(len(line['methods']) > 1 for line in lines))
+		# Responses go through JSON, so they are compared as JSON.
+		answered = json.loads(json.dumps(recorded.answered))
+		self.assertEqual([[line['methods'], line['response']] for line in lines], answered)
+
+		replayed = self.run_bot('replay', replay)
+
+		self.assertEqual(replayed.misses, 0)
+		self.assertEqual(replayed.rpcs, recorded.rpcs)
+		self.assertEqual(dict(replayed.calls), dict(recorded.calls))
+		self.assertEqual(json.loads(json.dumps(replayed.answered)), answered)
+
+	def test_unrecorded_envelope_is_a_miss(self):
+		with open(self.path, 'w') as record_file:
+			record_file.write(json.dumps({'time': START, 'methods': ['get_player'], 'response': {'status_code': 1}}) + '\n')
+
+		api = ReplayApi(self.path)
+		self.assertEqual(api.get_player(), {'status_code': 1})
+		self.assertEqual(api.get_player(), {'status_code': 1})
+
+		req = api.create_request()
+		req.get_player()
+		req.get_inventory()
+		self.assertEqual(req.call(), {})
+		self.assertEqual((api.rpcs, api.misses), (3, 1))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from bot.fort_index import FortIndex
+from bot.route import RoutePlanner
+
+START = 1500000000
+LAT = 40.0
+LNG = -74.0
+
+# Forts on one line east of the start, about 85 m apart.
+def fort(name, steps):
+	return {'id': name, 'latitude': LAT, 'longitude': LNG + steps * 0.001}
+
+class RoutePlannerTest(unittest.TestCase):
+	def setUp(self):
+		self.now = START
+		self.index = FortIndex(clock=lambda: self.now)
+		self.index.add_forts([fort('a', 2), fort('b', 1), fort('c', 3)], False)
+		self.planner = RoutePlanner(self.index, speed=10)
+
+	def ids(self):
+		return [stop['id'] for stop in self.planner.route]
+
+	def test_cooling_fort_left_out(self):
+		self.index.set_cooldown('a', (START + 1000) * 1000)
+		self.planner.plan(LAT, LNG)
+
+		self.assertEqual(self.ids(), ['b', 'c'])
+		self.assertEqual(list(self.planner.cooling), ['a'])
+
+	def test_expired_fort_replanned(self):
+		self.index.set_cooldown('a', (START + 1000) * 1000)
+		self.assertEqual(self.planner.next_fort(LAT, LNG)['id'], 'b')
+		self.index.set_cooldown('b', (START + 2000) * 1000)
+
+		# Standing at b with c left, the new plan takes a on the way to c.
+		self.now = START + 1001
+		self.assertEqual(self.planner.next_fort(LAT, LNG + 0.001)['id'], 'a')
+		self.assertEqual(self.ids(), ['c'])
+
+	def test_spun_fort_comes_back(self):
+		self.assertEqual(self.planner.next_fort(LAT, LNG)['id'], 'b')
+		self.index.set_cooldown('b', (START + 300) * 1000)
+		self.assertIn('b', self.planner.cooling)
+
+		self.now = START + 301
+		self.assertEqual(self.planner.next_fort(LAT, LNG + 0.001)['id'], 'b')
+		self.assertEqual(self.ids(), ['a', 'c'])
+
+	def test_far_cooling_fort_dropped(self):
+		self.index.set_cooldown('a', (START + 1000) * 1000)
+		self.planner.plan(LAT, LNG)
+
+		self.now = START + 1001
+		self.planner.next_fort(LAT, LNG + 0.1)
+		self.assertNotIn('a', self.ids())
+		self.assertNotIn('a', self.planner.cooling)
+
+
+if __name__ == '__main__':
+	unittest.main()
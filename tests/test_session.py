@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pgoapi.exceptions import AuthException
+from pgoapi.exceptions import NotLoggedInException
+from pgoapi.exceptions import ServerSideRequestThrottlingException
+
+from bot import Bot
+from bot.clock import Scheduler, VirtualClock
+from bot.fake_api import SyntheticWorld, FakeApi, FakeFeedServer
+from tests.test_bot import load_config
+
+import bot.models
+
+TOKEN_LIFETIME = 1800
+
+# Refuses to authenticate while `failing` is set.
+class FlakyApi(FakeApi):
+	failing = False
+
+	def set_authentication(self, **kwargs):
+		if self.failing:
+			raise AuthException('refresh refused')
+
+		FakeApi.set_authentication(self, **kwargs)
+
+class SessionTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp(prefix='alphabot-test-')
+		bot.models.init_db(os.path.join(self.directory, 'bot.db'))
+
+		self.config = load_config()
+		self.config.update({'recover_backoff': 2, 'recover_max_backoff': 10})
+		bot.models.User.create_user(self.config['username'])
+
+		lat, lng = [float(x) for x in self.config['location'].split(',')]
+		self.clock = VirtualClock(1500000000)
+		self.world = SyntheticWorld(
+			lat,
+			lng,
+			forts = 30,
+			spawns = 10,
+			pokemons = 20,
+			seed = 1,
+			clock = self.clock.time,
+			username = self.config['username']
+		)
+
+		self.feed_server = FakeFeedServer(self.world.feed)
+		self.feed_server.start()
+		self.config['feed_url'] = self.feed_server.url
+
+		self.apis = []
+		self.account = None
+
+	def tearDown(self):
+		if self.account is not None:
+			self.account.stop()
+		self.feed_server.stop()
+		bot.models.db.close()
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def create_api(self):
+		api = FlakyApi(self.world, token_lifetime=TOKEN_LIFETIME, sleep=self.clock.sleep)
+		self.apis.append(api)
+		return api
+
+	def start(self):
+		self.account = Bot(self.config, Scheduler(self.clock), api_factory=self.create_api)
+		self.account.setup()
+		self.account.run_cycle()
+		return self.account.api
+
+	def test_throttle_only_waits(self):
+		api = self.start()
+		started = self.clock.time()
+
+		self.account.session.recover(ServerSideRequestThrottlingException())
+
+		self.assertEqual(self.clock.time() - started, 2)
+		self.assertIs(self.account.api, api)
+		self.assertEqual(len(self.apis), 1)
+		self.assertEqual(self.apis[0].logins, 1)
+
+	def test_expired_token_is_refreshed(self):
+		api = self.start()
+		cycles = self.account.cycles
+
+		self.clock.sleep(TOKEN_LIFETIME + 1)
+		self.account.run_cycle()
+		self.account.run_cycle()
+
+		self.assertEqual(self.account.cycles, cycles + 1)
+		self.assertIs(self.account.api, api)
+		self.assertEqual(len(self.apis), 1)
+		self.assertEqual(self.apis[0].logins, 2)
+		self.assertEqual(self.account.session.refreshes, 1)
+		self.assertEqual(self.account.session.logins, 0)
+
+	def test_failed_refresh_logs_in(self):
+		api = self.start()
+		self.clock.sleep(TOKEN_LIFETIME + 1)
+		self.apis[0].failing = True
+
+		self.account.session.recover(NotLoggedInException())
+
+		self.assertIsNot(self.account.api, api)
+		self.assertEqual(len(self.apis), 2)
+		self.assertEqual(self.apis[1].logins, 1)
+		self.assertEqual(self.account.session.refreshes, 0)
+		self.assertEqual(self.account.session.logins, 1)
+
+		cycles = self.account.cycles
+		self.account.run_cycle()
+		self.assertEqual(self.account.cycles, cycles + 1)
+
+	def test_refresh_disabled_logs_in(self):
+		self.config['session_refresh'] = False
+		api = self.start()
+		self.clock.sleep(TOKEN_LIFETIME + 1)
+
+		self.account.session.recover(NotLoggedInException())
+
+		self.assertIsNot(self.account.api, api)
+		self.assertEqual(len(self.apis), 2)
+		self.assertEqual(self.apis[0].logins, 1)
+		self.assertEqual(self.account.session.refreshes, 0)
+		self.assertEqual(self.account.session.logins, 1)
+
+	def test_backoff_doubles_and_resets(self):
+		self.start()
+
+		waits = []
+		for i in range(5):
+			started = self.clock.time()
+			self.account.session.recover(ServerSideRequestThrottlingException())
+			waits.append(self.clock.time() - started)
+		self.assertEqual(waits, [2, 4, 8, 10, 10])
+
+		self.account.session.succeeded()
+		started = self.clock.time()
+		self.account.session.recover(ServerSideRequestThrottlingException())
+		self.assertEqual(self.clock.time() - started, 2)
+
+
+if __name__ == '__main__':
+	unittest.main()